@@ -0,0 +1,106 @@
+"""
+Tokenization time vs model time of a BERT predictor.
+
+Run from the project root:
+    python benchmarks/bench_bert_tokenization.py [config.json] [predictor_index] [texts.txt]
+
+Texts are read one per line; without a file short synthetic chat messages are used.
+All times are per text, in ms.
+"""
+
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from core.config import MODEL_CONFIG
+from services.bert_model import BertTokenizerSlow
+from services.model_registry import PREDICTOR_TYPE_REGISTRY
+from services.utils import load_config
+
+
+REPEATS = 3
+BATCH_SIZE = 32
+SHORT_MESSAGES = [
+    "ок",
+    "привет, как дела?",
+    "ты вообще нормальный???",
+    "спасибо, всё получилось 👍",
+    "завтра в 10 у входа",
+    "это лучший ответ в треде, без шуток",
+    "не пиши мне больше",
+    "ахахах ну ты даёшь)))",
+]
+
+
+def load_texts(path: str = None) -> list:
+    if path is None:
+        return SHORT_MESSAGES * 64
+    with open(path, encoding="utf-8") as fh:
+        return [line.strip() for line in fh if line.strip()]
+
+
+def best_ms_per_text(func, texts: list) -> float:
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        func(texts)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000 / len(texts)
+
+
+def batches(texts: list) -> list:
+    return [texts[i:i + BATCH_SIZE] for i in range(0, len(texts), BATCH_SIZE)]
+
+
+def main() -> None:
+    config_path = sys.argv[1] if len(sys.argv) > 1 else MODEL_CONFIG
+    index = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    texts = load_texts(sys.argv[3] if len(sys.argv) > 3 else None)
+
+    model_type = load_config(config_path)["predictors"][index].get("model_type", "linear_svm")
+    model = PREDICTOR_TYPE_REGISTRY[model_type](config_path=config_path, worker_id=index)
+    tokenizer = model._tokenizer
+    try:
+        slow_tokenizer = BertTokenizerSlow.from_pretrained(str(model._model_dir))
+    except (OSError, TypeError, ValueError):  # artifact without vocab.txt
+        slow_tokenizer = None
+    max_len = model._max_len
+
+    def tokenize_each(tok):
+        return lambda items: [tok(text, max_length=max_len, truncation=True) for text in items]
+
+    def tokenize_batches(items):
+        for batch in batches(items):
+            model.preprocess_batch(batch)
+
+    inputs = [model.preprocess_batch(batch) for batch in batches(texts)]
+
+    def model_batches(_):
+        for batch_inputs in inputs:
+            model.predict_inputs_batch(batch_inputs)
+
+    single_inputs = [model.preprocess(text) for text in texts]
+
+    def model_each(_):
+        for text_inputs in single_inputs:
+            model.predict(text_inputs)
+
+    print(f"{len(texts)} texts, tokenizer {type(tokenizer).__name__} (fast={tokenizer.is_fast}), "
+          f"batch size {BATCH_SIZE}")
+    results = []
+    if slow_tokenizer is not None:
+        results.append(("tokenize, slow, per text", best_ms_per_text(tokenize_each(slow_tokenizer), texts)))
+    results += [
+        ("tokenize, model tokenizer, per text", best_ms_per_text(tokenize_each(tokenizer), texts)),
+        ("tokenize + pad, batched", best_ms_per_text(tokenize_batches, texts)),
+        ("model, per text", best_ms_per_text(model_each, texts)),
+        ("model, batched", best_ms_per_text(model_batches, texts)),
+    ]
+    for name, ms in results:
+        print(f"{name:40s} {ms:8.3f} ms/text")
+
+
+if __name__ == "__main__":
+    main()
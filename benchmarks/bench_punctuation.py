@@ -0,0 +1,77 @@
+"""
+Worst-case inputs for map_punctuation protected-span handling.
+
+Run from the project root:
+    python benchmarks/bench_punctuation.py
+
+Cost must stay linear in text length: for every input the time of a
+5000-char text (RequestsBase.max_length) is compared with a 2500-char one.
+Exits with code 1 when the ratio looks quadratic.
+"""
+
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from services.text_normalizer import TextNormalizer
+from services.text_utils import map_punctuation
+
+
+MAX_LEN = 5000
+REPEATS = 5
+# linear cost gives ~2.0, quadratic ~4.0:
+MAX_SCALING_RATIO = 3.0
+
+ADVERSARIAL_UNITS = {
+    "open_brackets": "[",
+    "close_brackets": "]",
+    "dense_tokens": "[SPP_1]",
+    "tokens_and_punct": "[SPP_12]!,",
+    "bracket_pairs": "[!]",
+    "unclosed_brackets_punct": ".[,",
+    "punct_runs": "!?.,",
+    "plain_text": "привет, мир! ",
+}
+
+
+def make_text(unit: str, length: int) -> str:
+    return (unit * (length // len(unit) + 1))[:length]
+
+
+def best_time(func, text: str) -> float:
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        func(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> int:
+    normalizer = TextNormalizer(None, [], {
+        "emoji": {}, "emoticon": {}, "rep_punct": {}, "sep_punct": {}, "profanity": {},
+    }, mapping_dict={})
+
+    implementations = {
+        "text_utils.map_punctuation": lambda text: map_punctuation(text, {}, {}),
+        "TextNormalizer.map_punctuation": normalizer.map_punctuation,
+    }
+
+    failed = False
+    print(f"{'implementation':32} {'input':24} {'ms@5000':>9} {'ratio':>6}")
+    for impl_name, func in implementations.items():
+        for input_name, unit in ADVERSARIAL_UNITS.items():
+            full = best_time(func, make_text(unit, MAX_LEN))
+            half = best_time(func, make_text(unit, MAX_LEN // 2))
+            ratio = full / half if half > 0 else 0.0
+            status = "" if ratio < MAX_SCALING_RATIO else "  <-- superlinear"
+            failed = failed or bool(status)
+            print(f"{impl_name:32} {input_name:24} {full * 1000:9.2f} {ratio:6.2f}{status}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
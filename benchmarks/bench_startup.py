@@ -0,0 +1,121 @@
+"""
+Cold start of main:app for different predictor mixes.
+
+Run from the project root:
+    python benchmarks/bench_startup.py [config.json] [mix ...]
+
+A mix is a comma separated list of predictor indices of the config, e.g. "0" or "0,1".
+By default: the predictors of each model_type separately, then all of them.
+Every run is a fresh process: import main, start the app (lifespan, as uvicorn does,
+including init_db), then wait until /ready answers 200.
+Times are the best of REPEATS runs, in s; RSS is the peak of that run.
+"""
+
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+
+REPEATS = 3
+READY_TIMEOUT_S = 600
+HEAVY_MODULES = ("torch", "transformers", "onnxruntime", "sklearn", "pandas", "scipy")
+
+
+def child() -> None:
+    """Runs in the measured process, prints one json line"""
+
+    start = time.perf_counter()
+    sys.path.insert(0, str(SRC_DIR))
+    import main
+    imported = time.perf_counter()
+    heavy_on_import = [name for name in HEAVY_MODULES if name in sys.modules]
+
+    from fastapi.testclient import TestClient
+
+    with TestClient(main.app) as client:
+        started = time.perf_counter()
+        while True:
+            response = client.get("/ready")
+            states = [model["state"] for model in response.json()["models"]]
+            if response.status_code == 200 or all(state == "failed" for state in states):
+                break
+            if time.perf_counter() - start > READY_TIMEOUT_S:
+                break
+            time.sleep(0.01)
+        ready = time.perf_counter()
+
+    print(json.dumps({
+        "import_s": imported - start,
+        "lifespan_s": started - imported,
+        "ready_s": ready - start,
+        "ready": response.status_code == 200,
+        "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "heavy_on_import": heavy_on_import,
+        "heavy_on_ready": [name for name in HEAVY_MODULES if name in sys.modules],
+    }))
+
+
+def run_mix(config: dict, indices: list) -> dict:
+    mix_config = dict(config, predictors=[config["predictors"][i] for i in indices])
+    mix_config.pop("cascade", None)
+
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as fh:
+        json.dump(mix_config, fh)
+        config_path = fh.name
+
+    try:
+        runs = []
+        for _ in range(REPEATS):
+            out = subprocess.run(
+                [sys.executable, __file__, "--child"],
+                env=dict(os.environ, MODEL_CONFIG=config_path),
+                capture_output=True, text=True, check=True,
+            )
+            runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    finally:
+        os.remove(config_path)
+
+    best = min(runs, key=lambda run: run["ready_s"])
+    best["import_s"] = min(run["import_s"] for run in runs)
+    return best
+
+
+def default_mixes(config: dict) -> list:
+    by_type = {}
+    for i, predictor in enumerate(config["predictors"]):
+        by_type.setdefault(predictor.get("model_type", "linear_svm"), []).append(i)
+
+    mixes = list(by_type.values())
+    if len(mixes) > 1:
+        mixes.append(list(range(len(config["predictors"]))))
+    return mixes
+
+
+def main() -> None:
+    config_path = sys.argv[1] if len(sys.argv) > 1 else "src/config.json"
+    with open(config_path, encoding="utf-8") as fh:
+        config = json.load(fh)
+
+    mixes = [[int(i) for i in mix.split(",")] for mix in sys.argv[2:]] or default_mixes(config)
+
+    print(f"{'predictors':30s} {'import':>8s} {'lifespan':>9s} {'ready':>8s} {'rss MB':>8s}  heavy modules on import / ready")
+    for indices in mixes:
+        name = "+".join(config["predictors"][i].get("model_type", "linear_svm") for i in indices)
+        result = run_mix(config, indices)
+        status = "" if result["ready"] else "  (not ready)"
+        print(f"{name:30s} {result['import_s']:8.2f} {result['lifespan_s']:9.2f} {result['ready_s']:8.2f} "
+              f"{result['rss_mb']:8.0f}  {','.join(result['heavy_on_import']) or '-'} / "
+              f"{','.join(result['heavy_on_ready']) or '-'}{status}")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["--child"]:
+        child()
+    else:
+        main()
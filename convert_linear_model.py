@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+import argparse
+import pickle
+import sys
+from pathlib import Path
+
+import numpy as np
+from scipy.sparse import hstack
+
+sys.path.append(str(Path(__file__).parent / "src"))
+
+from services.linear_scorer import MappedLinearScorer, save_mapped
+from services.text_utils import get_num_features_batch, get_num_features_dense
+from services.utils import load_config
+
+
+CHECK_TEXTS = [
+    "привет, как дела?",
+    "ты вообще нормальный???",
+    "спасибо, всё получилось",
+    "не пиши мне больше",
+    "это лучший ответ в треде, без шуток",
+]
+
+
+def load_pickle_file(path: str):
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def preprocess_texts(texts: list, config_path: str, predictor: int) -> list:
+    """Texts as LinearSVMModel scores them: after the text preprocessor of the predictor"""
+
+    from services.text_preprocessor import LinearSVMPreprocessorSI
+
+    predictor_conf = load_config(config_path)["predictors"][predictor]
+    preprocessor = LinearSVMPreprocessorSI(config=predictor_conf)
+    try:
+        texts, _ = preprocessor.preprocess_batch(texts, use_num_features=False)
+    finally:
+        preprocessor.close()
+
+    return texts
+
+
+def check_parity(encoder, model, scorer: MappedLinearScorer, texts: list) -> bool:
+    """
+    Compare mapped scorer with encoder.transform -> hstack -> model on texts
+    """
+
+    inputs = encoder.transform(texts)
+    if scorer.n_num:
+        inputs = hstack([inputs, get_num_features_batch(texts)], format="csr")
+    num_features = get_num_features_dense(texts) if scorer.n_num else None
+
+    rows = [scorer.transform(text, None if num_features is None else num_features[i])
+            for i, text in enumerate(texts)]
+    preds = np.array([scorer.predict(row) for row in rows])
+    scores = np.array([scorer.decision_function(row) for row in rows]).reshape(len(texts), -1)
+
+    ref_preds = model.predict(inputs)
+    ref_scores = np.asarray(model.decision_function(inputs)).reshape(len(texts), -1)
+
+    mismatches = int((preds != ref_preds).sum())
+    print(f"Texts: {len(texts)}")
+    print(f"Different predictions: {mismatches}")
+    print(f"Max decision_function difference: {np.abs(scores - ref_scores).max():.3g}")
+
+    return mismatches == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert pickled LinearSVM model + encoder to a memory-mapped artifact")
+    parser.add_argument("model_path", help="model.pkl")
+    parser.add_argument("encoder_path", help="encoder.pkl")
+    parser.add_argument("out_dir", help="out_dir.mmap")
+    parser.add_argument("texts_path", nargs="?", help="optional texts.txt for the parity check, one text per line")
+    parser.add_argument("--config", default="src/config.json",
+                        help="config whose predictor preprocesses texts before the check, as the service does")
+    parser.add_argument("--predictor", type=int, default=0, help="predictor index in --config")
+    parser.add_argument("--raw", action="store_true", help="check on texts as they are, without preprocessing")
+    args = parser.parse_args()
+
+    if args.texts_path:
+        with open(args.texts_path, encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()]
+    else:
+        texts = CHECK_TEXTS
+    if not args.raw:
+        texts = preprocess_texts(texts, args.config, args.predictor)
+
+    model = load_pickle_file(args.model_path)
+    encoder = load_pickle_file(args.encoder_path)
+
+    out_dir = save_mapped(encoder, model, args.out_dir)
+    size = sum(f.stat().st_size for f in out_dir.iterdir())
+    print(f"Mapped artifact written to {out_dir} ({size / 2**20:.1f} MB)")
+
+    if not check_parity(encoder, model, MappedLinearScorer(out_dir), texts):
+        print("Error: predictions differ, do not use this artifact")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
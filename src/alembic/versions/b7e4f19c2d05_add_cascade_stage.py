@@ -0,0 +1,36 @@
+"""Add cascade_stage to user_requests
+
+Revision ID: b7e4f19c2d05
+Revises: a1b2c3d4e5f6
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e4f19c2d05'
+down_revision: Union[str, Sequence[str], None] = 'a1b2c3d4e5f6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add cascade_stage column."""
+    op.add_column(
+        'user_requests',
+        sa.Column('cascade_stage', sa.Integer(), nullable=True)
+    )
+    op.create_index(
+        op.f('ix_user_requests_cascade_stage'),
+        'user_requests', ['cascade_stage'], unique=False
+    )
+
+
+def downgrade() -> None:
+    """Remove cascade_stage column."""
+    op.drop_index(op.f('ix_user_requests_cascade_stage'), table_name='user_requests')
+    op.drop_column('user_requests', 'cascade_stage')
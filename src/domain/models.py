@@ -137,5 +137,10 @@ class UserRequests(Base):
         index=True,
     )
 
+    cascade_stage: Mapped[Optional[int]] = mapped_column(
+        nullable=True,
+        index=True,
+    )
+
     def __repr__(self) -> str:
         return f"<UserRequests(id={self.id}, user_id={self.user_id}, timestamp={self.timestamp})>"
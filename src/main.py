@@ -1,10 +1,11 @@
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
 from prometheus_fastapi_instrumentator import Instrumentator
 
 from database import init_db, close_db
-from routers import users, forward, requests, monitoring
+from routers import users, forward, requests, monitoring, admin
 from services.model_registry import ModelRegistry
+from services.registry_reloader import RegistryReloader
 
 
 # ==============================================================================
@@ -14,10 +15,16 @@ from services.model_registry import ModelRegistry
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_db()
-    app.state.registry = ModelRegistry()
+    # predictors load and warm up in background, see /ready: 
+    app.state.registry = ModelRegistry(background=True)
+    # POST /admin/reload and optional watcher swap app.state.registry: 
+    app.state.reloader = RegistryReloader(app.state)
+    app.state.reloader.start_watcher()
 
     yield
 
+    await app.state.reloader.close()
+    app.state.registry.close()
     await close_db()
 
 
@@ -36,6 +43,7 @@ app.include_router(users.router)
 app.include_router(forward.router)   
 app.include_router(requests.router)   
 app.include_router(monitoring.router)
+app.include_router(admin.router)
 
 # Prometheus metrics at /metrics
 Instrumentator().instrument(app).expose(app)
@@ -46,6 +54,19 @@ async def health():
     return {"status": "ok"}
 
 
+@app.get("/ready")
+async def ready(request: Request, response: Response):
+    """
+    Readiness probe, separate from /health liveness:
+    200 when no predictor is loading / warming and at least one is ready, 503 otherwise.
+    """
+    registry = request.app.state.registry
+    if not registry.is_ready:
+        response.status_code = 503
+
+    return {"ready": registry.is_ready, "models": registry.states()}
+
+
 @app.get("/")
 async def root():
     """
@@ -58,6 +79,8 @@ async def root():
         "endpoints": {
             "register": "POST /register",
             "forward": "POST /forward",
+            "ready": "GET /ready",
+            "reload": "POST /admin/reload",
             "history": "GET /history",
             "stats": "GET /history/stats",
             "users": "GET /users"
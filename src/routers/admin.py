@@ -0,0 +1,46 @@
+"""
+Admin operations on the running service.
+"""
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+
+from domain.models import User
+from auth.dependencies import get_admin_user
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["Admin"]
+)
+
+
+@router.post("/reload", status_code=status.HTTP_202_ACCEPTED)
+async def reload_predictors(
+    request: Request,
+    current_user: User = Depends(get_admin_user)
+):
+    """
+    Reload predictors from config.json without restart (Admin only).
+    New models are loaded and warmed up in background, then replace the current ones;
+    requests keep being served by the current models meanwhile. Poll GET /admin/reload for the result.
+    """
+    reloader = request.app.state.reloader
+    if not reloader.start_reload():
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Reload is already running"
+        )
+
+    return reloader.info()
+
+
+@router.get("/reload")
+async def reload_status(
+    request: Request,
+    current_user: User = Depends(get_admin_user)
+):
+    """
+    Status of the last reload and the predictors now serving requests (Admin only).
+    """
+    return {
+        **request.app.state.reloader.info(),
+        "models": request.app.state.registry.states(),
+    }
@@ -22,7 +22,8 @@ async def forward(
     current_user: User = Depends(get_current_user)
 ):
     """
-    Run all configured models in parallel for the submitted text.
+    Run all configured models in parallel for the submitted text
+    (or the cascade stages, the last returned row is the decision).
     Parallel execution and Prometheus metrics are handled inside the service layer.
     """
     if not body.text_raw:
@@ -35,7 +36,7 @@ async def forward(
         raise HTTPException(status_code=503, detail="no models available")
 
     db_rows: List[UserRequests] = []
-    for model_id, pred_int, pred_label, processing_time_ms in results:
+    for model_id, pred_int, pred_label, processing_time_ms, cascade_stage in results:
         db_rows.append(UserRequests(
             user_id=current_user.id,
             text_raw=body.text_raw,
@@ -44,6 +45,7 @@ async def forward(
             model_id=model_id,
             processing_time_ms=processing_time_ms,
             text_length=len(body.text_raw),
+            cascade_stage=cascade_stage,
         ))
 
     db.add_all(db_rows)
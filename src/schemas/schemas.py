@@ -42,6 +42,7 @@ class RequestResponse(RequestsBase):
     model_id: Optional[str] = None
     processing_time_ms: Optional[float] = None
     text_length: Optional[int] = None
+    cascade_stage: Optional[int] = None
     model_config = ConfigDict(from_attributes=True)
 
 
@@ -0,0 +1,213 @@
+"""
+Persistent local cache of S3 artifacts, keyed by bucket / key / ETag.
+
+Objects are streamed to disk in chunks, an interrupted download is resumed with a
+Range request, and an object whose ETag is already cached is not downloaded again.
+Several processes may share one cache directory: each key is fetched under a file lock,
+and once a new ETag of a key is downloaded its older versions are deleted.
+
+Layout of cache_dir:
+    objects/<sha256(bucket/key)>/.lock                                   lock of the key
+    objects/<sha256(bucket/key)>/<sha256(bucket/key/etag)>/<file name>   downloaded objects
+    objects/<...>/<...>/<file name>.part                                 unfinished download
+    dirs/<sha256(bucket/prefix/files/etags)>/                            model directories (hard links to objects)
+"""
+
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from prometheus_client import Counter
+
+try:
+    import fcntl
+except ImportError:  # windows, no cross-process lock
+    fcntl = None
+
+
+logger = logging.getLogger(__name__)
+
+# prometheus info:
+S3_ARTIFACT_CACHE_TOTAL = Counter(
+    "s3_artifact_cache_total",
+    "S3 artifact lookups in the local cache by result (hit / miss / resumed)",
+    ["result"],
+)
+
+S3_ARTIFACT_DOWNLOAD_BYTES = Counter(
+    "s3_artifact_download_bytes_total",
+    "Bytes of S3 artifacts downloaded into the local cache",
+)
+
+DEFAULT_CACHE_DIR = Path(tempfile.gettempdir()) / "s3_artifacts"
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+DEFAULT_MAX_WORKERS = 4
+
+# paths from prefetch, each used once by the next fetch of the object (no second HEAD at startup):
+_prefetched: Dict[Tuple[str, str, str], Path] = {}
+
+
+class _FileLock:
+    """Exclusive lock of path between processes (and threads, each one opens its own file)"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._fh = None
+
+    def __enter__(self):
+        self._fh = open(self.path, "a+b")
+        if fcntl is not None:
+            fcntl.flock(self._fh, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self._fh, fcntl.LOCK_UN)
+        self._fh.close()
+
+
+def _digest(*parts: str) -> str:
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+
+class S3ArtifactCache:
+    """Downloads S3 objects into cache_dir once per ETag and returns their local paths"""
+
+    def __init__(self, s3_client, cache_dir=DEFAULT_CACHE_DIR,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE, max_workers: int = DEFAULT_MAX_WORKERS):
+        """
+        :param s3_client: boto3 s3 client (or anything with head_object / get_object)
+        """
+
+        self.s3_client = s3_client
+        self.cache_dir = Path(cache_dir)
+        self.chunk_size = chunk_size
+        self.max_workers = max(1, max_workers)
+
+    def prefetch(self, bucket: str, key: str) -> Path:
+        """fetch, the next fetch of the same object in this process returns the path without a HEAD"""
+
+        path = self.fetch(bucket, key)
+        _prefetched[(str(self.cache_dir), bucket, key)] = path
+        return path
+
+    def fetch(self, bucket: str, key: str) -> Path:
+        """Local path of s3://bucket/key, downloaded if its current ETag is not cached"""
+
+        path = _prefetched.pop((str(self.cache_dir), bucket, key), None)
+        if path is not None and path.exists():
+            return path
+
+        head = self.s3_client.head_object(Bucket=bucket, Key=key)
+        etag = head["ETag"].strip('"')
+        size = head["ContentLength"]
+
+        key_dir = self.cache_dir / "objects" / _digest(bucket, key)
+        object_dir = key_dir / _digest(bucket, key, etag)
+        path = object_dir / Path(key).name
+        if path.exists():
+            S3_ARTIFACT_CACHE_TOTAL.labels(result="hit").inc()
+            return path
+
+        key_dir.mkdir(parents=True, exist_ok=True)
+        with _FileLock(key_dir / ".lock"):
+            # another process could finish it while we waited for the lock:
+            if path.exists():
+                S3_ARTIFACT_CACHE_TOTAL.labels(result="hit").inc()
+                return path
+            object_dir.mkdir(exist_ok=True)
+            self._download(bucket, key, etag, size, path)
+            self._remove_old_versions(key_dir, object_dir)
+
+        return path
+
+    @staticmethod
+    def _remove_old_versions(key_dir: Path, object_dir: Path) -> None:
+        """Delete other ETags of the key, call under the key lock.
+        Open or mapped files stay readable, directories in dirs/ keep their hard links."""
+
+        for version_dir in key_dir.iterdir():
+            if version_dir.is_dir() and version_dir != object_dir:
+                shutil.rmtree(version_dir, ignore_errors=True)
+                logger.info("Removed old version %s of %s", version_dir.name, object_dir.name)
+
+    def _download(self, bucket: str, key: str, etag: str, size: int, path: Path) -> None:
+        """Stream object into path.part (continuing it if present), then rename to path"""
+
+        part = path.with_name(path.name + ".part")
+        offset = part.stat().st_size if part.exists() else 0
+        if offset > size:  # not a prefix of this object
+            offset = 0
+
+        result = "resumed" if offset else "miss"
+        if offset < size:
+            request = {"Bucket": bucket, "Key": key, "IfMatch": f'"{etag}"'}
+            if offset:
+                request["Range"] = f"bytes={offset}-"
+            obj = self.s3_client.get_object(**request)
+            if offset and not obj.get("ContentRange"):  # range ignored, full object sent
+                offset, result = 0, "miss"
+
+            logger.info("Downloading s3://%s/%s (%d bytes, from %d) …", bucket, key, size, offset)
+            with open(part, "r+b" if offset else "wb") as fh:
+                fh.seek(offset)
+                fh.truncate()
+                for chunk in obj["Body"].iter_chunks(self.chunk_size):
+                    fh.write(chunk)
+                    S3_ARTIFACT_DOWNLOAD_BYTES.inc(len(chunk))
+                fh.flush()
+                os.fsync(fh.fileno())
+
+        downloaded = part.stat().st_size
+        if downloaded != size:  # part is kept, next fetch resumes it
+            raise IOError(f"s3://{bucket}/{key}: got {downloaded} of {size} bytes")
+
+        os.replace(part, path)
+        S3_ARTIFACT_CACHE_TOTAL.labels(result=result).inc()
+        logger.info("Cached s3://%s/%s at %s", bucket, key, path)
+
+    def fetch_many(self, bucket: str, keys: List[str]) -> Dict[str, Path]:
+        """fetch for every key, max_workers downloads at a time"""
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, max(1, len(keys)))) as pool:
+            paths = list(pool.map(lambda key: self.fetch(bucket, key), keys))
+        return dict(zip(keys, paths))
+
+    def fetch_dir(self, bucket: str, prefix: str, files: List[str]) -> Path:
+        """
+        Local directory with prefix/<file> for every file, as from_pretrained expects.
+        Same files with same ETags give the same directory.
+        """
+
+        prefix = prefix.rstrip("/")
+        paths = self.fetch_many(bucket, [f"{prefix}/{fname}" for fname in files])
+
+        snapshot = [bucket, prefix] + [f"{fname}={paths[f'{prefix}/{fname}'].parent.name}" for fname in files]
+        model_dir = self.cache_dir / "dirs" / _digest(*snapshot)
+        if model_dir.exists():
+            return model_dir
+
+        # built aside and renamed, so model_dir is either complete or missing:
+        model_dir.parent.mkdir(parents=True, exist_ok=True)
+        tmp_dir = Path(tempfile.mkdtemp(prefix=model_dir.name + ".", dir=model_dir.parent))
+        try:
+            for fname in files:
+                target = tmp_dir / fname
+                target.parent.mkdir(parents=True, exist_ok=True)
+                try:
+                    os.link(paths[f"{prefix}/{fname}"], target)
+                except OSError:  # no hard links on this file system
+                    shutil.copyfile(paths[f"{prefix}/{fname}"], target)
+            os.rename(tmp_dir, model_dir)
+        except OSError:
+            if not model_dir.exists():
+                raise
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        return model_dir
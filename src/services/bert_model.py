@@ -0,0 +1,392 @@
+"""
+BERT predictors. Kept apart from services.model so torch / transformers are imported
+only when a BERT predictor is created (see PREDICTOR_TYPE_REGISTRY).
+"""
+
+import bisect
+import hashlib
+import logging
+import os
+import tempfile
+import time
+
+import numpy as np
+import torch
+
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from transformers import BertForSequenceClassification, BertTokenizer, BertTokenizerFast
+
+from core.config import MODEL_CONFIG
+from services.cache import text_digest
+from services.model import Model, decision_margins, _PROJECT_ROOT
+from services.text_preprocessor import BertPreprocessor
+from services.utils import get_artifact_cache
+
+try:  # transformers >= 5: BertTokenizer is the fast one, the pure-python one is renamed
+    from transformers.models.bert import BertTokenizerLegacy as BertTokenizerSlow
+except ImportError:
+    BertTokenizerSlow = BertTokenizer
+
+
+# BERT batches are grouped by token length into these size classes: 
+DEFAULT_LENGTH_BUCKETS = (16, 32, 64, 128)
+
+# logger: 
+logger = logging.getLogger(__name__)
+
+
+class BertClassifierModel(Model):
+    """
+    Wraps a fine-tuned BertForSequenceClassification model.
+    """
+
+    def __init__(self, config_path=MODEL_CONFIG, worker_id=0):
+        # torch / transformers are loaded lazily inside load_custom_weights: 
+        self._bert_model = None
+        self._tokenizer = None
+        self._device = None
+        self._model_dir: Optional[Path] = None
+        self._max_len: int = 128
+        self._dynamic_padding: bool = True
+        self._length_buckets: List[int] = list(DEFAULT_LENGTH_BUCKETS)
+        super().__init__(config_path, worker_id)
+        self.text_preprocessor = BertPreprocessor(config=self.config_model)
+
+    def load_custom_weights(self):
+        """Load BertForSequenceClassification and its tokenizer."""
+
+        self._model_dir = self._resolve_model_dir()
+        self._max_len = int(self.config_model.get("max_len", 128))
+        # "dynamic" pads a batch to its longest text, "max_length" always to max_len: 
+        self._dynamic_padding = self.config_model.get("padding", "dynamic") != "max_length"
+        buckets = self.config_model.get("length_buckets", DEFAULT_LENGTH_BUCKETS)
+        self._length_buckets = sorted({min(int(b), self._max_len) for b in buckets} | {self._max_len})
+        self._device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+        self._bert_model = BertForSequenceClassification.from_pretrained(str(self._model_dir))
+        self._bert_model.to(self._device)
+        self._bert_model.eval()
+
+        self._tokenizer = self._load_tokenizer(self._model_dir)
+        logger.info("BertClassifierModel loaded from %s on %s", self._model_dir, self._device)
+
+    def _load_tokenizer(self, model_dir: Path):
+        """Rust-backed fast tokenizer if the artifact supports it, else the slow one"""
+
+        if self.config_model.get("fast_tokenizer", True):
+            if not (model_dir / "tokenizer.json").exists():
+                logger.info("No tokenizer.json in %s, building fast tokenizer from vocab", model_dir)
+            try:
+                tokenizer = BertTokenizerFast.from_pretrained(str(model_dir))
+                if tokenizer.is_fast:
+                    return tokenizer
+            except (OSError, ValueError, ImportError) as e:
+                logger.warning("Fast tokenizer unavailable for %s: %s", model_dir, e)
+
+        logger.info("Using slow tokenizer for %s", model_dir)
+        return BertTokenizerSlow.from_pretrained(str(model_dir))
+
+    def _s3_artifacts(self) -> Tuple[List[str], List[str]]:
+        required, optional = super()._s3_artifacts()
+        model_prefix = self.config_model.get("model_path").rstrip("/")
+
+        return required + [f"{model_prefix}/{fname}" for fname in self.config_model.get("bert_files", [])], optional
+
+    def _resolve_model_dir(self) -> Path:
+        """Local model directory, downloaded from s3 if needed"""
+
+        if self.storage_type == "local":
+            model_dir = _PROJECT_ROOT / Path(self._model_path)
+            if not model_dir.exists():
+                raise FileNotFoundError(f"BERT model directory not found: {model_dir}")
+
+        elif self.storage_type == "s3":
+
+            bucket = self.config_model.get("bucket_name", "toxic-messages-bucket-1")
+            model_prefix = self._model_path.rstrip("/")  # e.g. "models/v1"
+
+            # files are kept on disk by ETag, unchanged ones are not downloaded again: 
+            cache = get_artifact_cache({**self.config_model, "bucket_name": bucket}, self.config_path)
+            model_dir = cache.fetch_dir(bucket, model_prefix, self.config_model.get("bert_files"))
+            logger.info("BERT files of s3://%s/%s are in %s", bucket, model_prefix, model_dir)
+
+        else:
+            raise ValueError(f"Unsupported storage_type for BertClassifierModel: {self.storage_type}")
+
+        return model_dir
+
+    def _tokenize(self, texts: List[str]):
+        return self._tokenizer(
+            texts,
+            max_length=self._max_len,
+            padding="longest" if self._dynamic_padding else "max_length",
+            truncation=True,
+            return_tensors="pt",
+        )
+
+    def _bucket_of(self, length: int) -> int:
+        """Smallest length bucket holding a sequence of given length"""
+
+        return self._length_buckets[bisect.bisect_left(self._length_buckets, length)]
+
+    def preprocess_batch(self, texts: List[str]):
+        """
+        Tokenize all texts and group them by length bucket, each group padded to its longest text.
+        Returns list of (positions in texts, input_ids, attention_mask).
+        """
+
+        texts_preprocessed = self.text_preprocessor.preprocess_batch(texts)
+
+        if not self._dynamic_padding:
+            encoding = self._tokenize(texts_preprocessed)
+            return [(
+                list(range(len(texts))),
+                encoding["input_ids"].to(self._device),
+                encoding["attention_mask"].to(self._device),
+            )]
+
+        # one tokenizer call without padding, then texts sorted into size classes: 
+        encoded = self._tokenizer(texts_preprocessed, max_length=self._max_len, truncation=True)["input_ids"]
+        buckets: Dict[int, List[int]] = {}
+        for i, ids in enumerate(encoded):
+            buckets.setdefault(self._bucket_of(len(ids)), []).append(i)
+
+        groups = []
+        for bucket in sorted(buckets):
+            positions = buckets[bucket]
+            groups.append((positions, *self._pad([encoded[i] for i in positions])))
+        return groups
+
+    def _pad(self, ids_list: List[List[int]]):
+        """Right-pad token ids to the longest one, same as tokenizer padding="longest" """
+
+        width = max(len(ids) for ids in ids_list)
+        input_ids = torch.full((len(ids_list), width), self._tokenizer.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(ids_list), width), dtype=torch.long)
+        for row, ids in enumerate(ids_list):
+            input_ids[row, :len(ids)] = torch.tensor(ids, dtype=torch.long)
+            attention_mask[row, :len(ids)] = 1
+
+        return input_ids.to(self._device), attention_mask.to(self._device)
+
+    def predict_inputs_batch(self, inputs) -> List[int]:
+        """One forward pass per length bucket, predictions in original order"""
+
+        return self.predict_margins_batch(inputs)[0]
+
+    def predict_margins_batch(self, inputs) -> Tuple[List[int], List[float]]:
+        """Predictions and logit margins, in original order"""
+
+        size = sum(len(positions) for positions, _, _ in inputs)
+        preds, margins = [0] * size, [0.0] * size
+        with torch.no_grad():
+            for positions, input_ids, attention_mask in inputs:
+                logits = self._logits(input_ids, attention_mask).float()
+                bucket_preds = torch.argmax(logits, dim=1).tolist()
+                for i, pred, margin in zip(positions, bucket_preds, decision_margins(logits.cpu().numpy())):
+                    preds[i] = int(pred)
+                    margins[i] = margin
+        return preds, margins
+
+    def _logits(self, input_ids, attention_mask):
+        """Forward pass -> logits tensor (batch, num_labels)"""
+
+        return self._bert_model(input_ids, attention_mask=attention_mask).logits
+
+    def preprocess(self, text: str):
+        """Tokenize text and return (input_ids, attention_mask) tensors on the model device."""
+        
+        # simple preprocess: 
+        text_preprocessed = self.text_preprocessor.preprocess(text)
+        
+        # a single text needs no padding at all with dynamic padding: 
+        encoding = self._tokenize(text_preprocessed)
+        return (
+            encoding["input_ids"].to(self._device),
+            encoding["attention_mask"].to(self._device),
+        )
+
+    def predict(self, inputs) -> int:
+        """Run forward pass and return integer class index."""
+
+        input_ids, attention_mask = inputs
+        with torch.no_grad():
+            pred = torch.argmax(self._logits(input_ids, attention_mask), dim=1).item()
+        return int(pred)
+
+
+class OptimizedBertModel(BertClassifierModel):
+    """
+    BertClassifierModel exported to an optimized CPU runtime ("onnx" or "torchscript"),
+    optionally with dynamic int8 quantization. Exports are cached on disk by content hash.
+    """
+
+    RUNTIMES = ("onnx", "torchscript")
+
+    def __init__(self, config_path=MODEL_CONFIG, worker_id=0):
+        self._runtime: str = "onnx"
+        self._quantize: bool = False
+        self._session = None
+        self.parity_agreement: Optional[float] = None
+        super().__init__(config_path, worker_id)
+
+        # needs text_preprocessor, so runs after weights are loaded: 
+        parity_path = self.config_model.get("parity_check_path")
+        if parity_path:
+            self._check_parity_file(_PROJECT_ROOT / Path(parity_path))
+
+        # the optimized runtime is used from now on: 
+        self._bert_model = None
+        logger.info("OptimizedBertModel ready: runtime=%s quantize=%s", self._runtime, self._quantize)
+
+    def load_custom_weights(self):
+        """Load eager BERT and export it (or take cached export)."""
+
+        super().load_custom_weights()
+        self._device = torch.device("cpu")
+        self._bert_model.to(self._device)
+
+        self._runtime = self.config_model.get("runtime", "onnx")
+        if self._runtime not in self.RUNTIMES:
+            raise ValueError(f"Unsupported runtime for OptimizedBertModel: {self._runtime}")
+        self._quantize = bool(self.config_model.get("quantize", False))
+
+        export_path = self._export_path()
+        if export_path.exists():
+            logger.info("Using cached %s export %s", self._runtime, export_path)
+        else:
+            self._export(export_path)
+        self._session = self._load_export(export_path)
+
+    def _export_path(self) -> Path:
+        """<export_cache_dir>/<digest of weights + export settings>.onnx|.pt"""
+
+        hasher = hashlib.sha256()
+        for path in sorted(p for p in self._model_dir.iterdir() if p.is_file()):
+            hasher.update(path.name.encode("utf-8"))
+            with open(path, "rb") as fh:
+                for chunk in iter(lambda: fh.read(1 << 20), b""):
+                    hasher.update(chunk)
+
+        key = text_digest(hasher.hexdigest(), self._runtime, str(self._quantize), torch.__version__)
+        cache_dir = self.config_model.get("export_cache_dir")
+        cache_dir = _PROJECT_ROOT / Path(cache_dir) if cache_dir else Path(tempfile.gettempdir()) / "bert_exports"
+        cache_dir.mkdir(parents=True, exist_ok=True)
+
+        suffix = ".onnx" if self._runtime == "onnx" else ".pt"
+        return cache_dir / f"{key[:32]}{suffix}"
+
+    def _export(self, export_path: Path) -> None:
+        """Export eager model to export_path (written to a temp file, then renamed)"""
+
+        start = time.perf_counter()
+        example = self._tokenizer(["пример текста"], return_tensors="pt")
+        example = (example["input_ids"], example["attention_mask"])
+        tmp_path = export_path.with_name(f".{export_path.name}.{os.getpid()}.tmp")
+
+        logits_module = _LogitsModule(self._bert_model).eval()
+
+        if self._runtime == "onnx":
+            fp32_path = tmp_path.with_suffix(".fp32") if self._quantize else tmp_path
+            with torch.no_grad():
+                torch.onnx.export(
+                    logits_module,
+                    example,
+                    str(fp32_path),
+                    input_names=["input_ids", "attention_mask"],
+                    output_names=["logits"],
+                    dynamic_axes={
+                        "input_ids": {0: "batch", 1: "sequence"},
+                        "attention_mask": {0: "batch", 1: "sequence"},
+                        "logits": {0: "batch"},
+                    },
+                    opset_version=17,
+                    dynamo=False,
+                )
+            if self._quantize:
+                from onnxruntime.quantization import QuantType, quantize_dynamic
+
+                quantize_dynamic(str(fp32_path), str(tmp_path), weight_type=QuantType.QInt8)
+                fp32_path.unlink()
+
+        else:
+            if self._quantize:
+                logits_module = torch.ao.quantization.quantize_dynamic(
+                    logits_module, {torch.nn.Linear}, dtype=torch.qint8
+                )
+            with torch.no_grad():
+                traced = torch.jit.trace(logits_module, example, strict=False)
+            torch.jit.save(traced, str(tmp_path))
+
+        os.replace(tmp_path, export_path)
+        logger.info("Exported %s to %s in %.1f s", self._runtime, export_path, time.perf_counter() - start)
+
+    def _load_export(self, export_path: Path):
+        if self._runtime == "onnx":
+            import onnxruntime
+
+            options = onnxruntime.SessionOptions()
+            options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+            return onnxruntime.InferenceSession(
+                str(export_path), sess_options=options, providers=["CPUExecutionProvider"]
+            )
+
+        return torch.jit.load(str(export_path), map_location="cpu")
+
+    def _logits(self, input_ids, attention_mask):
+        if self._session is None:  # before export: 
+            return super()._logits(input_ids, attention_mask)
+
+        if self._runtime == "onnx":
+            logits = self._session.run(["logits"], {
+                "input_ids": input_ids.numpy().astype(np.int64),
+                "attention_mask": attention_mask.numpy().astype(np.int64),
+            })[0]
+            return torch.from_numpy(logits)
+
+        return self._session(input_ids, attention_mask)
+
+    def check_parity(self, texts: List[str]) -> float:
+        """Share of texts where optimized runtime agrees with eager model (eager model must be loaded)"""
+
+        if not texts:
+            return 1.0
+
+        inputs = self.preprocess_batch(texts)
+        optimized = self.predict_inputs_batch(inputs)
+
+        session, self._session = self._session, None
+        try:
+            eager = self.predict_inputs_batch(inputs)
+        finally:
+            self._session = session
+
+        return sum(a == b for a, b in zip(optimized, eager)) / len(texts)
+
+    def _check_parity_file(self, path: Path) -> None:
+        """Validation texts, one per line; raise if agreement < parity_min_agreement"""
+
+        with open(path, encoding="utf-8") as fh:
+            texts = [line.rstrip("\n") for line in fh if line.strip()]
+
+        self.parity_agreement = self.check_parity(texts)
+        min_agreement = float(self.config_model.get("parity_min_agreement", 0.99))
+        logger.info("Parity of %s on %d texts: %.4f", self._runtime, len(texts), self.parity_agreement)
+
+        if self.parity_agreement < min_agreement:
+            raise ValueError(
+                f"Optimized BERT agrees with eager model on {self.parity_agreement:.4f} of {path}, "
+                f"required {min_agreement}"
+            )
+
+
+class _LogitsModule(torch.nn.Module):
+    """Exportable wrapper: (input_ids, attention_mask) -> logits"""
+
+    def __init__(self, bert_model):
+        super().__init__()
+        self.bert_model = bert_model
+
+    def forward(self, input_ids, attention_mask):
+        return self.bert_model(input_ids=input_ids, attention_mask=attention_mask).logits
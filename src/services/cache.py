@@ -0,0 +1,95 @@
+"""
+Thread-safe LRU cache bounded by entries and/or bytes, with optional TTL.
+Used for preprocessed model inputs and prediction results.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+
+def text_digest(*parts: str) -> str:
+    """sha256 of parts joined with a separator that does not occur in texts"""
+
+    hasher = hashlib.sha256()
+    for part in parts:
+        hasher.update(part.encode("utf-8", "surrogatepass"))
+        hasher.update(b"\x00")
+    return hasher.hexdigest()
+
+
+class LRUCache:
+    """LRU cache. Entries over max_items / max_bytes are evicted from the least recent end,
+    entries older than ttl_seconds are dropped on access."""
+
+    def __init__(self,
+                 max_items: Optional[int] = None,
+                 max_bytes: Optional[int] = None,
+                 ttl_seconds: Optional[float] = None,
+                 sizeof: Callable[[Any], int] = lambda value: 0):
+        """
+        :param sizeof: approximate size of value in bytes, required with max_bytes
+        """
+
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._sizeof = sizeof
+
+        # key -> (value, size, expires_at):
+        self._data: OrderedDict = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @property
+    def bytes_used(self) -> int:
+        return self._bytes
+
+    def get(self, key: str) -> Any:
+        """Cached value or None"""
+
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+
+            value, size, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                self._bytes -= size
+                return None
+
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: Any) -> None:
+        size = self._sizeof(value) + len(key)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+
+            self._data[key] = (value, size, expires_at)
+            self._bytes += size
+
+            while self._data and (
+                (self.max_items is not None and len(self._data) > self.max_items)
+                or (self.max_bytes is not None and self._bytes > self.max_bytes)
+            ):
+                _, (_, old_size, _) = self._data.popitem(last=False)
+                self._bytes -= old_size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
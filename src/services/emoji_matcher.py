@@ -0,0 +1,81 @@
+"""
+Emoji matcher with the same output as emoji.emoji_list, in one regex pass over text.
+
+Text is split into runs of chars that occur in some emoji sequence. An emoji never
+crosses a run boundary, so each distinct run is tokenized once: runs of the loaded
+vocabulary are resolved at build time, other runs by the emoji package and memoized.
+"""
+
+import re
+from typing import Iterable
+
+import emoji
+
+
+DEFAULT_MAX_CACHED_RUNS = 100000
+
+
+def _emoji_chars_regexp() -> str:
+    """Char class of every code point used in emoji.EMOJI_DATA, as ranges"""
+
+    code_points = sorted({ord(ch) for e in emoji.EMOJI_DATA for ch in e})
+
+    ranges = []
+    for cp in code_points:
+        if ranges and cp == ranges[-1][1] + 1:
+            ranges[-1][1] = cp
+        else:
+            ranges.append([cp, cp])
+
+    parts = []
+    for start, end in ranges:
+        if start == end:
+            parts.append(re.escape(chr(start)))
+        else:
+            parts.append(f"{re.escape(chr(start))}-{re.escape(chr(end))}")
+
+    return "[" + "".join(parts) + "]+"
+
+
+class EmojiMatcher:
+    """Memoized emoji tokenizer, safe to share between threads
+    (runs are only added to the memo, a race computes the same value twice)."""
+
+    def __init__(self, vocabulary: Iterable[str] = (), max_cached_runs: int = DEFAULT_MAX_CACHED_RUNS):
+        """
+        :param vocabulary: known emoji (keys of emoji encoding), resolved at build time
+        :param max_cached_runs: max number of memoized unseen runs
+        """
+
+        self._run_re = re.compile(_emoji_chars_regexp())
+        self.max_cached_runs = max_cached_runs
+
+        # run -> tuple of (start, end, emoji) inside run:
+        self._runs: dict = {}
+        for e in vocabulary:
+            self._runs[e] = self._tokenize(e)
+        self._vocabulary_size = len(self._runs)
+
+    @staticmethod
+    def _tokenize(run: str) -> tuple:
+        return tuple((item['match_start'], item['match_end'], item['emoji'])
+                     for item in emoji.emoji_list(run))
+
+    def _run_emoji(self, run: str) -> tuple:
+        found = self._runs.get(run)
+        if found is None:
+            found = self._tokenize(run)
+            if len(self._runs) - self._vocabulary_size < self.max_cached_runs:
+                self._runs[run] = found
+        return found
+
+    def emoji_list(self, text: str) -> list:
+        """Same as emoji.emoji_list(text)"""
+
+        result = []
+        for match in self._run_re.finditer(text):
+            offset = match.start()
+            for start, end, e in self._run_emoji(match.group(0)):
+                result.append({'match_start': offset + start, 'match_end': offset + end, 'emoji': e})
+
+        return result
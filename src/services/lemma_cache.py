@@ -0,0 +1,118 @@
+"""
+Bounded LRU cache of word -> lemma (pymorphy normal form).
+Chat vocabulary is Zipf-distributed, so a few thousand cached words cover most lookups.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Callable, Iterable, Optional
+
+from prometheus_client import Counter
+
+
+# prometheus info:
+LEMMA_CACHE_HITS = Counter(
+    "lemma_cache_hits_total",
+    "Number of lemma lookups served from the lemma cache",
+)
+
+LEMMA_CACHE_MISSES = Counter(
+    "lemma_cache_misses_total",
+    "Number of lemma lookups that required morphological analysis",
+)
+
+DEFAULT_LEMMA_CACHE_SIZE = 50000
+
+
+class LemmaCache:
+    """Thread-safe LRU cache, shared by all threads of ModelRegistry executor.
+    Lemmas are computed outside the lock, so concurrent misses never wait on each other
+    (the same word may be computed twice, the result is identical)."""
+
+    def __init__(self, maxsize: int = DEFAULT_LEMMA_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def lookup(self, word: str) -> Optional[str]:
+        """Cached lemma of word or None, never computes"""
+
+        with self._lock:
+            lemma = self._data.get(word)
+            if lemma is not None:
+                self._data.move_to_end(word)
+
+        if lemma is not None:
+            LEMMA_CACHE_HITS.inc()
+
+        return lemma
+
+    def get(self, word: str, compute: Callable[[str], str]) -> str:
+        """Return cached lemma of word, or compute and store it"""
+
+        if self.maxsize <= 0:
+            LEMMA_CACHE_MISSES.inc()
+            return compute(word)
+
+        with self._lock:
+            lemma = self._data.get(word)
+            if lemma is not None:
+                self._data.move_to_end(word)
+
+        if lemma is not None:
+            LEMMA_CACHE_HITS.inc()
+            return lemma
+
+        LEMMA_CACHE_MISSES.inc()
+        lemma = compute(word)
+        self.put(word, lemma)
+
+        return lemma
+
+    def put(self, word: str, lemma: str) -> None:
+        if self.maxsize <= 0:
+            return
+
+        with self._lock:
+            self._data[word] = lemma
+            self._data.move_to_end(word)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def seed(self, words: Iterable[str], compute: Callable[[str], str]) -> int:
+        """Pre-fill cache with words sorted by descending frequency.
+        Seeding does not count as hits/misses. Returns number of seeded words."""
+
+        pairs = []
+        for word in words:
+            if len(pairs) >= self.maxsize:
+                break
+            pairs.append((word, compute(word)))
+
+        # the most frequent words are put last, so they are evicted last:
+        for word, lemma in reversed(pairs):
+            self.put(word, lemma)
+
+        return len(pairs)
+
+
+def parse_word_frequencies(lines: Iterable[str], limit: Optional[int] = None) -> list:
+    """Words from a frequency file sorted by descending frequency:
+    one word per line, optionally followed by its count ('word 123' or 'word<TAB>123').
+    Files without counts are taken in their own order."""
+
+    words = []
+    for i, line in enumerate(lines):
+        parts = line.split()
+        if not parts:
+            continue
+        count = float(parts[1]) if len(parts) > 1 else 0.0
+        words.append((-count, i, parts[0].lower()))
+
+    words.sort()
+    words = [w for _, _, w in words]
+
+    return words[:limit] if limit is not None else words
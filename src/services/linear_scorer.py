@@ -0,0 +1,231 @@
+"""
+Compiled scorer for the pickled vectorizer + linear classifier pair.
+Computes the same decision values as encoder.transform -> hstack -> model.predict,
+but from token ids over plain NumPy arrays, without sklearn validation or sparse matrices.
+
+The same arrays can be saved as a memory-mapped artifact (a directory of .npy files, see
+save_mapped), MappedLinearScorer opens it read-only, so all processes using one artifact
+share its pages in the OS page cache instead of each unpickling its own vocabulary dict.
+"""
+
+import hashlib
+import json
+import pickle
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+
+# one input row: (feature indices, feature values), indices sorted like in csr rows:
+ScorerRow = Tuple[np.ndarray, np.ndarray]
+
+
+class CompiledLinearScorer:
+    """Vocabulary lookup, tf-idf weighting and linear decision of one predictor"""
+
+    def __init__(self, encoder, model):
+        """
+        :param encoder: fitted TfidfVectorizer / CountVectorizer
+        :param model: fitted linear classifier with coef_, intercept_ and classes_ (LinearSVC etc.)
+        """
+
+        for obj, attrs in ((encoder, ("vocabulary_", "build_analyzer")),
+                           (model, ("coef_", "intercept_", "classes_"))):
+            missing = [attr for attr in attrs if not hasattr(obj, attr)]
+            if missing:
+                raise ValueError(f"{type(obj).__name__} cannot be compiled, missing {missing}")
+
+        # tokenization is taken from the encoder itself, so tokens are identical:
+        self.analyzer = encoder.build_analyzer()
+        self.vocabulary = {token: int(j) for token, j in encoder.vocabulary_.items()}
+        self.n_vocab = len(self.vocabulary)
+
+        self.dtype = np.dtype(getattr(encoder, "dtype", np.float64))
+        self.binary = bool(getattr(encoder, "binary", False))
+        self.sublinear_tf = bool(getattr(encoder, "sublinear_tf", False))
+        self.norm = getattr(encoder, "norm", None)
+        self.idf = np.asarray(encoder.idf_, dtype=self.dtype) if getattr(encoder, "use_idf", False) else None
+
+        # (n_features, n_outputs) to take rows by feature index:
+        coef = np.asarray(model.coef_, dtype=np.float64)
+        self.coef = np.ascontiguousarray(coef.T)
+        self.intercept = np.asarray(model.intercept_, dtype=np.float64)
+        self.classes = model.classes_
+        self.n_num = coef.shape[1] - self.n_vocab
+        if self.n_num < 0:
+            raise ValueError(f"Model has {coef.shape[1]} features, vectorizer vocabulary {self.n_vocab}")
+
+    def transform(self, text: str, num_features: Optional[np.ndarray] = None) -> ScorerRow:
+        """Same values as the row of hstack([encoder.transform([text]), num_features])"""
+
+        indices, values = self._term_counts(self.analyzer(text))
+
+        if self.binary:
+            values[:] = 1
+        if self.sublinear_tf:
+            np.log(values, out=values)
+            values += 1
+        if self.idf is not None:
+            values *= self.idf[indices]
+
+        if self.norm == "l2":
+            norm = np.sqrt(np.dot(values, values))
+        elif self.norm == "l1":
+            norm = np.abs(values).sum()
+        else:
+            norm = 0
+        if norm > 0:
+            values /= norm
+
+        if self.n_num:
+            if num_features is None or len(num_features) != self.n_num:
+                raise ValueError(f"Model expects {self.n_num} num features")
+            nonzero = np.flatnonzero(num_features)
+            indices = np.concatenate([indices, self.n_vocab + nonzero])
+            values = np.concatenate([values.astype(np.float64), num_features[nonzero].astype(np.float64)])
+
+        return indices, values
+
+    def _term_counts(self, tokens: List[str]) -> ScorerRow:
+        """Sorted vocabulary indices of tokens and their counts"""
+
+        counts = {}
+        for token in tokens:
+            j = self.vocabulary.get(token)
+            if j is not None:
+                counts[j] = counts.get(j, 0) + 1
+
+        return self._sorted_counts(counts)
+
+    def _sorted_counts(self, counts: dict) -> ScorerRow:
+        indices = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        values = np.fromiter(counts.values(), dtype=self.dtype, count=len(counts))
+        order = np.argsort(indices)
+        return indices[order], values[order]
+
+    def decision_function(self, row: ScorerRow) -> np.ndarray:
+        indices, values = row
+        return values.astype(np.float64) @ self.coef[indices] + self.intercept
+
+    def predict(self, row: ScorerRow):
+        """Class label, same rule as sklearn linear classifiers"""
+
+        scores = self.decision_function(row)
+        if len(scores) == 1:
+            return self.classes[int(scores[0] > 0)]
+        return self.classes[int(np.argmax(scores))]
+
+
+# files of a memory-mapped artifact directory:
+MAPPED_META = "meta.json"
+MAPPED_ANALYZER = "analyzer.pkl"
+MAPPED_ARRAYS = ("tokens.npy", "token_offsets.npy", "token_hashes.npy", "token_ids.npy",
+                 "idf.npy", "coef.npy", "intercept.npy", "classes.npy")
+MAPPED_FILES = (MAPPED_META, MAPPED_ANALYZER) + MAPPED_ARRAYS
+# 2: vocabulary as utf-8 blob + offsets with a hash table (1 was a fixed-width S<max len> array)
+MAPPED_FORMAT_VERSION = 2
+
+
+def _token_hash(token: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(token, digest_size=8).digest(), "little")
+
+
+def save_mapped(encoder, model, out_dir) -> Path:
+    """
+    Convert fitted vectorizer + linear classifier to a memory-mapped artifact directory:
+    vocabulary as one utf-8 blob of tokens with their offsets, sorted by 64-bit token hash
+    (hashes and feature indices alongside), idf, coef etc. as .npy,
+    the analyzer as the unfitted vectorizer (same tokenization, no vocabulary).
+    """
+
+    from sklearn.base import clone  # conversion only, sklearn is imported by unpickling otherwise
+
+    scorer = CompiledLinearScorer(encoder, model)
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    # tokens with equal hashes end up next to each other, ordered by bytes: 
+    encoded = sorted((_token_hash(token.encode("utf-8")), token.encode("utf-8"), j)
+                     for token, j in scorer.vocabulary.items())
+    tokens = np.frombuffer(b"".join(token for _, token, _ in encoded), dtype=np.uint8)
+    token_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(token) for _, token, _ in encoded], out=token_offsets[1:])
+    token_hashes = np.array([h for h, _, _ in encoded], dtype=np.uint64)
+    token_ids = np.array([j for _, _, j in encoded], dtype=np.int64)
+    idf = scorer.idf if scorer.idf is not None else np.zeros(0, dtype=scorer.dtype)
+
+    for name, array in zip(MAPPED_ARRAYS, (tokens, token_offsets, token_hashes, token_ids, idf,
+                                          scorer.coef, scorer.intercept, np.asarray(scorer.classes))):
+        np.save(out_dir / name, array, allow_pickle=False)
+
+    with open(out_dir / MAPPED_ANALYZER, "wb") as f:
+        pickle.dump(clone(encoder), f)
+
+    meta = {
+        "format_version": MAPPED_FORMAT_VERSION,
+        "dtype": scorer.dtype.name,
+        "binary": scorer.binary,
+        "sublinear_tf": scorer.sublinear_tf,
+        "norm": scorer.norm,
+        "use_idf": scorer.idf is not None,
+        "n_vocab": scorer.n_vocab,
+        "n_num": scorer.n_num,
+    }
+    with open(out_dir / MAPPED_META, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=1)
+
+    return out_dir
+
+
+class MappedLinearScorer(CompiledLinearScorer):
+    """CompiledLinearScorer over a save_mapped directory, large arrays are read-only memory maps"""
+
+    def __init__(self, path):
+        path = Path(path)
+        with open(path / MAPPED_META, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("format_version") != MAPPED_FORMAT_VERSION:
+            raise ValueError(f"Unsupported mapped artifact version {meta.get('format_version')} in {path}")
+
+        with open(path / MAPPED_ANALYZER, "rb") as f:
+            self.analyzer = pickle.load(f).build_analyzer()
+
+        self.tokens = np.load(path / "tokens.npy", mmap_mode="r")
+        self.token_offsets = np.load(path / "token_offsets.npy", mmap_mode="r")
+        self.token_hashes = np.load(path / "token_hashes.npy", mmap_mode="r")
+        self.token_ids = np.load(path / "token_ids.npy", mmap_mode="r")
+        self.n_vocab = int(meta["n_vocab"])
+
+        self.dtype = np.dtype(meta["dtype"])
+        self.binary = bool(meta["binary"])
+        self.sublinear_tf = bool(meta["sublinear_tf"])
+        self.norm = meta["norm"]
+        self.idf = np.load(path / "idf.npy", mmap_mode="r") if meta["use_idf"] else None
+
+        self.coef = np.load(path / "coef.npy", mmap_mode="r")
+        self.intercept = np.load(path / "intercept.npy")
+        self.classes = np.load(path / "classes.npy")
+        self.n_num = int(meta["n_num"])
+
+    def _term_counts(self, tokens: List[str]) -> ScorerRow:
+        """Binary search of token hashes in the hash table, candidates compared by bytes"""
+
+        n = len(self.token_hashes)
+        if not tokens or not n:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=self.dtype)
+
+        encoded = [token.encode("utf-8") for token in tokens]
+        hashes = [_token_hash(token) for token in encoded]
+        positions = np.searchsorted(self.token_hashes, np.array(hashes, dtype=np.uint64)).tolist()
+
+        counts = {}
+        for token, h, p in zip(encoded, hashes, positions):
+            while p < n and int(self.token_hashes[p]) == h:
+                if self.tokens[self.token_offsets[p]:self.token_offsets[p + 1]].tobytes() == token:
+                    j = int(self.token_ids[p])
+                    counts[j] = counts.get(j, 0) + 1
+                    break
+                p += 1
+
+        return self._sorted_counts(counts)
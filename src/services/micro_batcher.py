@@ -0,0 +1,115 @@
+"""
+Dynamic micro-batching of concurrent requests to one model.
+Texts arriving within a short window are run as one Model.predict_batch call.
+"""
+
+import asyncio
+import logging
+from concurrent.futures import Executor
+from functools import partial
+from typing import Any, Callable, List, Optional, Tuple
+
+from prometheus_client import Histogram
+
+from services.model import MODEL_INFERENCE_DURATION, Model
+
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+
+# prometheus info:
+MODEL_BATCH_QUEUE_DEPTH = Histogram(
+    "model_batch_queue_depth",
+    "Number of texts waiting for the next batch, observed on every submit",
+    ["model_id"],
+    buckets=BATCH_SIZE_BUCKETS,
+)
+
+MODEL_BATCH_SIZE = Histogram(
+    "model_batch_size",
+    "Number of texts in each batch sent to the model",
+    ["model_id"],
+    buckets=BATCH_SIZE_BUCKETS,
+)
+
+DEFAULT_MAX_BATCH_SIZE = 32
+
+
+class MicroBatcher:
+    """Collects texts for up to window_ms (or until max_batch_size texts) and runs them
+    as one batch in the executor. Lives in the event loop thread, so needs no locks."""
+
+    def __init__(self, model: Model, executor: Executor, window_ms: float,
+                 max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+                 batch_fn: Optional[Callable[[List[str]], list]] = None):
+        """
+        :param batch_fn: texts -> one result per text, model.predict_batch by default;
+            must not observe MODEL_INFERENCE_DURATION, the batcher observes the latency of each request
+        """
+
+        self.model = model
+        self.batch_fn = batch_fn or partial(model.predict_batch, observe_latency=False)
+        self.executor = executor
+        self.window_s = window_ms / 1000.0
+        self.max_batch_size = max(1, max_batch_size)
+
+        # (text, caller's future, submit time in loop.time()): 
+        self._pending: List[Tuple[str, asyncio.Future, float]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    async def submit(self, text: str) -> Any:
+        """Result of batch_fn for text, computed within a batch"""
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future, loop.time()))
+        MODEL_BATCH_QUEUE_DEPTH.labels(model_id=self.model.model_id).observe(len(self._pending))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window_s, self._flush)
+
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        MODEL_BATCH_SIZE.labels(model_id=self.model.model_id).observe(len(batch))
+        self._run(batch)
+
+    def _run(self, batch: List[Tuple[str, asyncio.Future, float]]) -> None:
+        loop = asyncio.get_running_loop()
+        task = loop.run_in_executor(self.executor, self.batch_fn, [text for text, _, _ in batch])
+        task.add_done_callback(lambda done: self._resolve(batch, done))
+
+    def _resolve(self, batch: List[Tuple[str, asyncio.Future, float]], done: asyncio.Future) -> None:
+        """Pass each caller its own result (or its error), observe submit -> result latency.
+        Texts of a failed batch are retried one by one, so only the failing text gets the error."""
+
+        error = done.exception()
+        if error is not None and len(batch) > 1:
+            logger.error("Batch of %d texts failed, retrying them one by one: %s", len(batch), error)
+            for entry in batch:
+                if not entry[1].done():
+                    self._run([entry])
+            return
+        if error is not None:
+            logger.error("Text failed: %s", error)
+
+        now = asyncio.get_running_loop().time()
+        for i, (_, future, submitted) in enumerate(batch):
+            if future.done():  # caller went away
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                MODEL_INFERENCE_DURATION.labels(model_id=self.model.model_id).observe(now - submitted)
+                future.set_result(done.result()[i])
@@ -5,27 +5,27 @@ Model class to predict toxicity type of the messages.
 import ast
 import time
 
-import torch
+import numpy as np
 import logging
 
 from abc import ABC, abstractmethod
 from pathlib import Path
-from typing import Any, Dict, Optional, Tuple
-from scipy.sparse import hstack
+from typing import Any, Dict, List, Optional, Tuple
+from scipy.sparse import hstack, vstack
 
 from services.text_preprocessor import (LinearSVMPreprocessor,
                                    LinearSVMPreprocessorSI,
-                                   LinearSVMPreprocessorRaw,
-                                   BertPreprocessor)
+                                   LinearSVMPreprocessorRaw)
 
 from services.text_preprocessor import TextPreprocessor
 from core.config import MODEL_CONFIG
 from services.utils import load_config, load_pickle, load_local_encoder, load_encoder
-import tempfile
-from services.utils import Boto3Reader
+from services.utils import get_artifact_cache, prefetch_s3_artifacts
 
-from prometheus_client import Counter, Histogram
-from transformers import BertForSequenceClassification, BertTokenizer
+from services.cache import LRUCache, text_digest
+from services.linear_scorer import MAPPED_FILES, CompiledLinearScorer, MappedLinearScorer
+from services.text_utils import get_num_features_dense
+from prometheus_client import Counter, Gauge, Histogram
 
 
 # prometheus info: 
@@ -36,26 +36,78 @@ MODEL_INFERENCE_DURATION = Histogram(
     buckets=[0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0],
 )
 
+# one observation per predict_batch call, its size is in model_batch_size: 
+MODEL_BATCH_INFERENCE_DURATION = Histogram(
+    "model_batch_inference_duration_seconds",
+    "Time spent on model preprocessing + inference of one batch (per model)",
+    ["model_id"],
+    buckets=[0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0],
+)
+
 MODEL_INFERENCE_TOTAL = Counter(
     "model_inference_total",
     "Total number of inference calls, labelled by model and predicted class",
     ["model_id", "prediction_label"],
 )
 
+PREPROCESS_CACHE_HITS = Counter(
+    "preprocess_cache_hits_total",
+    "Number of model inputs served from the preprocessing cache",
+    ["model_id"],
+)
+
+PREPROCESS_CACHE_MISSES = Counter(
+    "preprocess_cache_misses_total",
+    "Number of model inputs computed by the full preprocessing pipeline",
+    ["model_id"],
+)
+
+PREPROCESS_CACHE_BYTES = Gauge(
+    "preprocess_cache_bytes",
+    "Approximate memory used by the preprocessing cache",
+    ["model_id"],
+)
+
+MODEL_ARTIFACT_FETCH_DURATION = Histogram(
+    "model_artifact_fetch_duration_seconds",
+    "Time to get each s3 artifact of a model at startup (cache check or download)",
+    ["model_id", "artifact"],
+    buckets=[0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0],
+)
+
 _PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
 
 # logger: 
 logger = logging.getLogger(__name__)
 
+
+def decision_margins(scores) -> List[float]:
+    """Margin per row of decision scores, 0 is the decision boundary:
+    positive minus negative score for binary models, top-2 gap for more classes"""
+
+    scores = np.asarray(scores, dtype=np.float64)
+    if scores.ndim == 1:
+        return scores.tolist()
+    if scores.shape[1] == 1:
+        return scores[:, 0].tolist()
+    if scores.shape[1] == 2:
+        return (scores[:, 1] - scores[:, 0]).tolist()
+
+    top = np.sort(scores, axis=1)
+    return (top[:, -1] - top[:, -2]).tolist()
+
+
 class Model: 
     def __init__(self, config_path=MODEL_CONFIG, worker_id=0):
         self.worker_id = worker_id
         self.config_path = config_path
         self.config_model = None
         self._label_decode: Dict[int, str] = {}
+        self.artifact_timings: Dict[str, float] = {}
         
         # load passed config: 
         self._set_config()
+        self._prefetch_artifacts()
         self._load_weights()
         self._load_optional_encoder()
         self._load_label_decode()
@@ -64,6 +116,13 @@ class Model:
     def model_id(self) -> str:
         return self.config_model.get("description", f"model_{self.worker_id}")
 
+    @property
+    def artifact_version(self) -> str:
+        """Identifies weights, encoder and preprocessing data of this predictor"""
+
+        return text_digest(*(str(self.config_model.get(key)) for key in 
+                             ("model_path", "encoder_path", "additional_data_path", "description")))
+
     @property
     def is_multilabel(self) -> bool:
         return bool(self.config_model.get("is_multilabel", False))
@@ -81,6 +140,32 @@ class Model:
         self.config_model = config_model
         self.storage_type = config_model.get("storage_type")
 
+    def _s3_artifacts(self) -> Tuple[List[str], List[str]]:
+        """(required, optional) s3 paths this predictor loads"""
+
+        required = [self.config_model.get(key) for key in ("encoder_path", "warmup_path") 
+                    if self.config_model.get(key)]
+        if str(self.config_model.get("model_path")).endswith(".pkl"):
+            required.append(self.config_model.get("model_path"))
+
+        return required, []
+
+    def _prefetch_artifacts(self):
+        """Fetch all s3 artifacts concurrently into the local cache, loaders then read them from disk"""
+
+        if self.storage_type != "s3":
+            return
+
+        required, optional = self._s3_artifacts()
+        start = time.perf_counter()
+        self.artifact_timings = prefetch_s3_artifacts(self.config_model, required, optional, self.config_path)
+
+        for path, seconds in self.artifact_timings.items():
+            MODEL_ARTIFACT_FETCH_DURATION.labels(model_id=self.model_id, artifact=path).observe(seconds)
+            logger.info("%s: artifact %s in %.3f s", self.model_id, path, seconds)
+        logger.info("%s: %d artifacts fetched in %.3f s", self.model_id, 
+                    len(self.artifact_timings), time.perf_counter() - start)
+
     def _load_weights(self):
         """Loading weights and encoders if passed"""
 
@@ -130,6 +215,31 @@ class Model:
         """Do prediction based on input and return pred"""
         pass
 
+    def preprocess_batch(self, texts: List[str]) -> Any:
+        """Model input for many texts, override with one vectorized call if possible"""
+
+        return [self.preprocess(text) for text in texts]
+
+    def predict_inputs_batch(self, inputs) -> List[int]:
+        """Predictions for preprocess_batch() output, override together with it"""
+
+        return [self.predict(row) for row in inputs]
+
+    def predict_margins_batch(self, inputs) -> Tuple[List[int], List[float]]:
+        """Predictions and decision margins (see decision_margins) for preprocess_batch() output,
+        needed by cascade stages"""
+
+        raise NotImplementedError(f"{type(self).__name__} does not provide decision margins")
+
+    def warmup(self, texts: List[str], batch_size: int = 32) -> None:
+        """Run texts through single and batch paths without inference metrics,
+        so first requests do not pay for lazy initialization"""
+
+        for text in texts[:batch_size]:
+            self.predict(self.preprocess(text))
+        for start in range(0, len(texts), batch_size):
+            self.predict_inputs_batch(self.preprocess_batch(texts[start:start + batch_size]))
+
     # def predict_full(self, text: str) -> Tuple[str, int, str, float]:
     #     """
     #     Preprocess + predict with timing.
@@ -151,6 +261,24 @@ class Model:
 
     #     return (self.model_id, pred_int, pred_label, elapsed_ms)
     
+    def canonical_text(self, text: str) -> str:
+        """Text form used in cache keys, see TextPreprocessor.canonical_text"""
+
+        preprocessor = getattr(self, "text_preprocessor", None)
+        return preprocessor.canonical_text(text) if preprocessor is not None else text
+
+    def close(self) -> None:
+        """Stop what is not freed with the model (preprocessing worker processes)"""
+
+        preprocessor = getattr(self, "text_preprocessor", None)
+        if preprocessor is not None:
+            preprocessor.close()
+
+    def decode_label(self, pred_int: int) -> str:
+        if self.is_multilabel:
+            return self._label_decode.get(pred_int, str(pred_int))
+        return "toxic" if pred_int == 1 else "non_toxic"
+
     def predict_log_prometheus(self, text: str) -> Tuple[str, int, str, float]:
         """
         Preprocess + predict with timing + Prometheus 
@@ -162,16 +290,60 @@ class Model:
         pred_int = int(self.predict(inputs))
         elapsed_ms = (time.perf_counter() - start) * 1000
 
-        if self.is_multilabel:
-            pred_label = self._label_decode.get(pred_int, str(pred_int))
-        else:
-            pred_label = "toxic" if pred_int == 1 else "non_toxic"
+        pred_label = self.decode_label(pred_int)
 
         MODEL_INFERENCE_DURATION.labels(model_id=self.model_id).observe(elapsed_ms / 1000.0)
         MODEL_INFERENCE_TOTAL.labels(model_id=self.model_id, prediction_label=pred_label).inc()
 
         return (self.model_id, pred_int, pred_label, elapsed_ms)
 
+    def predict_batch(self, texts: List[str], observe_latency: bool = True) -> List[Tuple[str, int, str, float]]:
+        """
+        Preprocess + predict for many texts with timing + Prometheus.
+        processing_time_ms of each text is the time of the whole batch.
+        Returns list of (model_id, prediction_int, prediction_label, processing_time_ms).
+
+        :param observe_latency: observe the batch time as the latency of each text in 
+            MODEL_INFERENCE_DURATION, False if the caller observes it (MicroBatcher)
+        """
+
+        return [result for result, _ in self._predict_batch(texts, False, observe_latency)]
+
+    def predict_batch_margins(self, 
+                              texts: List[str], 
+                              observe_latency: bool = True
+                              ) -> List[Tuple[Tuple[str, int, str, float], float]]:
+        """Same as predict_batch, each result paired with its decision margin"""
+
+        return self._predict_batch(texts, True, observe_latency)
+
+    def _predict_batch(self, texts: List[str], with_margins: bool, observe_latency: bool) -> list:
+        if not texts:
+            return []
+
+        start = time.perf_counter()
+        inputs = self.preprocess_batch(texts)
+        if with_margins:
+            preds, margins = self.predict_margins_batch(inputs)
+        else:
+            preds, margins = self.predict_inputs_batch(inputs), [None] * len(texts)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        MODEL_BATCH_INFERENCE_DURATION.labels(model_id=self.model_id).observe(elapsed_ms / 1000.0)
+
+        results = []
+        for pred, margin in zip(preds, margins):
+            pred_int = int(pred)
+            pred_label = self.decode_label(pred_int)
+
+            if observe_latency:
+                MODEL_INFERENCE_DURATION.labels(model_id=self.model_id).observe(elapsed_ms / 1000.0)
+            MODEL_INFERENCE_TOTAL.labels(model_id=self.model_id, prediction_label=pred_label).inc()
+
+            results.append(((self.model_id, pred_int, pred_label, elapsed_ms), margin))
+
+        return results
+
 
 class LinearSVMModel(Model):
     """Pickle model assuming use of encoder and different types of preprocessors"""
@@ -181,6 +353,8 @@ class LinearSVMModel(Model):
                  worker_id=0,
                  preprocessor_type="LinearSVMPreprocessorSI"
                  ):
+        # set by load_custom_weights for a memory-mapped (.mmap) artifact: 
+        self._mapped_scorer: Optional[MappedLinearScorer] = None
         super().__init__(config_path, worker_id)
 
         # text preprocessor is additional for LinearSVM 
@@ -200,10 +374,104 @@ class LinearSVMModel(Model):
                 preprocessor_type
             )
         self.text_preprocessor = preprocessor_class(config=self.config_model)
+        self.preprocessor_type = preprocessor_type
+
+        # "compiled" scores token ids with numpy arrays instead of transform + hstack + predict: 
+        self._scorer = self._build_scorer()
+
+        # optional cache of final model inputs: 
+        self._preprocess_cache = self._build_preprocess_cache()
+
+    def _s3_artifacts(self) -> Tuple[List[str], List[str]]:
+        required, optional = super()._s3_artifacts()
+        data_required, data_optional = LinearSVMPreprocessor.s3_artifacts(self.config_model)
+
+        model_path = self.config_model.get("model_path").rstrip("/")
+        if model_path.endswith(".mmap"):
+            required += [f"{model_path}/{fname}" for fname in MAPPED_FILES]
+
+        return required + data_required, optional + data_optional
+
+    def load_custom_weights(self):
+        """Memory-mapped artifact made by convert_linear_model.py (vectorizer and classifier in one directory)"""
+
+        model_path = self._model_path.rstrip("/")
+        if not model_path.endswith(".mmap"):
+            raise ValueError(f"Unsupported model file for LinearSVMModel: {model_path}")
+
+        if self.storage_type == "local":
+            model_dir = _PROJECT_ROOT / Path(model_path)
+            if not model_dir.exists():
+                raise FileNotFoundError(f"Model directory not found at: {model_dir}")
+        elif self.storage_type == "s3":
+            # mapped from the artifact cache, so all processes share the same files: 
+            cache = get_artifact_cache(self.config_model, self.config_path)
+            model_dir = cache.fetch_dir(self.config_model.get("bucket_name"), model_path, list(MAPPED_FILES))
+        else:
+            raise ValueError(f"Unsupported storage type: {self.storage_type}")
+
+        self._model_weights = None
+        self._mapped_scorer = MappedLinearScorer(model_dir)
+        logger.info("LinearSVMModel mapped from %s", model_dir)
+
+    def _build_scorer(self) -> Optional[CompiledLinearScorer]:
+        if self._mapped_scorer is not None:  # mapped artifact has no sklearn objects
+            return self._mapped_scorer
+
+        scorer = self.config_model.get("scorer", "sklearn")
+        if scorer == "sklearn":
+            return None
+        if scorer != "compiled":
+            raise ValueError(f"Unsupported scorer for LinearSVMModel: {scorer}")
+
+        return CompiledLinearScorer(self.encoder, self._model_weights)
+
+    def _build_preprocess_cache(self):
+        """Cache is enabled by preprocess_cache_max_bytes in config"""
+
+        max_bytes = int(self.config_model.get("preprocess_cache_max_bytes", 0))
+        if max_bytes <= 0:
+            return None
+
+        ttl = self.config_model.get("preprocess_cache_ttl_seconds")
+        self._preprocess_cache_prefix = f"{self.preprocessor_type}|{self.artifact_version}"
+
+        return LRUCache(
+            max_bytes=max_bytes,
+            ttl_seconds=float(ttl) if ttl else None,
+            sizeof=self._inputs_nbytes,
+        )
+
+    def _inputs_nbytes(self, inputs) -> int:
+        if self._scorer is not None:
+            return sum(array.nbytes for array in inputs)
+        return inputs.data.nbytes + inputs.indices.nbytes + inputs.indptr.nbytes
 
     def preprocess(self, text: str):
+        """Model input from cache, keyed by preprocessor, artifacts and canonical text"""
+
+        if self._preprocess_cache is None:
+            return self._preprocess(text)
+
+        key = text_digest(self._preprocess_cache_prefix, self.canonical_text(text))
+        inputs = self._preprocess_cache.get(key)
+        if inputs is not None:
+            PREPROCESS_CACHE_HITS.labels(model_id=self.model_id).inc()
+            return inputs
+
+        PREPROCESS_CACHE_MISSES.labels(model_id=self.model_id).inc()
+        inputs = self._preprocess(text)
+        self._preprocess_cache.put(key, inputs)
+        PREPROCESS_CACHE_BYTES.labels(model_id=self.model_id).set(self._preprocess_cache.bytes_used)
+
+        return inputs
+
+    def _preprocess(self, text: str):
         """The main preprocessor logic to compose input modelarrays"""
 
+        if self._scorer is not None:
+            return self._preprocess_batch([text])[0]
+
         # preprocess in text domain:  
         text_preprocessed, numc_features = self.text_preprocessor.preprocess(text)
         
@@ -212,100 +480,89 @@ class LinearSVMModel(Model):
 
         # hstack if has num_features: 
         if numc_features is not None: 
-            inputs = hstack([encoded_text, numc_features])
+            inputs = hstack([encoded_text, numc_features], format="csr")
         else: 
             inputs = encoded_text
 
         return inputs
 
-    def predict(self, inputs) -> int: 
-        """Do prediction based on input sparce matrix"""
-        
-        pred = self._model_weights.predict(inputs)
+    def preprocess_batch(self, texts: List[str]):
+        """One sparse matrix for all texts, cached rows are reused"""
 
-        # return pred
-        return float(pred[0])
+        if self._preprocess_cache is None:
+            return self._preprocess_batch(texts)
 
+        keys = [text_digest(self._preprocess_cache_prefix, self.canonical_text(text)) for text in texts]
+        rows = [self._preprocess_cache.get(key) for key in keys]
 
-class BertClassifierModel(Model):
-    """
-    Wraps a fine-tuned BertForSequenceClassification model.
-    """
+        missing = [i for i, row in enumerate(rows) if row is None]
+        PREPROCESS_CACHE_HITS.labels(model_id=self.model_id).inc(len(texts) - len(missing))
+        PREPROCESS_CACHE_MISSES.labels(model_id=self.model_id).inc(len(missing))
 
-    def __init__(self, config_path=MODEL_CONFIG, worker_id=0):
-        # torch / transformers are loaded lazily inside load_custom_weights: 
-        self._bert_model = None
-        self._tokenizer = None
-        self._device = None
-        self._max_len: int = 128
-        super().__init__(config_path, worker_id)
-        self.text_preprocessor = BertPreprocessor(config=self.config_model)
+        if missing:
+            computed = self._preprocess_batch([texts[i] for i in missing])
+            for j, i in enumerate(missing):
+                rows[i] = computed[j]
+                self._preprocess_cache.put(keys[i], rows[i])
+            PREPROCESS_CACHE_BYTES.labels(model_id=self.model_id).set(self._preprocess_cache.bytes_used)
 
-    def load_custom_weights(self):
-        """Load BertForSequenceClassification and its tokenizer."""
+        if self._scorer is not None:
+            return rows
+        return vstack(rows, format="csr")
 
-        self._max_len = int(self.config_model.get("max_len", 128))
-        self._device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    def _preprocess_batch(self, texts: List[str]):
+        """One transform and one hstack for all texts (list of scorer rows for compiled scorer)"""
 
-        if self.storage_type == "local":
-            model_dir = _PROJECT_ROOT / Path(self._model_path)
-            if not model_dir.exists():
-                raise FileNotFoundError(f"BERT model directory not found: {model_dir}")
+        if self._scorer is not None:
+            texts_preprocessed, _ = self.text_preprocessor.preprocess_batch(texts, use_num_features=False)
+            numc_features = get_num_features_dense(texts_preprocessed) if self._scorer.n_num else None
+            return [
+                self._scorer.transform(text, None if numc_features is None else numc_features[i])
+                for i, text in enumerate(texts_preprocessed)
+            ]
 
-        elif self.storage_type == "s3":
+        texts_preprocessed, numc_features = self.text_preprocessor.preprocess_batch(texts)
+        encoded_texts = self.encoder.transform(texts_preprocessed)
 
-            bucket = self.config_model.get("bucket_name", "toxic-messages-bucket-1")
-            model_prefix = self._model_path.rstrip("/")  # e.g. "models/v1"
+        if numc_features is not None: 
+            return hstack([encoded_texts, numc_features], format="csr")
 
-            tmp = Path(tempfile.mkdtemp(prefix="bert_s3_"))
-            reader = Boto3Reader(config_path=self.config_path, bucket_name=bucket)
+        return encoded_texts.tocsr()
 
-            bert_files = self.config_model.get("bert_files")
+    def predict(self, inputs) -> int: 
+        """Do prediction based on input sparce matrix"""
+        
+        if self._scorer is not None:
+            return float(self._scorer.predict(inputs))
 
-            for fname in bert_files:
-                s3_key = f"{model_prefix}/{fname}"
-                logger.info("Downloading s3://%s/%s …", bucket, s3_key)
-                obj = reader.get_boto3_obj(s3_key)
-                local_path = tmp / fname
-                with open(local_path, "wb") as fh:
-                    fh.write(obj["Body"].read())
-                logger.info("Saved %s (%d bytes)", local_path, local_path.stat().st_size)
+        pred = self._model_weights.predict(inputs)
 
-            model_dir = tmp
+        # return pred
+        return float(pred[0])
 
-        else:
-            raise ValueError(f"Unsupported storage_type for BertClassifierModel: {self.storage_type}")
+    def predict_inputs_batch(self, inputs) -> List[int]:
+        """One sklearn call for the whole sparse matrix"""
 
-        self._bert_model = BertForSequenceClassification.from_pretrained(str(model_dir))
-        self._bert_model.to(self._device)
-        self._bert_model.eval()
+        if self._scorer is not None:
+            return [int(self._scorer.predict(row)) for row in inputs]
 
-        self._tokenizer = BertTokenizer.from_pretrained(str(model_dir))
-        logger.info("BertClassifierModel loaded from %s on %s", model_dir, self._device)
+        return [int(pred) for pred in self._model_weights.predict(inputs)]
+
+    def predict_margins_batch(self, inputs) -> Tuple[List[int], List[float]]:
+        """Predictions and decision_function margins"""
+
+        if self._scorer is not None:
+            scores = np.array([self._scorer.decision_function(row) for row in inputs])
+        else:
+            scores = self._model_weights.decision_function(inputs)
+
+        return self.predict_inputs_batch(inputs), decision_margins(scores)
 
-    def preprocess(self, text: str):
-        """Tokenize text and return (input_ids, attention_mask) tensors on the model device."""
-        
-        # simple preprocess: 
-        text_preprocessed = self.text_preprocessor.preprocess(text)
-        
-        encoding = self._tokenizer(
-            text_preprocessed,
-            max_length=self._max_len,
-            padding="max_length",
-            truncation=True,
-            return_tensors="pt",
-        )
-        return (
-            encoding["input_ids"].to(self._device),
-            encoding["attention_mask"].to(self._device),
-        )
 
-    def predict(self, inputs) -> int:
-        """Run forward pass and return integer class index."""
+def __getattr__(name: str):
+    """BERT predictors live in services.bert_model, old imports from here load it on first access"""
 
-        input_ids, attention_mask = inputs
-        with torch.no_grad():
-            outputs = self._bert_model(input_ids, attention_mask=attention_mask)
-            pred = torch.argmax(outputs.logits, dim=1).item()
-        return int(pred)
+    if name in ("BertClassifierModel", "OptimizedBertModel", "BertTokenizerSlow", "DEFAULT_LENGTH_BUCKETS"):
+        from services import bert_model
+        return getattr(bert_model, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
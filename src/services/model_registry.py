@@ -3,80 +3,476 @@ Loads and runs in parallel mode every predictor listed in config
 """
 
 import asyncio
+import importlib
 import logging
+import threading
+import time
+from collections.abc import Mapping
 from concurrent.futures import ThreadPoolExecutor
-from typing import List, Tuple
+from functools import partial
+from typing import List, Optional, Tuple
 
-from services.model import LinearSVMModel, BertClassifierModel, Model
-from services.utils import load_config
+from prometheus_client import Counter, Gauge
+
+from services.model import Model
+from services.utils import load_config, load_s3_txt
 from core.config import MODEL_CONFIG
-from services.model import MODEL_INFERENCE_DURATION, MODEL_INFERENCE_TOTAL
+from services.model import MODEL_BATCH_INFERENCE_DURATION, MODEL_INFERENCE_DURATION, MODEL_INFERENCE_TOTAL
+from services.cache import LRUCache, text_digest
+from services.micro_batcher import MicroBatcher, DEFAULT_MAX_BATCH_SIZE
+from services.model_workers import (WorkerModel, DEFAULT_HEALTH_INTERVAL_S,
+                                    DEFAULT_REQUEST_TIMEOUT_S, DEFAULT_START_TIMEOUT_S)
 
 logger = logging.getLogger(__name__)
 
-# map config "model_type" → Model subclass
-PREDICTOR_TYPE_REGISTRY = {
-    "linear_svm": LinearSVMModel,
-    "bert": BertClassifierModel,
+# cache hits are not observed in MODEL_INFERENCE_DURATION / MODEL_INFERENCE_TOTAL,
+# add this counter to them for prediction distributions:
+MODEL_RESULT_CACHE_HITS = Counter(
+    "model_result_cache_hits_total",
+    "Number of predictions served from the registry result cache",
+    ["model_id", "prediction_label"],
+)
+
+# escalation rate of a stage = escalations / (escalations + decisions): 
+CASCADE_DECISIONS = Counter(
+    "cascade_decisions_total",
+    "Number of texts decided by a cascade stage",
+    ["stage", "model_id"],
+)
+
+CASCADE_ESCALATIONS = Counter(
+    "cascade_escalations_total",
+    "Number of texts passed to the next cascade stage (margin inside the uncertainty band)",
+    ["stage", "model_id"],
+)
+
+MODEL_STATE = Gauge(
+    "model_state",
+    "1 for the current load state of each predictor (loading / warming / ready / failed)",
+    ["predictor", "state"],
+)
+
+DEFAULT_RESULT_CACHE_MAX_ITEMS = 10000
+
+# predictor load states: 
+LOADING, WARMING, READY, FAILED = "loading", "warming", "ready", "failed"
+MODEL_STATES = (LOADING, WARMING, READY, FAILED)
+
+# used when no warmup_path is passed, first calls compile regexps / allocate buffers: 
+DEFAULT_WARMUP_TEXTS = [
+    "привет",
+    "Спасибо, всё получилось!",
+    "ты вообще нормальный??? 😡",
+    "https://example.com @user #тег 123",
+]
+
+# map config "model_type" → "module:Model subclass", imported on first use
+# (torch / transformers are loaded only if a BERT predictor is created): 
+PREDICTOR_TYPES = {
+    "linear_svm": "services.model:LinearSVMModel",
+    "bert": "services.bert_model:BertClassifierModel",
+    "bert_optimized": "services.bert_model:OptimizedBertModel",
 }
 
 
+class _PredictorTypeRegistry(Mapping):
+    """model_type → Model subclass, the module of a class is imported when it is looked up"""
+
+    def __init__(self, types: dict):
+        self._types = types
+
+    def __getitem__(self, model_type: str):
+        module_name, class_name = self._types[model_type].split(":")
+        return getattr(importlib.import_module(module_name), class_name)
+
+    def __contains__(self, model_type) -> bool:
+        return model_type in self._types
+
+    def __iter__(self):
+        return iter(self._types)
+
+    def __len__(self) -> int:
+        return len(self._types)
+
+
+PREDICTOR_TYPE_REGISTRY = _PredictorTypeRegistry(PREDICTOR_TYPES)
+
+
 class ModelRegistry:
     """
     Loads all predictors defined in config['predictors'] and exposes
-    `run_all(text)` for parallel multi-model inference.
+    `run_all(text)` for parallel multi-model inference
+    (or for cascade inference if config['cascade'] is set).
     """
 
-    def __init__(self, config_path: str = MODEL_CONFIG):
-        self._models: List[Model] = []
+    def __init__(self, config_path: str = MODEL_CONFIG, background: bool = False):
+        """
+        :param background: load predictors in the thread pool and return at once,
+            run_all uses the predictors that are ready (see states())
+        """
+
+        self.background = background
+        self._models: List[Optional[Model]] = []
+        # result cache per model (None if disabled), dropped together with its model: 
+        self._result_caches: List[Optional[LRUCache]] = []
+        # micro-batcher per model (None if disabled): 
+        self._batchers: List[Optional[MicroBatcher]] = []
+        # cascade stages as (predictor index, uncertainty band), None for parallel mode: 
+        self._cascade: Optional[List[Tuple[int, Optional[Tuple[float, float]]]]] = None
+        # load state and error per predictor: 
+        self._states: List[str] = []
+        self._errors: List[Optional[str]] = []
+        # run_all calls in progress, a replaced registry is closed when they finish: 
+        self._inflight = 0
+        self._closed = False
+        # models are released once, by close() or by the last request running after it: 
+        self._released = False
+        self._release_lock = threading.Lock()
         
         # One worker thread per model keeps things simple and avoids GIL contention
         self._executor = ThreadPoolExecutor(
             max_workers=None,  # defaults to (cpu_count or 1) * 5
             thread_name_prefix="model_worker",
         )
-        self._load_all(config_path)
+        try:
+            self._load_all(config_path)
+        except Exception:
+            # predictors loaded before the failing one are never used, stop their workers: 
+            self._release()
+            raise
 
     def _load_all(self, config_path: str) -> None:
         config = load_config(config_path)
         predictors = config.get("predictors", [])
 
+        self._cascade = self._build_cascade(config.get("cascade"), len(predictors))
+
+        self._models = [None] * len(predictors)
+        self._result_caches = [None] * len(predictors)
+        self._batchers = [None] * len(predictors)
+        self._states = [LOADING] * len(predictors)
+        self._errors = [None] * len(predictors)
+
         for i, predictor_conf in enumerate(predictors):
             model_type = predictor_conf.get("model_type", "linear_svm")
-            cls = PREDICTOR_TYPE_REGISTRY.get(model_type)
-            if cls is None:
+            if model_type not in PREDICTOR_TYPE_REGISTRY:
                 raise ValueError(
                     f"Unknown model_type '{model_type}' at predictor index {i}. "
                     f"Available: {list(PREDICTOR_TYPE_REGISTRY)}"
                 )
+            self._set_state(i, LOADING)
+
+            if self.background:
+                self._executor.submit(self._load_model, model_type, config_path, i, predictor_conf)
+            else:
+                self._load_model(model_type, config_path, i, predictor_conf)
+
+    def _load_model(self, model_type: str, config_path: str, i: int, predictor_conf: dict) -> None:
+        """Load, warm up and mark ready predictor i. In background mode errors only mark it failed"""
+
+        model = None
+        try:
             logger.info("Loading model[%d] type=%s …", i, model_type)
-            model = cls(config_path=config_path, worker_id=i)
-            self._models.append(model)
+            model = self._build_model(model_type, config_path, i, predictor_conf)
+            if self._closed:  # registry was replaced while this model was loading
+                model.close()
+                return
+            self._models[i] = model
+            self._result_caches[i] = self._build_result_cache(predictor_conf)
+            # stages with an uncertainty band batch with decision margins, _run_cascade compares them with the band
+            escalating = any(j == i and band is not None for j, band in self._cascade or [])
+            self._batchers[i] = self._build_batcher(model, predictor_conf, with_margins=escalating)
+            self._init_metrics(i, model)
+
+            self._set_state(i, WARMING)
+            start = time.perf_counter()
+            model.warmup(self._warmup_texts(predictor_conf))
+            logger.info("Model[%d] '%s' warmed up in %.2f s", i, model.model_id, time.perf_counter() - start)
+
+            self._set_state(i, READY)
             logger.info("Model[%d] '%s' ready.", i, model.model_id)
 
-        # Pre-initialize Prometheus label combinations for every loaded model so
-        # they appear in label_values() immediately — before any request arrives.
-        for model in self._models:
-            MODEL_INFERENCE_DURATION.labels(model_id=model.model_id)
-            for lbl in ("toxic", "non_toxic"):
-                MODEL_INFERENCE_TOTAL.labels(model_id=model.model_id, prediction_label=lbl)
+        except Exception as e:
+            if model is not None:  # failed in warmup, its worker processes are not needed
+                self._models[i] = self._result_caches[i] = self._batchers[i] = None
+                model.close()
+            self._errors[i] = repr(e)
+            self._set_state(i, FAILED)
+            if not self.background:
+                raise
+            logger.exception("Model[%d] failed to load", i)
+
+    def _set_state(self, i: int, state: str) -> None:
+        self._states[i] = state
+        if self._closed:  # gauges belong to the registry that replaced this one
+            return
+        for name in MODEL_STATES:
+            MODEL_STATE.labels(predictor=str(i), state=name).set(int(name == state))
+
+    def _init_metrics(self, i: int, model) -> None:
+        """
+        Pre-initialize Prometheus label combinations for a loaded model so
+        they appear in label_values() immediately — before any request arrives.
+        """
+        MODEL_INFERENCE_DURATION.labels(model_id=model.model_id)
+        MODEL_BATCH_INFERENCE_DURATION.labels(model_id=model.model_id)
+        for lbl in ("toxic", "non_toxic"):
+            MODEL_INFERENCE_TOTAL.labels(model_id=model.model_id, prediction_label=lbl)
+
+        for stage, (j, band) in enumerate(self._cascade or []):
+            if j != i:
+                continue
+            CASCADE_DECISIONS.labels(stage=str(stage), model_id=model.model_id)
+            if band is not None:
+                CASCADE_ESCALATIONS.labels(stage=str(stage), model_id=model.model_id)
+
+    @staticmethod
+    def _warmup_texts(predictor_conf: dict) -> List[str]:
+        """Texts of warmup_path (one per line), DEFAULT_WARMUP_TEXTS if not passed"""
+
+        warmup_path = predictor_conf.get("warmup_path")
+        if not warmup_path:
+            return list(DEFAULT_WARMUP_TEXTS)
+
+        if predictor_conf.get("storage_type") == "s3":
+            lines = load_s3_txt(predictor_conf, str(warmup_path).replace('\\','/'))
+        else:
+            with open(warmup_path, 'r', encoding="utf-8") as f:
+                lines = f.readlines()
+
+        texts = [line.strip() for line in lines if line.strip()]
+        return texts[:int(predictor_conf.get("warmup_max_texts", len(texts)))]
+
+    def states(self) -> List[dict]:
+        """Load state of every predictor, for the readiness probe"""
+
+        return [
+            {
+                "index": i,
+                "model_id": model.model_id if model is not None else None,
+                "state": state,
+                "error": error,
+            }
+            for i, (model, state, error) in enumerate(zip(self._models, self._states, self._errors))
+        ]
+
+    @property
+    def is_ready(self) -> bool:
+        """Nothing is loading or warming any more and at least one predictor is ready"""
+
+        return READY in self._states and not any(s in (LOADING, WARMING) for s in self._states)
+
+    def _ready(self, i: int) -> bool:
+        return self._states[i] == READY and self._models[i] is not None
+
+    @staticmethod
+    def _build_model(model_type: str, config_path: str, i: int, predictor_conf: dict):
+        """In-process model, or WorkerModel if "worker_processes" > 0 (model class imported in workers only)"""
+
+        replicas = int(predictor_conf.get("worker_processes", 0))
+        if replicas <= 0:
+            return PREDICTOR_TYPE_REGISTRY[model_type](config_path=config_path, worker_id=i)
+
+        return WorkerModel(
+            model_type,
+            config_path,
+            worker_id=i,
+            replicas=replicas,
+            start_timeout_s=float(predictor_conf.get("worker_start_timeout_s", DEFAULT_START_TIMEOUT_S)),
+            request_timeout_s=float(predictor_conf.get("worker_request_timeout_s", DEFAULT_REQUEST_TIMEOUT_S)),
+            health_interval_s=float(predictor_conf.get("worker_health_interval_s", DEFAULT_HEALTH_INTERVAL_S)),
+        )
+
+    @staticmethod
+    def _build_cascade(cascade_conf: Optional[dict], n_predictors: int):
+        """Stages as (predictor index, (low, high) uncertainty band), the last stage has no band"""
+
+        if not cascade_conf or not cascade_conf.get("enabled", True):
+            return None
+
+        stages_conf = cascade_conf.get("stages", [])
+        if len(stages_conf) < 2:
+            raise ValueError("Cascade needs at least 2 stages")
+
+        stages = []
+        for stage, stage_conf in enumerate(stages_conf):
+            i = int(stage_conf["predictor"])
+            if not 0 <= i < n_predictors:
+                raise ValueError(f"Cascade stage {stage} refers to missing predictor index {i}")
+
+            if stage == len(stages_conf) - 1:
+                stages.append((i, None))
+                continue
+
+            band = stage_conf.get("uncertainty_band")
+            if band is None or len(band) != 2 or float(band[0]) > float(band[1]):
+                raise ValueError(f"Cascade stage {stage} needs uncertainty_band [low, high]")
+            stages.append((i, (float(band[0]), float(band[1]))))
+
+        if len({i for i, _ in stages}) != len(stages):
+            raise ValueError("Cascade stages must use different predictors")
+
+        logger.info("Cascade mode: %s", stages)
+        return stages
+
+    @staticmethod
+    def _build_result_cache(predictor_conf: dict) -> Optional[LRUCache]:
+        """Result cache is enabled per predictor by "result_cache": true"""
+
+        if not predictor_conf.get("result_cache", False):
+            return None
+
+        ttl = predictor_conf.get("result_cache_ttl_seconds")
+        return LRUCache(
+            max_items=int(predictor_conf.get("result_cache_max_items", DEFAULT_RESULT_CACHE_MAX_ITEMS)),
+            ttl_seconds=float(ttl) if ttl else None,
+        )
+
+    def _build_batcher(self, model: Model, predictor_conf: dict, with_margins: bool = False) -> Optional[MicroBatcher]:
+        """Micro-batching is enabled per predictor by "batch_window_ms" > 0"""
+
+        window_ms = float(predictor_conf.get("batch_window_ms", 0))
+        if window_ms <= 0:
+            return None
+
+        return MicroBatcher(
+            model, 
+            self._executor, 
+            window_ms=window_ms,
+            max_batch_size=int(predictor_conf.get("max_batch_size", DEFAULT_MAX_BATCH_SIZE)),
+            batch_fn=partial(model.predict_batch_margins if with_margins else model.predict_batch, 
+                             observe_latency=False),
+        )
+
+    def _result_key(self, model: Model, text: str) -> str:
+        return text_digest(model.model_id, model.artifact_version, model.canonical_text(text))
+
+    def clear_result_caches(self) -> None:
+        for cache in self._result_caches:
+            if cache is not None:
+                cache.clear()
 
     @property
     def models(self) -> List[Model]:
-        return self._models
+        """Ready models"""
+
+        return [model for i, model in enumerate(self._models) if self._ready(i)]
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    async def drain(self, timeout_s: float) -> bool:
+        """Wait until no run_all is in progress, False on timeout"""
+
+        deadline = time.monotonic() + timeout_s
+        while self._inflight and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        return not self._inflight
+
+    def close(self) -> None:
+        """Release models, worker processes and the thread pool.
+        Requests still running keep their models, which are released when the last one finishes."""
 
-    async def run_all(self, text: str) -> List[Tuple[str, int, str, float]]:
+        self._closed = True
+        if self._inflight:
+            logger.info("Predictors are released after %d running requests", self._inflight)
+            return
+        self._release()
+
+    def _release(self) -> None:
+        with self._release_lock:
+            if self._released:
+                return
+            self._released = True
+
+        self._executor.shutdown(wait=False)
+        for model in self._models:
+            if model is not None:
+                model.close()
+
+        # models and caches are freed even if the registry object is still referenced: 
+        self.clear_result_caches()
+        self._models = [None] * len(self._models)
+        self._batchers = [None] * len(self._batchers)
+
+    async def run_all(self, text: str) -> List[Tuple[str, int, str, float, Optional[int]]]:
         """
-        Run all models in parallel.
+        Run all ready models in parallel, or the cascade stages if configured.
 
-        Returns a list of (model_id, prediction_int, prediction_label, processing_time_ms)
-        for each mdel
+        Returns a list of (model_id, prediction_int, prediction_label, processing_time_ms, cascade_stage)
+        for each model that ran. cascade_stage is None in parallel mode, in cascade mode
+        the last result is the decision.
         """
-        loop = asyncio.get_event_loop()
-        tasks = [
-            # loop.run_in_executor(self._executor, model.predict_full, text)
-            loop.run_in_executor(self._executor, model.predict_log_prometheus, text)
-            for model in self._models
-        ]
-        results: List[Tuple[str, int, str, float]] = await asyncio.gather(*tasks)
+        self._inflight += 1
+        try:
+            if self._cascade is not None:
+                return await self._run_cascade(text)
+
+            ready = [i for i in range(len(self._models)) if self._ready(i)]
+            computed = await asyncio.gather(*(self._run_model(i, text) for i in ready))
+            return [(*result, None) for result, _ in computed]
+        finally:
+            self._inflight -= 1
+            if self._closed and not self._inflight:
+                # closed while this request was running, release off the event loop: 
+                asyncio.get_running_loop().run_in_executor(None, self._release)
+
+    async def _run_cascade(self, text: str) -> List[Tuple[str, int, str, float, Optional[int]]]:
+        """
+        Stages run one by one while the margin is inside the stage's uncertainty band.
+        Stages with not ready models are skipped, the last ready stage decides.
+        """
+
+        stages = [(stage, i, band) for stage, (i, band) in enumerate(self._cascade) if self._ready(i)]
+
+        results = []
+        for stage, i, band in stages:
+            model_id = self._models[i].model_id
+            result, margin = await self._run_model(i, text, with_margins=band is not None)
+            results.append((*result, stage))
+
+            if stage == stages[-1][0] or band is None or not band[0] <= margin <= band[1]:
+                CASCADE_DECISIONS.labels(stage=str(stage), model_id=model_id).inc()
+                break
+            CASCADE_ESCALATIONS.labels(stage=str(stage), model_id=model_id).inc()
+
         return results
+
+    async def _run_model(self, i: int, text: str, with_margins: bool = False):
+        """
+        (result, margin) of model i, from the result cache, micro-batcher or thread pool.
+        margin is None unless with_margins.
+        """
+        model, cache = self._models[i], self._result_caches[i]
+
+        # cached results do not go to the thread pool: 
+        key = None
+        if cache is not None:
+            start = time.perf_counter()
+            key = self._result_key(model, text)
+            cached = cache.get(key)
+            if cached is not None and (cached[2] is not None or not with_margins):
+                pred_int, pred_label, margin = cached
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                MODEL_RESULT_CACHE_HITS.labels(model_id=model.model_id, prediction_label=pred_label).inc()
+                return (model.model_id, pred_int, pred_label, elapsed_ms), margin
+
+        if self._batchers[i] is not None:
+            computed = await self._batchers[i].submit(text)
+            result, margin = computed if with_margins else (computed, None)
+        elif with_margins:
+            loop = asyncio.get_running_loop()
+            batch = await loop.run_in_executor(self._executor, model.predict_batch_margins, [text])
+            result, margin = batch[0]
+        else:
+            loop = asyncio.get_running_loop()
+            # loop.run_in_executor(self._executor, model.predict_full, text)
+            result = await loop.run_in_executor(self._executor, model.predict_log_prometheus, text)
+            margin = None
+
+        if key is not None:
+            _, pred_int, pred_label, _ = result
+            cache.put(key, (pred_int, pred_label, margin))
+
+        return result, margin
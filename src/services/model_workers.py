@@ -0,0 +1,397 @@
+"""
+Predictors hosted in dedicated worker processes, one process per replica.
+
+WorkerModel has the same blocking calls as Model (predict_log_prometheus, predict_batch,
+predict_batch_margins), so ModelRegistry runs it in its thread pool like an in-process model.
+Requests go over a pipe to an idle replica; crashed or hung replicas are restarted.
+"""
+
+import logging
+import multiprocessing
+import queue
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from prometheus_client import Counter, Gauge
+
+from services.lemma_cache import LEMMA_CACHE_HITS, LEMMA_CACHE_MISSES
+from services.model import (MODEL_BATCH_INFERENCE_DURATION, MODEL_INFERENCE_DURATION, MODEL_INFERENCE_TOTAL,
+                            PREPROCESS_CACHE_BYTES, PREPROCESS_CACHE_HITS, PREPROCESS_CACHE_MISSES)
+
+
+logger = logging.getLogger(__name__)
+
+# prometheus info:
+MODEL_WORKER_RESTARTS = Counter(
+    "model_worker_restarts_total",
+    "Number of restarted model worker processes",
+    ["model_id"],
+)
+
+MODEL_WORKERS_ALIVE = Gauge(
+    "model_workers_alive",
+    "Number of model worker processes ready to serve",
+    ["model_id"],
+)
+
+# metrics updated inside workers, sent to the main process with every reply:
+# (inference duration / totals are observed in the main process from the results)
+RELAYED_METRICS = {
+    metric.describe()[0].name: metric
+    for metric in (PREPROCESS_CACHE_HITS, PREPROCESS_CACHE_MISSES, PREPROCESS_CACHE_BYTES,
+                   LEMMA_CACHE_HITS, LEMMA_CACHE_MISSES)
+}
+
+WORKER_METHODS = ("predict_log_prometheus", "predict_batch", "predict_batch_margins", "warmup")
+
+DEFAULT_START_TIMEOUT_S = 600.0
+DEFAULT_REQUEST_TIMEOUT_S = 30.0
+DEFAULT_HEALTH_INTERVAL_S = 5.0
+PING_TIMEOUT_S = 5.0
+
+
+def _metric_values() -> Dict[Tuple[str, tuple], Tuple[str, float]]:
+    """(metric name, labels) -> (counter / gauge, value) of relayed metrics in this process"""
+
+    values = {}
+    for name, metric in RELAYED_METRICS.items():
+        for family in metric.collect():
+            for sample in family.samples:
+                if family.type == "counter" and not sample.name.endswith("_total"):
+                    continue
+                values[(name, tuple(sorted(sample.labels.items())))] = (family.type, sample.value)
+    return values
+
+
+def _metric_updates(last: dict) -> List[Tuple[str, tuple, str, float]]:
+    """Changes of relayed metrics since last call: ("inc", delta) for counters, ("set", value) for gauges"""
+
+    updates = []
+    for key, (kind, value) in _metric_values().items():
+        old = last.get(key, 0.0)
+        if value == old:
+            continue
+        last[key] = value
+        name, labels = key
+        if kind == "counter":
+            updates.append((name, labels, "inc", value - old))
+        else:
+            updates.append((name, labels, "set", value))
+    return updates
+
+
+def _worker_main(conn, model_type: str, config_path: str, worker_id: int) -> None:
+    """Worker process: load the model, then serve calls until "stop" or closed pipe"""
+
+    from services.model_registry import PREDICTOR_TYPE_REGISTRY
+
+    try:
+        model = PREDICTOR_TYPE_REGISTRY[model_type](config_path=config_path, worker_id=worker_id)
+    except Exception as e:
+        conn.send(("error", repr(e)))
+        return
+
+    conn.send(("ready", {"model_id": model.model_id, "artifact_version": model.artifact_version}))
+
+    last_metrics: dict = {}
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            break
+
+        if message[0] == "stop":
+            model.close()
+            break
+        if message[0] == "ping":
+            conn.send(("pong",))
+            continue
+
+        _, method, args = message
+        try:
+            reply = ("ok", getattr(model, method)(*args))
+        except Exception as e:
+            reply = ("error", e)
+        conn.send(reply + (_metric_updates(last_metrics),))
+
+
+class WorkerCrashed(RuntimeError):
+    pass
+
+
+class _Replica:
+    """One worker process and the main-process end of its pipe"""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.process = None
+        self.conn = None
+
+
+class WorkerModel:
+    """
+    Model served by `replicas` worker processes.
+    Calls block until a replica is free, run them in a thread pool.
+    """
+
+    def __init__(self,
+                 model_type: str,
+                 config_path: str,
+                 worker_id: int,
+                 replicas: int = 1,
+                 start_timeout_s: float = DEFAULT_START_TIMEOUT_S,
+                 request_timeout_s: float = DEFAULT_REQUEST_TIMEOUT_S,
+                 health_interval_s: float = DEFAULT_HEALTH_INTERVAL_S):
+        self.model_type = model_type
+        self.config_path = config_path
+        self.worker_id = worker_id
+        self.start_timeout_s = start_timeout_s
+        self.request_timeout_s = request_timeout_s
+        self.health_interval_s = health_interval_s
+
+        self.model_id: Optional[str] = None
+        self.artifact_version: Optional[str] = None
+
+        self._context = multiprocessing.get_context("spawn")
+        self._replicas = [_Replica(index) for index in range(max(1, replicas))]
+        self._idle: "queue.Queue[_Replica]" = queue.Queue()
+
+        # gauge value of every replica, summed in the main process:
+        self._gauge_values: Dict[Tuple[str, tuple], Dict[int, float]] = {}
+        self._metrics_lock = threading.Lock()
+        self._closed = threading.Event()
+
+        for replica in self._replicas:
+            self._start(replica)
+            self._idle.put(replica)
+        self._update_alive()
+
+        self._health_thread = threading.Thread(
+            target=self._health_loop, name=f"model_worker_health_{worker_id}", daemon=True
+        )
+        self._health_thread.start()
+
+    def _start(self, replica: _Replica) -> None:
+        """Start worker process of replica and wait until its model is loaded"""
+
+        conn, child_conn = self._context.Pipe(duplex=True)
+        process = self._context.Process(
+            target=_worker_main,
+            args=(child_conn, self.model_type, self.config_path, self.worker_id),
+            name=f"model_worker_{self.worker_id}_{replica.index}",
+            daemon=True,
+        )
+        process.start()
+        child_conn.close()
+
+        if not conn.poll(self.start_timeout_s):
+            self._discard(process, conn)
+            raise TimeoutError(f"Model worker {self.worker_id} did not load in {self.start_timeout_s} s")
+
+        try:
+            status, info = conn.recv()
+        except EOFError:
+            process.join(timeout=1)
+            status, info = "error", f"exit code {process.exitcode}"
+        if status != "ready":
+            self._discard(process, conn)
+            raise RuntimeError(f"Model worker {self.worker_id} failed to load: {info}")
+
+        replica.process, replica.conn = process, conn
+        self.model_id, self.artifact_version = info["model_id"], info["artifact_version"]
+        logger.info("Model worker %s[%d] ready, pid %d", self.model_id, replica.index, process.pid)
+
+    @staticmethod
+    def _discard(process, conn) -> None:
+        """Close pipe and kill worker process that failed to start"""
+
+        conn.close()
+        if process.is_alive():
+            process.kill()
+        process.join()
+
+    def _stop(self, replica: _Replica) -> None:
+        if replica.process is None:
+            return
+
+        try:
+            replica.conn.send(("stop",))
+        except OSError:
+            pass
+        replica.process.join(timeout=5)
+        if replica.process.is_alive():
+            replica.process.kill()
+            replica.process.join()
+        replica.conn.close()
+        replica.process = replica.conn = None
+
+    def _restart(self, replica: _Replica) -> None:
+        logger.warning("Restarting model worker %s[%d]", self.model_id, replica.index)
+        MODEL_WORKER_RESTARTS.labels(model_id=self.model_id).inc()
+
+        self._stop(replica)
+        self._drop_gauges(replica.index)
+        if self._closed.is_set():
+            return
+        try:
+            self._start(replica)
+        finally:
+            self._update_alive()
+
+    def _update_alive(self) -> None:
+        MODEL_WORKERS_ALIVE.labels(model_id=self.model_id).set(self.health()["alive"])
+
+    def _request(self, replica: _Replica, method: str, args: tuple, timeout_s: Optional[float] = None) -> Any:
+        if replica.conn is None:  # restart failed before
+            raise WorkerCrashed(f"Model worker {self.model_id}[{replica.index}] is not running")
+
+        # TimeoutError is an OSError too, so it is raised outside of the pipe error handling: 
+        try:
+            replica.conn.send(("call", method, args))
+            answered = replica.conn.poll(self.request_timeout_s if timeout_s is None else timeout_s)
+            reply = replica.conn.recv() if answered else None
+        except (EOFError, OSError) as e:
+            raise WorkerCrashed(f"Model worker {self.model_id}[{replica.index}] crashed: {e!r}") from e
+        if reply is None:
+            raise TimeoutError(f"Model worker {self.model_id}[{replica.index}] timed out on {method}")
+
+        status, result, updates = reply
+        self._apply_metrics(replica.index, updates)
+        if status == "error":
+            raise result
+        return result
+
+    def _call(self, method: str, *args) -> Any:
+        """Run method on an idle replica, restart it if it crashed or hung (one retry after a crash)"""
+
+        if method not in WORKER_METHODS:
+            raise ValueError(f"Unsupported worker method {method}")
+
+        for attempt in range(2):
+            replica = self._idle.get()
+            try:
+                return self._request(replica, method, args)
+            except WorkerCrashed:
+                self._restart(replica)
+                if attempt:
+                    raise
+            except TimeoutError:
+                self._restart(replica)
+                raise
+            finally:
+                self._idle.put(replica)
+
+    def _apply_metrics(self, index: int, updates: list) -> None:
+        with self._metrics_lock:
+            for name, labels, kind, value in updates:
+                metric = RELAYED_METRICS[name]
+                child = metric.labels(**dict(labels)) if labels else metric
+                if kind == "inc":
+                    child.inc(value)
+                else:
+                    values = self._gauge_values.setdefault((name, labels), {})
+                    values[index] = value
+                    child.set(sum(values.values()))
+
+    def _drop_gauges(self, index: int) -> None:
+        """Gauges of a stopped replica no longer count"""
+
+        with self._metrics_lock:
+            for (name, labels), values in self._gauge_values.items():
+                if values.pop(index, None) is not None:
+                    metric = RELAYED_METRICS[name]
+                    child = metric.labels(**dict(labels)) if labels else metric
+                    child.set(sum(values.values()))
+
+    def _observe(self, results: list, observe_latency: bool = True, batch: bool = False) -> None:
+        """Inference metrics of worker results, as Model.predict_log_prometheus / predict_batch do"""
+
+        if batch and results:  # every result of a batch carries the batch time
+            model_id, _, _, elapsed_ms = results[0]
+            MODEL_BATCH_INFERENCE_DURATION.labels(model_id=model_id).observe(elapsed_ms / 1000.0)
+
+        for model_id, _, pred_label, elapsed_ms in results:
+            if observe_latency:
+                MODEL_INFERENCE_DURATION.labels(model_id=model_id).observe(elapsed_ms / 1000.0)
+            MODEL_INFERENCE_TOTAL.labels(model_id=model_id, prediction_label=pred_label).inc()
+
+    def predict_log_prometheus(self, text: str) -> Tuple[str, int, str, float]:
+        result = self._call("predict_log_prometheus", text)
+        self._observe([result])
+        return result
+
+    def predict_batch(self, texts: List[str], observe_latency: bool = True) -> List[Tuple[str, int, str, float]]:
+        results = self._call("predict_batch", texts)
+        self._observe(results, observe_latency, batch=True)
+        return results
+
+    def predict_batch_margins(self, 
+                              texts: List[str], 
+                              observe_latency: bool = True
+                              ) -> List[Tuple[Tuple[str, int, str, float], float]]:
+        results = self._call("predict_batch_margins", texts)
+        self._observe([result for result, _ in results], observe_latency, batch=True)
+        return results
+
+    def warmup(self, texts: List[str]) -> None:
+        """Warm up every replica, call before the model serves requests.
+        Replicas are out of the idle queue meanwhile, so health checks do not ping a busy worker;
+        a warmup may take as long as a model load (start_timeout_s)."""
+
+        replicas = [self._idle.get() for _ in self._replicas]
+        try:
+            for replica in replicas:
+                try:
+                    self._request(replica, "warmup", (texts,), timeout_s=self.start_timeout_s)
+                except (WorkerCrashed, TimeoutError):
+                    # a late reply must not be taken as the answer to the next request:
+                    self._restart(replica)
+                    raise
+        finally:
+            for replica in replicas:
+                self._idle.put(replica)
+
+    def canonical_text(self, text: str) -> str:
+        """Preprocessor lives in the workers, result cache keys use the text as is"""
+
+        return text
+
+    def _health_loop(self) -> None:
+        """Ping idle replicas every health_interval_s, restart the ones that do not answer"""
+
+        while not self._closed.wait(self.health_interval_s):
+            for _ in range(len(self._replicas)):
+                try:
+                    replica = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    if not self._ping(replica):
+                        self._restart(replica)
+                except Exception as e:
+                    logger.error("Health check of model worker %s[%d] failed: %s",
+                                 self.model_id, replica.index, e)
+                finally:
+                    self._idle.put(replica)
+
+    def _ping(self, replica: _Replica) -> bool:
+        if replica.process is None or not replica.process.is_alive():
+            return False
+        try:
+            replica.conn.send(("ping",))
+            return replica.conn.poll(PING_TIMEOUT_S) and replica.conn.recv() == ("pong",)
+        except (EOFError, OSError):
+            return False
+
+    def health(self) -> Dict[str, int]:
+        alive = sum(1 for r in self._replicas if r.process is not None and r.process.is_alive())
+        return {"replicas": len(self._replicas), "alive": alive}
+
+    def close(self) -> None:
+        """Stop health checks and all worker processes"""
+
+        self._closed.set()
+        self._health_thread.join()
+        for replica in self._replicas:
+            self._stop(replica)
+        self._update_alive()
@@ -0,0 +1,129 @@
+"""
+Preprocessing data shared by the LinearSVM preprocessors of one process.
+
+Preprocessors pointing to the same additional_data_path with the same file contents get one
+PreprocessResources (profanity list, encoding dicts, profanity index, lemma caches) instead of loading their own.
+One MorphAnalyzer and one stop word set serve the whole process.
+Resources are dropped when no preprocessor uses them any more (e.g. after a hot reload).
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import weakref
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+import pymorphy3 as pymorphy2
+from stop_words import get_stop_words
+
+from services.lemma_cache import LemmaCache
+from services.profanity_index import ProfanityIndex
+from services.utils import fetch_s3_artifact
+
+
+logger = logging.getLogger(__name__)
+
+PROFANITY_FILE = "bad_words_lemmas.txt"
+ENCODING_FILES = {
+    "emoji": "encoding_emoji.json",
+    "emoticon": "encoding_emoticon.json",
+    "profanity": "encoding_profanities.json",
+    "rep_punct": "encoding_rep_punct.json",
+    "sep_punct": "encoding_sep_punct.json",
+}
+PROFANITY_INDEX_FILE = "profanity_index.json"
+
+_morph_analyzer = None
+_stop_words: Optional[frozenset] = None
+_lock = threading.Lock()
+
+# (storage, bucket, data path, content digest) -> resources still used by some preprocessor:
+_resources: "weakref.WeakValueDictionary[Tuple[str, str, str, str], PreprocessResources]" = \
+    weakref.WeakValueDictionary()
+
+
+def get_morph_analyzer():
+    """MorphAnalyzer of this process (its dictionaries take ~15 MB per instance)"""
+
+    global _morph_analyzer
+    with _lock:
+        if _morph_analyzer is None:
+            _morph_analyzer = pymorphy2.MorphAnalyzer()
+        return _morph_analyzer
+
+
+def get_russian_stop_words() -> frozenset:
+    global _stop_words
+    with _lock:
+        if _stop_words is None:
+            _stop_words = frozenset(get_stop_words('russian'))
+        return _stop_words
+
+
+class PreprocessResources:
+    """Read-only data of one additional_data_path version"""
+
+    def __init__(self, key: tuple, profanities: list, encodings: Dict[str, dict]):
+        self.key = key
+        self.profanities = profanities
+        self.encodings = encodings
+
+        self._profanity_index: Optional[ProfanityIndex] = None
+        self._index_lock = threading.Lock()
+
+        # (lemma_cache_size, lemma_cache_seed_path) -> cache, lemmas do not depend on the predictor: 
+        self._lemma_caches: Dict[tuple, LemmaCache] = {}
+        self._lemma_lock = threading.Lock()
+
+    def get_profanity_index(self, load: Callable[[], ProfanityIndex]) -> ProfanityIndex:
+        """Profanity index of these profanities, loaded or built by the first preprocessor needing it"""
+
+        with self._index_lock:
+            if self._profanity_index is None:
+                self._profanity_index = load()
+            return self._profanity_index
+
+    def get_lemma_cache(self, key: tuple, create: Callable[[], LemmaCache]) -> LemmaCache:
+        """Lemma cache of these size and seed settings, created (and seeded) by the first preprocessor needing it"""
+
+        with self._lemma_lock:
+            if key not in self._lemma_caches:
+                self._lemma_caches[key] = create()
+            return self._lemma_caches[key]
+
+
+def _local_file(config: dict, path: Path) -> Path:
+    """Local copy of a data file, s3 files come from the artifact cache"""
+
+    if config.get("storage_type") == "s3":
+        return fetch_s3_artifact(config, str(path).replace('\\','/'))
+    return path
+
+
+def get_preprocess_resources(config: dict) -> PreprocessResources:
+    """Resources of config's additional_data_path, loaded once per file contents"""
+
+    data_dir = Path(config.get("additional_data_path"))
+
+    # key includes the content hash, so changed files (new artifact version) are loaded again:
+    names = [PROFANITY_FILE] + list(ENCODING_FILES.values())
+    contents = {name: _local_file(config, data_dir / name).read_bytes() for name in names}
+    digest = hashlib.sha256()
+    for name in names:
+        digest.update(name.encode("utf-8") + b"\0" + contents[name])
+    key = (str(config.get("storage_type")), str(config.get("bucket_name") or ""), str(data_dir), digest.hexdigest())
+
+    with _lock:
+        resources = _resources.get(key)
+        if resources is not None:
+            logger.info("Reusing preprocessing data of %s", data_dir)
+            return resources
+
+        profanities = [line.strip() for line in contents[PROFANITY_FILE].decode("utf-8").splitlines()]
+        encodings = {kind: json.loads(contents[name]) for kind, name in ENCODING_FILES.items()}
+        resources = PreprocessResources(key, profanities, encodings)
+        _resources[key] = resources
+
+    return resources
@@ -0,0 +1,102 @@
+"""
+Profanity index: every surface form of every profanity lemma -> lemma.
+Built from pymorphy lexemes once per artifact version and stored as json,
+so most words are resolved with one hash lookup instead of morph.parse().
+"""
+
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Iterable, Optional
+
+
+logger = logging.getLogger(__name__)
+
+INDEX_FORMAT_VERSION = 1
+
+
+def index_version(morph_analyzer, profanities: Iterable[str]) -> str:
+    """Hash of profanity lemmas + morph dictionary: index is valid only for the same pair"""
+
+    meta = morph_analyzer.dictionary.meta
+    hasher = hashlib.sha256()
+    hasher.update(str(INDEX_FORMAT_VERSION).encode("utf-8"))
+    for key in ("format_version", "source_revision", "compiled_at"):
+        hasher.update(str(meta.get(key)).encode("utf-8"))
+    for lemma in sorted(set(profanities)):
+        hasher.update(b"\n" + lemma.encode("utf-8"))
+
+    return hasher.hexdigest()
+
+
+class ProfanityIndex:
+    """Surface form -> profanity lemma.
+    The stored lemma is morph.parse(form)[0].normal_form, so a hit gives exactly
+    the lemma map_profanity would compute. Forms whose top parse is not a profanity
+    are not stored: they are ordinary dictionary words."""
+
+    def __init__(self, forms: dict, version: str):
+        self.forms = forms
+        self.version = version
+
+    def __len__(self) -> int:
+        return len(self.forms)
+
+    def get(self, lower: str) -> Optional[str]:
+        return self.forms.get(lower)
+
+    @classmethod
+    def build(cls, morph_analyzer, profanities: Iterable[str]) -> "ProfanityIndex":
+        """Expand each lemma into all forms of all its lexemes"""
+
+        profanities = set(profanities)
+        candidates = set()
+        for lemma in profanities:
+            for parse in morph_analyzer.parse(lemma):
+                for form in parse.lexeme:
+                    candidates.add(form.word)
+                    # pymorphy also matches words written with 'е' instead of 'ё':
+                    candidates.add(form.word.replace('ё', 'е'))
+
+        forms = {}
+        for word in candidates:
+            normal_form = morph_analyzer.parse(word)[0].normal_form
+            if normal_form in profanities:
+                forms[word] = normal_form
+
+        return cls(forms, index_version(morph_analyzer, profanities))
+
+    def save(self, path) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"version": self.version, "forms": self.forms}, f, ensure_ascii=False)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ProfanityIndex":
+        return cls(data["forms"], data["version"])
+
+    @classmethod
+    def load_or_build(cls, morph_analyzer, profanities, path=None, data: Optional[dict] = None):
+        """Use stored index (local file or already loaded json) when its version matches,
+        otherwise build a new one and store it to the local path if passed"""
+
+        version = index_version(morph_analyzer, profanities)
+
+        if data is None and path is not None and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+
+        if data is not None and data.get("version") == version:
+            return cls.from_dict(data)
+
+        index = cls.build(morph_analyzer, profanities)
+        logger.info("Built profanity index: %d forms", len(index))
+
+        if path is not None:
+            try:
+                index.save(Path(path))
+            except OSError as exc:
+                logger.warning("Could not save profanity index to %s: %s", path, exc)
+
+        return index
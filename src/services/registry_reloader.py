@@ -0,0 +1,194 @@
+"""
+Hot reload of predictors without restarting the service.
+
+A new ModelRegistry is loaded and warmed up in a thread from the current config.json, then
+swapped into app.state.registry in one assignment. Requests that already hold the old
+registry finish on it; it is closed (worker processes stopped, models dropped) once they drain.
+Reloads are started by the admin endpoint or by the optional watcher of config.json and
+the S3 objects it refers to.
+"""
+
+import asyncio
+import gc
+import hashlib
+import logging
+import time
+from typing import Optional
+
+from prometheus_client import Counter
+
+from core.config import MODEL_CONFIG
+from services.model_registry import ModelRegistry
+from services.utils import get_s3_client, load_config, s3_object_key
+
+
+logger = logging.getLogger(__name__)
+
+# prometheus info:
+MODEL_REGISTRY_RELOADS = Counter(
+    "model_registry_reloads_total",
+    "Number of predictor reloads by result (succeeded / failed)",
+    ["result"],
+)
+
+DEFAULT_WATCH_INTERVAL_S = 60.0
+DEFAULT_DRAIN_TIMEOUT_S = 30.0
+
+# reload states:
+IDLE, RUNNING, SUCCEEDED, FAILED = "idle", "running", "succeeded", "failed"
+
+# predictor keys with s3 objects (or prefixes) whose changes trigger a reload:
+WATCHED_PATH_KEYS = ("model_path", "encoder_path", "additional_data_path")
+
+
+class RegistryReloader:
+    """Replaces state.registry with a freshly loaded ModelRegistry"""
+
+    def __init__(self, state, config_path: str = MODEL_CONFIG):
+        """
+        :param state: object holding the current registry as .registry (app.state)
+        """
+
+        self.state = state
+        self.config_path = config_path
+
+        reload_conf = load_config(config_path).get("hot_reload", {})
+        self.watch = bool(reload_conf.get("watch", False))
+        self.watch_interval_s = float(reload_conf.get("watch_interval_s", DEFAULT_WATCH_INTERVAL_S))
+        self.drain_timeout_s = float(reload_conf.get("drain_timeout_s", DEFAULT_DRAIN_TIMEOUT_S))
+
+        self.status = IDLE
+        self.error: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.reloads = 0
+
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._watcher: Optional[asyncio.Task] = None
+        self._fingerprint: Optional[str] = None
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked() or (self._task is not None and not self._task.done())
+
+    def info(self) -> dict:
+        return {
+            "status": self.status,
+            "error": self.error,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "reloads": self.reloads,
+            "watch": self.watch,
+        }
+
+    def start_reload(self) -> bool:
+        """Start reload in background, False if one is already running"""
+
+        if self.running:
+            return False
+        self.status, self.error = RUNNING, None
+        self._task = asyncio.create_task(self.reload())
+        return True
+
+    async def reload(self) -> bool:
+        """Load, warm up and swap in a new registry, the current one stays on any error"""
+
+        async with self._lock:
+            self.status, self.error = RUNNING, None
+            self.started_at, self.finished_at = time.time(), None
+            logger.info("Reloading predictors from %s …", self.config_path)
+
+            # state the watcher compares with, a failed reload is retried on the next change only:
+            if self.watch:
+                try:
+                    self._fingerprint = await asyncio.to_thread(self.fingerprint)
+                except Exception as e:
+                    logger.warning("Could not check predictors for changes: %s", e)
+
+            try:
+                registry = await asyncio.to_thread(ModelRegistry, self.config_path)
+                if not registry.is_ready:
+                    registry.close()
+                    raise RuntimeError("No predictor is ready after reload")
+            except Exception as e:
+                self.status, self.error = FAILED, repr(e)
+                self.finished_at = time.time()
+                MODEL_REGISTRY_RELOADS.labels(result=FAILED).inc()
+                logger.exception("Reload failed, keeping current predictors")
+                return False
+
+            # one assignment: new requests get the new registry, running ones keep the old one:
+            old, self.state.registry = self.state.registry, registry
+            self.reloads += 1
+            self.status, self.finished_at = SUCCEEDED, time.time()
+            MODEL_REGISTRY_RELOADS.labels(result=SUCCEEDED).inc()
+            logger.info("Predictors reloaded in %.1f s: %s",
+                        self.finished_at - self.started_at, [s["model_id"] for s in registry.states()])
+
+        await self._retire(old)
+        return True
+
+    async def _retire(self, registry: ModelRegistry) -> None:
+        """Close replaced registry after its requests finish; after drain_timeout_s
+        it is closed anyway, and running requests still complete on its models"""
+
+        if not await registry.drain(self.drain_timeout_s):
+            logger.warning("%d requests still running on the replaced predictors after %.0f s, "
+                           "they are released when these finish", registry.inflight, self.drain_timeout_s)
+        await asyncio.to_thread(registry.close)
+        del registry
+        gc.collect()
+        logger.info("Replaced predictors released")
+
+    def start_watcher(self) -> None:
+        """Reload on changes of config.json or its s3 artifacts, if "hot_reload": {"watch": true}"""
+
+        if self.watch and self._watcher is None:
+            self._watcher = asyncio.create_task(self._watch())
+
+    async def _watch(self) -> None:
+        while True:
+            try:
+                fingerprint = await asyncio.to_thread(self.fingerprint)
+            except Exception as e:  # config being edited, s3 unavailable etc.
+                logger.warning("Could not check predictors for changes: %s", e)
+            else:
+                if self._fingerprint is None:
+                    self._fingerprint = fingerprint
+                elif fingerprint != self._fingerprint and not self.running:
+                    logger.info("Predictor config or artifacts changed, reloading")
+                    await self.reload()
+
+            await asyncio.sleep(self.watch_interval_s)
+
+    def fingerprint(self) -> str:
+        """Digest of config.json and ETags of s3 objects under the watched predictor paths"""
+
+        with open(self.config_path, "rb") as f:
+            config_bytes = f.read()
+        digest = hashlib.sha256(config_bytes)
+
+        for predictor_conf in load_config(self.config_path).get("predictors", []):
+            if predictor_conf.get("storage_type") != "s3":
+                continue
+            bucket_name = predictor_conf.get("bucket_name")
+            s3_client = get_s3_client(self.config_path)
+            for key in WATCHED_PATH_KEYS:
+                path = predictor_conf.get(key)
+                if not path:
+                    continue
+                prefix = s3_object_key(predictor_conf, str(path).replace('\\', '/'))
+                for page in s3_client.get_paginator("list_objects_v2").paginate(Bucket=bucket_name, Prefix=prefix):
+                    for obj in page.get("Contents", []):
+                        digest.update(f"{obj['Key']}={obj['ETag']}".encode("utf-8"))
+
+        return digest.hexdigest()
+
+    async def close(self) -> None:
+        """Stop the watcher and wait for a running reload"""
+
+        if self._watcher is not None:
+            self._watcher.cancel()
+        if self._task is not None and not self._task.done():
+            await self._task
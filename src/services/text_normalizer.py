@@ -0,0 +1,402 @@
+"""
+Compiled text normalizer for the LinearSVM preprocessing path.
+
+Does the same token mapping as map_noninformatives -> map_emoji_emoticons ->
+map_punctuation -> map_profanity -> del_punct_tokens from text_utils, but with
+every pattern compiled once per preprocessor and a fixed number of scans per text.
+The functions in text_utils stay the reference implementation (training notebooks use them).
+"""
+
+import copy
+import html
+import re
+import threading
+from collections import Counter
+from types import MappingProxyType
+
+from services.emoji_matcher import EmojiMatcher
+from services.text_utils import (emoji_reg_row, get_protected_mask, map_noninformatives,
+                                 map_emoji_emoticons, map_punctuation, map_profanity, del_punct_tokens)
+
+
+# same chars as the defaults of text_utils.map_punctuation:
+REP_PUNCT_REGEXP = r"([!\"#$%&'()*+,\-./:;<=>?@\[\]^_`{|}~]{2,})"
+SEP_PUNCT_REGEXP = r"[!\"#$%&'()*+,\-./:;<=>?@^`{|}~]"
+
+DEFAULT_OBSERVED_MAX_SIZE = 10000
+
+
+class TextNormalizer:
+    """Token mapping engine built once per preprocessor.
+    Encoding dicts are shared with the owner (not copied),
+    so new tokens are written to the same encodings as before.
+
+    In frozen mode encodings are read-only: unseen symbols get the OOV token of their kind
+    (the id right after the loaded vocabulary, same shape as training tokens)
+    and are counted in a capped side table for the next training cycle.
+    """
+
+    def __init__(self,
+                 morph_analyzer,
+                 profanities,
+                 encodings: dict,
+                 mapping_dict: dict,
+                 lemma_cache=None,
+                 profanity_index=None,
+                 frozen=False,
+                 observed_max_size=DEFAULT_OBSERVED_MAX_SIZE,
+                 token_emoji='EMJ',
+                 token_emoticon='EMT',
+                 token_sep_punct='SPP',
+                 token_seq_punct='RPP',
+                 token_profanity='PRF'):
+        """
+        :param encodings: dict with keys emoji, emoticon, rep_punct, sep_punct, profanity
+        :param mapping_dict: noninformative tokens (url, mention, hashtag, num, email)
+        :param lemma_cache: optional LemmaCache shared between threads
+        :param profanity_index: optional ProfanityIndex of inflected profanity forms
+        :param frozen: do not add unseen symbols to encodings, map them to OOV tokens
+        :param observed_max_size: max unseen symbols remembered per kind in frozen mode
+        """
+
+        self.morph = morph_analyzer
+        self.lemma_cache = lemma_cache
+        self.profanity_index = profanity_index
+        self.profanities = frozenset(profanities)
+
+        # read-only views are safe to read from any thread without locks:
+        self.frozen = frozen
+        if frozen:
+            encodings = {kind: MappingProxyType(enc) for kind, enc in encodings.items()}
+
+        self.enc_emoj: dict = encodings["emoji"]
+        self.enc_emot: dict = encodings["emoticon"]
+        self.enc_rep: dict = encodings["rep_punct"]
+        self.enc_sep: dict = encodings["sep_punct"]
+        self.enc_prof: dict = encodings["profanity"]
+        self.mapping_dict = mapping_dict
+
+        # known emoji are resolved by the matcher without the emoji package:
+        self.emoji_matcher = EmojiMatcher(self.enc_emoj)
+
+        self.token_emoji = token_emoji
+        self.token_emoticon = token_emoticon
+        self.token_sep_punct = token_sep_punct
+        self.token_seq_punct = token_seq_punct
+        self.token_profanity = token_profanity
+
+        self.oov_tokens = {
+            "emoji": f"[{token_emoji}_{len(self.enc_emoj)}]",
+            "emoticon": f"[{token_emoticon}_{len(self.enc_emot)}]",
+            "rep_punct": f"[{token_seq_punct}_{len(self.enc_rep)}]",
+            "sep_punct": f"[{token_sep_punct}_{len(self.enc_sep)}]",
+            "profanity": f"[{token_profanity}_{len(self.enc_prof)}]",
+        }
+        self.observed_max_size = observed_max_size
+        self._observed = {kind: Counter() for kind in self.oov_tokens}
+        self._observed_lock = threading.Lock()
+
+        # noninformatives, same order as in map_noninformatives:
+        self._url_re = re.compile(r"http\S+|www\S+")
+        self._mention_re = re.compile(r"[@]\w+")
+        self._vk_mention_re = re.compile(r'id\d+\|[^\s]+')
+        self._hashtag_re = re.compile(r"[#]\w+")
+        self._num_re = re.compile(r'\b\d+(\.\d+)?\b|NUMBER|number', flags=re.IGNORECASE)
+        self._email_re = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b')
+        self._br_re = re.compile(r'<br\s*/?>', flags=re.IGNORECASE)
+        self._tag_re = re.compile(r'<[^>]+>')
+        self._space_re = re.compile(r'\s+')
+
+        # emoticons, punctuation, profanity, tokens:
+        self._emoticon_re = re.compile(emoji_reg_row)
+        self._rep_re = re.compile(REP_PUNCT_REGEXP)
+        self._sep_re = re.compile(SEP_PUNCT_REGEXP)
+        self._word_re = re.compile(r"\b[А-Яа-яЁё']+\b")
+        self._del_punct_re = re.compile(r'\[(?!(EMJ|EMT|PRF)_\d+)[^\]]*\]')
+
+    def normalize(self, text: str) -> str:
+        """All mapping steps of LinearSVMPreprocessor.preprocess except the optional deletions"""
+
+        text = self.map_noninformatives(text)
+        text = self.map_emoji_emoticons(text)
+        text = self.map_punctuation(text)
+        text = self.map_profanity(text)
+
+        return text
+
+    def normalize_batch(self, texts: list) -> list:
+        """normalize() for many texts, profanity lemmas are resolved once per unique word.
+        Texts are processed in order, so new tokens get the same ids as with normalize()."""
+
+        lemmas = {}
+        result = []
+        for text in texts:
+            text = self.map_noninformatives(text)
+            text = self.map_emoji_emoticons(text)
+            text = self.map_punctuation(text)
+            result.append(self.map_profanity(text, lemmas))
+
+        return result
+
+    def map_noninformatives(self, text: str) -> str:
+        """Same passes as text_utils.map_noninformatives.
+        Passes whose trigger char is absent are skipped, they could not match anyway."""
+
+        mapping_dict = self.mapping_dict
+
+        if 'http' in text or 'www' in text:
+            text = self._url_re.sub(mapping_dict.get('url'), text)
+        if '@' in text:
+            text = self._mention_re.sub(mapping_dict.get('mention'), text)
+        if '|' in text:
+            text = self._vk_mention_re.sub(mapping_dict.get('mention'), text)
+        if '#' in text:
+            text = self._hashtag_re.sub(mapping_dict.get('hashtag'), text)
+
+        text = self._num_re.sub(mapping_dict.get('num'), text)
+
+        if '@' in text:
+            text = self._email_re.sub(mapping_dict.get('email'), text)
+
+        # clean html:
+        if '<' in text:
+            text = self._br_re.sub(' ', text)
+            text = self._tag_re.sub('', text)
+        text = html.unescape(text)
+        text = self._space_re.sub(' ', text).strip()
+
+        return text
+
+    def _encode(self, kind: str, encoding, token_name: str, key: str) -> str:
+        """Token of key. Unseen keys get the next id, in frozen mode the OOV token of kind"""
+
+        token = encoding.get(key)
+        if token is not None:
+            return token
+
+        if self.frozen:
+            self._observe(kind, key)
+            return self.oov_tokens[kind]
+
+        token = f"[{token_name}_{len(encoding)}]"
+        encoding[key] = token
+        return token
+
+    def _observe(self, kind: str, key: str, count: int = 1) -> None:
+        """Count unseen symbol, new symbols are dropped once the table of kind is full"""
+
+        if self.observed_max_size <= 0:
+            return
+
+        with self._observed_lock:
+            observed = self._observed[kind]
+            if key in observed or len(observed) < self.observed_max_size:
+                observed[key] += count
+
+    def export_observed(self) -> dict:
+        """Unseen symbols met in frozen mode: kind -> {symbol: count}, most frequent first"""
+
+        with self._observed_lock:
+            return {kind: dict(observed.most_common()) for kind, observed in self._observed.items()}
+
+    def take_observed(self) -> dict:
+        """export_observed() and reset the counts (counts of a pool worker since its last chunk)"""
+
+        with self._observed_lock:
+            observed = {kind: dict(counts) for kind, counts in self._observed.items() if counts}
+            for counts in self._observed.values():
+                counts.clear()
+        return observed
+
+    def merge_observed(self, observed: dict) -> None:
+        """Add counts taken from another normalizer, same size bound as own observations"""
+
+        for kind, counts in observed.items():
+            for key, count in counts.items():
+                self._observe(kind, key, count)
+
+    def map_emoji_emoticons(self, text: str) -> str:
+        """Same result as text_utils.map_emoji_emoticons with one replacement pass per kind"""
+
+        text = self._encode_emoji(text)
+        text = self._encode_emoticon(text)
+
+        return text
+
+    def _encode_emoji(self, text: str) -> str:
+
+        # emoji are never ascii:
+        if text.isascii():
+            return text
+
+        emoji_list = self.emoji_matcher.emoji_list(text)
+        if not emoji_list:
+            return text
+
+        # new tokens in sorted order, as in map_emoji_emoticons:
+        found = Counter(item['emoji'] for item in emoji_list)
+        tokens = {e: self._encode("emoji", self.enc_emoj, self.token_emoji, e) for e in sorted(found)}
+
+        # sequential str.replace differs from positional replacement only when
+        # some emoji also occurs inside another one (e.g. skin tones, ZWJ sequences):
+        if any(text.count(e) != n for e, n in found.items()):
+            for e in sorted(found):
+                text = text.replace(e, tokens[e])
+            return text
+
+        parts = []
+        last = 0
+        for item in emoji_list:
+            parts.append(text[last:item['match_start']])
+            parts.append(tokens[item['emoji']])
+            last = item['match_end']
+        parts.append(text[last:])
+
+        return ''.join(parts)
+
+    def _encode_emoticon(self, text: str) -> str:
+        """One pass of the emoticon pattern compiled at build time"""
+
+        def repl(match):
+            return self._encode("emoticon", self.enc_emot, self.token_emoticon, match.group(0))
+
+        return self._emoticon_re.sub(repl, text)
+
+    def map_punctuation(self, text: str) -> str:
+        """Same result as text_utils.map_punctuation with linear protected-span lookup"""
+
+        mask = get_protected_mask(text)
+        size = len(mask)
+
+        def repl_repeat(match):
+            seq = match.group(1)
+            if mask[match.start()]:
+                return seq
+
+            unique_chars = ''.join(sorted(set(seq), key=seq.index))
+            normalized = unique_chars[0] if len(unique_chars) == 1 else unique_chars
+
+            return self._encode("rep_punct", self.enc_rep, self.token_seq_punct, normalized)
+
+        def repl_single(match):
+            ch = match.group(0)
+            # NOTE: map_punctuation checks positions of the text after repeat replacement
+            # against regions of the original text, kept as is for parity with training:
+            start = match.start()
+            if start < size and mask[start]:
+                return ch
+
+            return self._encode("sep_punct", self.enc_sep, self.token_sep_punct, ch)
+
+        text = self._rep_re.sub(repl_repeat, text)
+        text = self._sep_re.sub(repl_single, text)
+
+        return text
+
+    def lemmatize(self, word: str) -> str:
+        """Normal form of lowercased word"""
+
+        lower = word.lower()
+        if self.lemma_cache is not None:
+            return self.lemma_cache.get(lower, self._parse_normal_form)
+
+        return self._parse_normal_form(lower)
+
+    def _parse_normal_form(self, lower: str) -> str:
+        return self.morph.parse(lower)[0].normal_form
+
+    def profanity_lemma(self, word: str):
+        """Profanity lemma of word or None.
+        With profanity index only out-of-vocabulary words go to morphological analysis:
+        a dictionary word missing in the index has no profanity as its top lemma."""
+
+        lemma = None
+        if self.profanity_index is not None:
+            lower = word.lower()
+            lemma = self.profanity_index.get(lower)
+            if lemma is not None:
+                return lemma
+
+            if self.lemma_cache is not None:
+                lemma = self.lemma_cache.lookup(lower)
+            if lemma is None and self.morph.word_is_known(lower):
+                return None
+
+        if lemma is None:
+            lemma = self.lemmatize(word)
+
+        return lemma if lemma in self.profanities else None
+
+    def map_profanity(self, text: str, lemmas: dict = None) -> str:
+        """Same result as text_utils.map_profanity with hashed profanity lookup
+        :param lemmas: optional memo lowercased word -> profanity lemma, shared within a batch
+        """
+
+        def repl(match):
+            word = match.group(0)
+            if lemmas is None:
+                lemma = self.profanity_lemma(word)
+            else:
+                lower = word.lower()
+                if lower in lemmas:
+                    lemma = lemmas[lower]
+                else:
+                    lemma = lemmas[lower] = self.profanity_lemma(word)
+
+            if lemma is None:
+                return word
+
+            return self._encode("profanity", self.enc_prof, self.token_profanity, lemma)
+
+        return self._word_re.sub(repl, text)
+
+    def del_punct_tokens(self, text: str) -> str:
+        return self._del_punct_re.sub('', text)
+
+
+def reference_normalize(text: str, morph_analyzer, profanities, encodings: dict,
+                        mapping_dict: dict, del_punct=True) -> str:
+    """Reference pipeline made of the text_utils functions (as used for training)"""
+
+    text = map_noninformatives(text, mapping_dict)
+    text = map_emoji_emoticons(text, (encodings["emoji"], encodings["emoticon"]))
+    text = map_punctuation(text, encodings["rep_punct"], encodings["sep_punct"])
+    text = map_profanity(morph_analyzer, text, list(profanities), encodings["profanity"])
+    if del_punct:
+        text = del_punct_tokens(text)
+
+    return text
+
+
+def check_parity(normalizer: TextNormalizer, texts, del_punct=True) -> list:
+    """Compare normalizer against the text_utils reference on a corpus.
+    Both sides work on copies of the encodings, the normalizer is not modified.
+    NOTE: map_emoji_emoticons numbers several new emoticons of one text in set order,
+    so seed the emoticon encoding with the corpus emoticons for an exact comparison.
+    Returns list of (text, expected, actual) for every mismatch.
+    """
+
+    ref_enc = {
+        "emoji": dict(normalizer.enc_emoj),
+        "emoticon": dict(normalizer.enc_emot),
+        "rep_punct": dict(normalizer.enc_rep),
+        "sep_punct": dict(normalizer.enc_sep),
+        "profanity": dict(normalizer.enc_prof),
+    }
+    engine = copy.copy(normalizer)
+    engine.frozen = False
+    engine.enc_emoj, engine.enc_emot = dict(ref_enc["emoji"]), dict(ref_enc["emoticon"])
+    engine.enc_rep, engine.enc_sep = dict(ref_enc["rep_punct"]), dict(ref_enc["sep_punct"])
+    engine.enc_prof = dict(ref_enc["profanity"])
+
+    mismatches = []
+    for text in texts:
+        expected = reference_normalize(text, normalizer.morph, normalizer.profanities,
+                                       ref_enc, normalizer.mapping_dict, del_punct)
+        actual = engine.normalize(text)
+        if del_punct:
+            actual = engine.del_punct_tokens(actual)
+        if actual != expected:
+            mismatches.append((text, expected, actual))
+
+    return mismatches
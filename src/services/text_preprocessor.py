@@ -2,20 +2,64 @@
 Preprocessors can be slightly flexible a
 """
 
+import logging
+import math
+import multiprocessing
+import re
+
 from abc import ABC, abstractmethod
-import pymorphy3 as pymorphy2
+from concurrent.futures import ProcessPoolExecutor
+from scipy.sparse import vstack
 
 from core.config import MODEL_CONFIG
-from stop_words import get_stop_words
 from pathlib import Path
+from typing import List, Tuple
 
-from services.text_utils import map_noninformatives, map_punctuation, \
-                                map_profanity, map_emoji_emoticons, del_punct_tokens, get_num_features
-from services.utils import Boto3Reader, load_loc_enc_json, load_s3_enc_json, load_s3_txt
+from services.text_utils import get_num_features_batch
+from services.lemma_cache import LemmaCache, DEFAULT_LEMMA_CACHE_SIZE, parse_word_frequencies
+from services.profanity_index import ProfanityIndex
+from services.text_normalizer import TextNormalizer, DEFAULT_OBSERVED_MAX_SIZE
+from services.preprocess_resources import (
+    ENCODING_FILES, PROFANITY_FILE, PROFANITY_INDEX_FILE,
+    get_morph_analyzer, get_preprocess_resources, get_russian_stop_words,
+)
+from services.utils import Boto3Reader, load_s3_enc_json, load_s3_txt
 
 
 BASE_DIR = Path(__file__).resolve().parent
 
+logger = logging.getLogger(__name__)
+
+NONINFORMATIVE_MAPPING = {
+    "url": "[URL]",
+    "num": "[NUM]", # 
+    "mention": "[MNT]",
+    "hashtag": "[HSG]",
+    "email": "[EML]",
+    "repeat_punct": "[RPP]",
+}
+
+DEFAULT_PARALLEL_MIN_BATCH = 512
+
+WHITESPACE_REGEXP = re.compile(r'\s+')
+
+# preprocessor of the current pool worker process: 
+_worker_preprocessor = None
+
+
+def _init_preprocess_worker(preprocessor_class, config: dict):
+    """Load encodings, MorphAnalyzer, etc. once per worker process"""
+
+    global _worker_preprocessor
+    _worker_preprocessor = preprocessor_class(config=dict(config, preprocess_workers=0))
+
+
+def _preprocess_chunk(texts: list, kwargs: dict):
+    """Preprocessed chunk and the unseen symbols it contained, counted in the parent"""
+
+    result = _worker_preprocessor.preprocess_batch(texts, **kwargs)
+    return result, _worker_preprocessor.normalizer.take_observed()
+
 
 class TextPreprocessor: 
     """Text domain preprocessor: cleaning, mapping, lemmatization, etc."""
@@ -29,6 +73,20 @@ class TextPreprocessor:
 
         return text  
 
+    def preprocess_batch(self, texts: list) -> list:
+        """preprocess() for many texts, same output as calling it per text"""
+
+        return [self.preprocess(text) for text in texts]
+
+    def canonical_text(self, text: str) -> str:
+        """Text with differences that can not change preprocess() output removed,
+        texts with equal canonical form are preprocessed equally (used for cache keys)"""
+
+        return text
+
+    def close(self):
+        pass
+
 class LinearSVMPreprocessor(TextPreprocessor):
     """Preprocessor especially for LinearSVM model
     Using different text utils from text_utils"""
@@ -38,45 +96,123 @@ class LinearSVMPreprocessor(TextPreprocessor):
         # super().__init__(use_num_features)
         super().__init__()
 
-        storage_type = config.get("storage_type")
         data_dir = Path(config.get("additional_data_path")) if \
             config.get("additional_data_path") is not None else None
+        prof_index_file = data_dir / PROFANITY_INDEX_FILE
+
+        # profanities and encoding dicts, shared by preprocessors with the same artifact version: 
+        self.resources = get_preprocess_resources(config)
+        self.profanities: list = self.resources.profanities
+        encodings = self.resources.encodings
+        if not config.get("frozen_encodings", False):
+            # unseen symbols get added to the dicts, so each preprocessor needs its own: 
+            encodings = {kind: dict(enc) for kind, enc in encodings.items()}
+
+        self.enc_emoj: dict = encodings["emoji"]
+        self.enc_emot: dict = encodings["emoticon"]
+        self.enc_prof: dict = encodings["profanity"]
+        self.enc_rep: dict = encodings["rep_punct"]
+        self.enc_sep: dict = encodings["sep_punct"]
+
+        # one per process: 
+        self.morph = get_morph_analyzer()
+        self.stop_words = get_russian_stop_words()
+
+        # word -> lemma cache, optionally pre-seeded from word frequency file, 
+        # shared by preprocessors with the same data and cache settings: 
+        lemma_cache_size = int(config.get("lemma_cache_size", DEFAULT_LEMMA_CACHE_SIZE))
+        self.lemma_cache = self.resources.get_lemma_cache(
+            (lemma_cache_size, config.get("lemma_cache_seed_path")),
+            lambda: self._build_lemma_cache(config, lemma_cache_size),
+        )
+
+        # inflected forms of profanities, stored next to encodings once built: 
+        self.profanity_index = self.resources.get_profanity_index(
+            lambda: self._load_profanity_index(config, prof_index_file)
+        ) if config.get("use_profanity_index", True) else None
+
+        # compiled mapping engine, shares the encoding dicts above: 
+        self.normalizer = TextNormalizer(
+            self.morph,
+            self.profanities,
+            encodings={
+                "emoji": self.enc_emoj,
+                "emoticon": self.enc_emot,
+                "rep_punct": self.enc_rep,
+                "sep_punct": self.enc_sep,
+                "profanity": self.enc_prof,
+            },
+            mapping_dict=NONINFORMATIVE_MAPPING,
+            lemma_cache=self.lemma_cache,
+            profanity_index=self.profanity_index,
+            frozen=bool(config.get("frozen_encodings", False)),
+            observed_max_size=int(config.get("observed_symbols_max_size", DEFAULT_OBSERVED_MAX_SIZE)),
+        )
+
+        # in frozen mode these are read-only views: 
+        self.enc_emoj, self.enc_emot = self.normalizer.enc_emoj, self.normalizer.enc_emot
+        self.enc_rep, self.enc_sep = self.normalizer.enc_rep, self.normalizer.enc_sep
+        self.enc_prof = self.normalizer.enc_prof
+
+        # persistent process pool for large batches, started on first use: 
+        self._config = config
+        self.preprocess_workers = int(config.get("preprocess_workers", 0))
+        self.parallel_min_batch = int(config.get("preprocess_parallel_min_batch", DEFAULT_PARALLEL_MIN_BATCH))
+        self._pool = None
+
+    @staticmethod
+    def s3_artifacts(config: dict) -> Tuple[List[str], List[str]]:
+        """(required, optional) s3 paths read by __init__, to fetch them all at once"""
+
+        data_dir = Path(config.get("additional_data_path"))
+        required = [str(data_dir / name).replace('\\','/')
+                    for name in [PROFANITY_FILE] + list(ENCODING_FILES.values())]
+        if config.get("lemma_cache_seed_path"):
+            required.append(str(config.get("lemma_cache_seed_path")).replace('\\','/'))
+
+        optional = [str(data_dir / PROFANITY_INDEX_FILE).replace('\\','/')] \
+            if config.get("use_profanity_index", True) else []
+
+        return required, optional
+
+    def export_observed_symbols(self) -> dict:
+        """Symbols missing in frozen encodings with their counts, for the next training cycle"""
+
+        return self.normalizer.export_observed()
+
+    def _load_profanity_index(self, config: dict, prof_index_file: Path) -> ProfanityIndex:
+        """Load profanity index of current artifact version or build it.
+        Local artifacts get the built index saved next to them,
+        for s3 upload profanity_index.json next to the encodings."""
+
+        if config.get("storage_type") == "local":
+            return ProfanityIndex.load_or_build(self.morph, self.profanities, path=prof_index_file)
+
+        try:
+            data = load_s3_enc_json(config, str(prof_index_file).replace('\\','/'))
+        except Exception as exc:
+            logger.warning("Could not load profanity index from s3 %s: %s", prof_index_file, exc)
+            data = None
 
-        # specific config files: 
-        profanity_file = data_dir / 'bad_words_lemmas.txt'
-        enc_emoj_file = data_dir / "encoding_emoji.json"
-        enc_emot_file = data_dir / "encoding_emoticon.json"
-        enc_prof_file = data_dir / "encoding_profanities.json"
-        enc_rep_file = data_dir / "encoding_rep_punct.json"
-        enc_sep_file = data_dir / "encoding_sep_punct.json"
-
-        if storage_type == "local":
-
-            # profanities text file: 
-            with open(profanity_file, 'r', encoding="utf-8") as f:
-                profanities = [l.strip() for l in f.readlines()]
-            self.profanities: list = profanities
-            
-            # encoding dicts: 
-            self.enc_emoj: dict = load_loc_enc_json(enc_emoj_file)
-            self.enc_emot: dict = load_loc_enc_json(enc_emot_file)
-            self.enc_prof: dict = load_loc_enc_json(enc_prof_file)
-            self.enc_rep: dict = load_loc_enc_json(enc_rep_file)
-            self.enc_sep: dict = load_loc_enc_json(enc_sep_file)
-
-        elif storage_type == "s3":
-            
-            print('enc_emoj_file', str(enc_emoj_file))
-            self.enc_emoj: dict = load_s3_enc_json(config, str(enc_emoj_file).replace('\\','/'))
-            self.enc_emot: dict = load_s3_enc_json(config, str(enc_emot_file).replace('\\','/'))
-            self.enc_prof: dict = load_s3_enc_json(config, str(enc_prof_file).replace('\\','/'))
-            self.enc_rep: dict = load_s3_enc_json(config, str(enc_rep_file).replace('\\','/'))
-            self.enc_sep: dict = load_s3_enc_json(config, str(enc_sep_file).replace('\\','/'))
-
-            self.profanities: list = load_s3_txt(config, str(profanity_file).replace('\\','/'))
-
-        self.morph = pymorphy2.MorphAnalyzer()
-        self.stop_words = set(get_stop_words('russian'))
+        return ProfanityIndex.load_or_build(self.morph, self.profanities, data=data)
+
+    def _build_lemma_cache(self, config: dict, maxsize: int) -> LemmaCache:
+        """Lemma cache pre-filled from lemma_cache_seed_path if passed in config"""
+
+        lemma_cache = LemmaCache(maxsize)
+        seed_path = config.get("lemma_cache_seed_path")
+        if not seed_path or maxsize <= 0:
+            return lemma_cache
+
+        if config.get("storage_type") == "s3":
+            lines = load_s3_txt(config, str(seed_path).replace('\\','/'))
+        else:
+            with open(seed_path, 'r', encoding="utf-8") as f:
+                lines = f.readlines()
+
+        words = parse_word_frequencies(lines, limit=maxsize)
+        lemma_cache.seed(words, lambda w: self.morph.parse(w)[0].normal_form)
+        return lemma_cache
 
     def preprocess(self, 
                     text: str,
@@ -92,45 +228,110 @@ class LinearSVMPreprocessor(TextPreprocessor):
         between the models and their methods.
         """
         
-        mapping_dict = {
-            "url": "[URL]",
-            "num": "[NUM]", # 
-            "mention": "[MNT]",
-            "hashtag": "[HSG]",
-            "email": "[EML]",
-            "repeat_punct": "[RPP]",
-        }
-
-        # if not(mapping)
-
         if mapping:
-            # mapping steps from text part of text_domain_features_0.ipynb: 
-            text = map_noninformatives(text, mapping_dict)
-            text = map_emoji_emoticons(text, (self.enc_emoj, self.enc_emot))
-            text = map_punctuation(text, self.enc_rep, self.enc_sep)
-            text = map_profanity(self.morph, text, self.profanities, self.enc_prof)
-
-            # delete stop_words: 
-            if del_stop_words:
-                text = ' '.join(word for word in text.split() if word.lower() not in self.stop_words)
-            
-            if del_punct: 
-                text = del_punct_tokens(text)
+            # mapping steps from text part of text_domain_features_0.ipynb
+            # (noninformatives, emoji/emoticons, punctuation, profanity): 
+            text = self.normalizer.normalize(text)
+            text = self._postprocess(text, del_stop_words, del_punct)
 
         # add numeric features as sparse matrix: 
         if use_num_features: 
-            num_features = get_num_features(text)
+            num_features = get_num_features_batch([text])
         else: 
             num_features = None
 
         return (text, num_features)
 
+    def canonical_text(self, text: str) -> str:
+        """map_noninformatives collapses whitespace before any whitespace-sensitive step.
+        Case is kept: num features depend on it."""
+
+        return WHITESPACE_REGEXP.sub(' ', text).strip()
+
+    def _postprocess(self, text: str, del_stop_words: bool, del_punct: bool) -> str:
+        """Optional deletions after mapping"""
+
+        # delete stop_words: 
+        if del_stop_words:
+            text = ' '.join(word for word in text.split() if word.lower() not in self.stop_words)
+        
+        if del_punct: 
+            text = self.normalizer.del_punct_tokens(text)
+
+        return text
+
+    def preprocess_batch(self, 
+                         texts: list,
+                         mapping=True,
+                         del_stop_words=False,
+                         del_punct=True,
+                         use_num_features=True
+                         ) -> tuple: 
+        """Returns (list of preprocessed texts, N x num features sparse matrix or None),
+        the same values as preprocess() per text.
+        Large batches go to the process pool when encodings are frozen: 
+        workers own copies of the encodings, new symbols would get different ids in them."""
+
+        kwargs = dict(mapping=mapping, del_stop_words=del_stop_words, 
+                      del_punct=del_punct, use_num_features=use_num_features)
+
+        if mapping and self.preprocess_workers > 0 and self.normalizer.frozen \
+                and len(texts) >= self.parallel_min_batch: 
+            return self._preprocess_batch_parallel(texts, kwargs)
+
+        if mapping:
+            texts = self.normalizer.normalize_batch(texts)
+            texts = [self._postprocess(text, del_stop_words, del_punct) for text in texts]
+        else: 
+            texts = list(texts)
+
+        num_features = get_num_features_batch(texts) if use_num_features else None
+
+        return (texts, num_features)
+
+    def _preprocess_batch_parallel(self, texts: list, kwargs: dict) -> tuple:
+        """Split batch into one chunk per worker, keep the order of texts"""
+
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.preprocess_workers,
+                # spawn: forking a process with running threads is unsafe
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_preprocess_worker,
+                initargs=(type(self), self._config),
+            )
+
+        chunk_size = math.ceil(len(texts) / self.preprocess_workers)
+        futures = [self._pool.submit(_preprocess_chunk, texts[i:i + chunk_size], kwargs)
+                   for i in range(0, len(texts), chunk_size)]
+        results = []
+        for future in futures:
+            result, observed = future.result()
+            self.normalizer.merge_observed(observed)
+            results.append(result)
+
+        texts = [text for chunk_texts, _ in results for text in chunk_texts]
+        num_features = vstack([features for _, features in results], format="csr") \
+            if kwargs["use_num_features"] else None
+
+        return (texts, num_features)
+
+    def close(self):
+        """Stop preprocessing worker processes"""
+
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
 class LinearSVMPreprocessorSI(LinearSVMPreprocessor): 
     def __init__(self, config: dict):
         super().__init__(config)
 
     def preprocess(self, text, mapping=True, del_stop_words=False, del_punct=True, use_num_features=True):
         return super().preprocess(text, mapping, del_stop_words, del_punct, use_num_features)
+
+    def preprocess_batch(self, texts, mapping=True, del_stop_words=False, del_punct=True, use_num_features=True):
+        return super().preprocess_batch(texts, mapping, del_stop_words, del_punct, use_num_features)
     
 class LinearSVMPreprocessorRaw(LinearSVMPreprocessor): 
     def __init__(self, config: dict):
@@ -139,6 +340,13 @@ class LinearSVMPreprocessorRaw(LinearSVMPreprocessor):
     def preprocess(self, text, mapping=False, del_stop_words=False, del_punct=False, use_num_features=True):
         return super().preprocess(text, mapping, del_stop_words, del_punct, use_num_features)
 
+    def preprocess_batch(self, texts, mapping=False, del_stop_words=False, del_punct=False, use_num_features=True):
+        return super().preprocess_batch(texts, mapping, del_stop_words, del_punct, use_num_features)
+
+    def canonical_text(self, text: str) -> str:
+        # raw text goes to features as is: 
+        return text
+
 class BertPreprocessor(TextPreprocessor):
     """Basic preprocessor for BERT.
     Does not include any specific steps because 
@@ -150,4 +358,10 @@ class BertPreprocessor(TextPreprocessor):
     def preprocess(self, text: str) -> str:
         # Return cleaned text as-is; tokenization logic lives in the tokenizer
         return text.strip()
+
+    def preprocess_batch(self, texts: list) -> list:
+        return [text.strip() for text in texts]
+
+    def canonical_text(self, text: str) -> str:
+        return text.strip()
     
\ No newline at end of file
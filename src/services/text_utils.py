@@ -81,6 +81,91 @@ def get_num_features(text: str) -> csr_matrix:
 
     return num_sparse
 
+NUM_FEATURE_NAMES = [
+    'count_spp', 'count_rpp', 'punct_after_space', 'has_emoji', 'has_emoticon',
+    'has_capslock', 'is_all_lower', 'has_punctuation_spp', 'has_punctuation_rpp',
+    'has_fence_ironic_style', 'count_profanity', 'is_bad_word_incl', 'has_pronouns',
+    'starts_with_cap', 'ends_with_dot', 'has_emotional_sym', 'has_repeating_letters_3plus',
+    'has_url', 'has_number', 'has_mention', 'has_hashtag',
+]
+
+# all tokens used by get_num_features in one pattern (tokens never overlap): 
+NUM_FEATURE_TOKENS_REGEXP = re.compile(r'\[(SPP|RPP|EMJ|EMT|PRF|PRON)_(\d+)\]|\[(URL|NUM|MNT|HSG)\]')
+ANY_BRACKETS_REGEXP = re.compile(r'\[.*?\]')
+SENTENCE_SPLIT_REGEXP = re.compile(r'[.!?]')
+WORD_REGEXP = re.compile(r'\b\w+\b')
+FENCE_REGEXP = re.compile(r'\*.*?\*')
+REPEATING_LETTERS_REGEXP = re.compile(r'([A-Za-zА-Яа-яЁё])\1{2,}', flags=re.IGNORECASE)
+
+def _num_features_row(text: str, row: np.ndarray) -> None:
+    """Fills row with the same values as get_num_features, in NUM_FEATURE_NAMES order"""
+
+    counts = {'SPP': 0, 'RPP': 0, 'EMJ': 0, 'EMT': 0, 'PRF': 0, 'PRON': 0,
+              'URL': 0, 'NUM': 0, 'MNT': 0, 'HSG': 0}
+    punct_after_space = 0
+    emotional_sym = 0
+
+    for match in NUM_FEATURE_TOKENS_REGEXP.finditer(text):
+        kind = match.group(1) or match.group(3)
+        counts[kind] += 1
+        if kind == 'SPP':
+            if match.start() > 0 and text[match.start() - 1] == ' ':
+                punct_after_space = 1
+            if match.group(2) == '4':
+                emotional_sym = 1
+        elif kind == 'RPP' and match.group(2) == '2':
+            emotional_sym = 1
+
+    # text without any [ ... ] parts: 
+    text_no_tokens = ANY_BRACKETS_REGEXP.sub('', text)
+
+    has_capslock = any(m.group(0).isupper() for m in WORD_REGEXP.finditer(text))
+    is_all_lower = bool(text_no_tokens) and text_no_tokens.islower()
+
+    starts_with_cap_each = [s.strip()[0].isupper()
+                            for s in SENTENCE_SPLIT_REGEXP.split(text_no_tokens.strip()) if s.strip()]
+    starts_with_cap = bool(starts_with_cap_each) and \
+        sum(starts_with_cap_each) > (len(starts_with_cap_each) / 2)
+
+    row[:] = (
+        counts['SPP'],
+        counts['RPP'],
+        punct_after_space,
+        counts['EMJ'] > 0,
+        counts['EMT'] > 0,
+        has_capslock,
+        is_all_lower,
+        counts['SPP'] > 0,
+        counts['RPP'] > 0,
+        FENCE_REGEXP.search(text) is not None,
+        counts['PRF'],
+        counts['PRF'] >= 1,
+        counts['PRON'] > 0,
+        starts_with_cap,
+        text.endswith('[SPP_3]'),
+        emotional_sym,
+        REPEATING_LETTERS_REGEXP.search(text_no_tokens) is not None,
+        counts['URL'] > 0,
+        counts['NUM'] > 0,
+        counts['MNT'] > 0,
+        counts['HSG'] > 0,
+    )
+
+def get_num_features_dense(texts: list) -> np.ndarray:
+    """Dense N x len(NUM_FEATURE_NAMES) float32 array of num features"""
+
+    features = np.zeros((len(texts), len(NUM_FEATURE_NAMES)), dtype=np.float32)
+    for i, text in enumerate(texts):
+        _num_features_row(text, features[i])
+
+    return features
+
+def get_num_features_batch(texts: list) -> csr_matrix:
+    """Returns one N x len(NUM_FEATURE_NAMES) sparse matrix for N preprocessed texts,
+    row i equals get_num_features(texts[i])"""
+
+    return csr_matrix(get_num_features_dense(texts))
+
 def map_noninformatives(text, mapping_dict: dict):
     """Mapping extra str that does not contain useful or informative substrings: 
     Cleaning of URLs, mentiones, hashtags, numbers, emails, HTML symbols, do strip
@@ -187,6 +272,46 @@ def map_emoji_emoticons(text: str,
     return text
 
 
+TOKEN_REGEXP = re.compile(r"\[[A-Za-z0-9_]+\]")
+BRACKET_REGEXP = re.compile(r"[\[\]]")
+
+def get_protected_mask(text: str) -> bytearray:
+    """
+    Flags positions inside existing [TOKEN]-like regions or generic [ ... ] regions
+    (even unclosed). Brackets inside tokens do not open or close regions.
+    Linear in text length, whatever the number of brackets and tokens.
+    """
+
+    mask = bytearray(len(text))
+    if '[' not in text:
+        return mask
+
+    # Find existing [TOKEN]-like regions: 
+    for match in TOKEN_REGEXP.finditer(text):
+        start, end = match.span()
+        mask[start:end] = b'\x01' * (end - start)
+
+    # Detect generic bracket regions (for [ ... ] ), excluding [TOKEN] ones: 
+    bracket_spans = []
+    open_pos = None
+    for match in BRACKET_REGEXP.finditer(text):
+        i = match.start()
+        if mask[i]:
+            continue  # Skip positions inside known tokens entirely
+        if text[i] == '[':
+            if open_pos is None:
+                open_pos = i
+        elif open_pos is not None:
+            bracket_spans.append((open_pos, i + 1))
+            open_pos = None
+    if open_pos is not None:  # text ends with unclosed '['
+        bracket_spans.append((open_pos, len(text)))
+
+    for start, end in bracket_spans:
+        mask[start:end] = b'\x01' * (end - start)
+
+    return mask
+
 def map_punctuation(
         text: str, 
         mapping_rep_dict: dict, 
@@ -204,14 +329,10 @@ def map_punctuation(
     """
 
 
-    def is_inside_token(pos: int) -> bool:
-        """Check if position is inside [TOKEN]-like region."""
-        return any(start <= pos < end for start, end in token_spans)
-    
     def is_protected(pos: int) -> bool:
         """Return True if position is inside any protected region (token or [ ... ])."""
         
-        return is_inside_token(pos) or any(start <= pos < end for start, end in bracket_spans)
+        return pos < len(protected) and protected[pos] == 1
 
     def repl_repeat(match):
         """Handle repeating punctuation"""
@@ -255,25 +376,8 @@ def map_punctuation(
     rep_pattern = re.compile(rep_regexp)
     sep_pattern = re.compile(nonrep_regexp)
 
-    # Find existing [TOKEN]-like regions: 
-    token_spans = []
-    for match in re.finditer(r"\[[A-Za-z0-9_]+\]", text):
-        token_spans.append((match.start(), match.end()))
-
-    # Detect generic bracket regions (for [ ... ] ), excluding [TOKEN] ones: 
-    bracket_spans = []
-    open_pos = None
-    for i, ch in enumerate(text):
-        if is_inside_token(i):
-            continue  # Skip positions inside known tokens entirely
-        if ch == '[':
-            if open_pos is None:
-                open_pos = i
-        elif ch == ']' and open_pos is not None:
-            bracket_spans.append((open_pos, i + 1))
-            open_pos = None
-    if open_pos is not None:  # text ends with unclosed '['
-        bracket_spans.append((open_pos, len(text)))
+    # Protected regions ([TOKEN]-like and generic [ ... ]), one flag per position: 
+    protected = get_protected_mask(text)
 
     # Apply replacements: 
     new_text = rep_pattern.sub(repl_repeat, text)
@@ -3,15 +3,32 @@ import json
 import pickle 
 import boto3
 import io
-import pandas as pd 
+import logging
+import threading
+import time
 
+from botocore.config import Config as BotoConfig
+from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List
 
 from core.config import MODEL_CONFIG
+from services.artifact_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_WORKERS, S3ArtifactCache
+
+if TYPE_CHECKING:  # pandas is imported by get_boto3_csv only
+    import pandas as pd
 
 
 BASE_DIR = Path(__file__).resolve().parent
 
+logger = logging.getLogger(__name__)
+
+# one s3 client per config file for the whole process: 
+S3_MAX_POOL_CONNECTIONS = 32
+_S3_CLIENTS: dict = {}
+_S3_CLIENTS_LOCK = threading.Lock()
+
 def load_config(config_path: str = MODEL_CONFIG):
     
     # path = BASE_DIR / Path(config_path)
@@ -55,15 +72,11 @@ def load_pickle(config: dict):
             model = pickle.load(f)
 
     elif storage_type == "s3": 
-        reader = Boto3Reader(
-            config_path=MODEL_CONFIG, 
-            bucket_name=config.get("bucket_name")
-        )
-
-        # get raw bytes: 
-        model = reader.get_boto3_obj(config.get("model_path"))
-        # load pickle from bytes: 
-        model = pickle.load(io.BytesIO(model['Body'].read()))
+        # download once per object version: 
+        model_path = fetch_s3_artifact(config, config.get("model_path"))
+
+        with open(model_path, "rb") as f: 
+            model = pickle.load(f)
     else: 
         raise ValueError(f"Unsupported storage type: {storage_type}")
 
@@ -97,15 +110,11 @@ def load_encoder(config):
         with open(encoder_path, "rb") as f:
             encoder = pickle.load(f)
     elif storage_type == "s3":
-        reader = Boto3Reader(
-            config_path=MODEL_CONFIG, 
-            bucket_name=config.get("bucket_name")
-        )
+        # download once per object version: 
+        encoder_path = fetch_s3_artifact(config, config.get("encoder_path"))
 
-        # get raw bytes: 
-        encoder = reader.get_boto3_obj(config.get("encoder_path"))
-        # load pickle from bytes: 
-        encoder = pickle.load(io.BytesIO(encoder['Body'].read()))
+        with open(encoder_path, "rb") as f:
+            encoder = pickle.load(f)
 
     return encoder
 
@@ -132,50 +141,107 @@ def load_loc_enc_json(path: str) -> dict:
     return config
 
 def load_s3_enc_json(config: dict, path: str) -> dict:
-    reader = Boto3Reader(
-        config_path=MODEL_CONFIG, 
-        bucket_name=config.get("bucket_name")
-    )
-
-    # get raw bytes: 
-    enc_json = reader.get_boto3_obj(path)
-    # load json from bytes: 
-    enc_json = json.loads(enc_json['Body'].read())
+    # local copy from the artifact cache: 
+    with open(fetch_s3_artifact(config, path), "r", encoding="utf-8") as f:
+        enc_json = json.load(f)
 
     return enc_json
 
 def load_s3_txt(config: dict, path: str) -> list:
-    reader = Boto3Reader(
-        config_path=MODEL_CONFIG, 
-        bucket_name=config.get("bucket_name")
+    # local copy from the artifact cache: 
+    with open(fetch_s3_artifact(config, path), "r", encoding="utf-8") as f:
+        enc_txt = f.read().splitlines()
+
+    return enc_txt
+
+def get_s3_client(config_path: str = MODEL_CONFIG):
+    """Process-wide boto3 s3 client of config (one connection pool shared by all loaders)"""
+
+    with _S3_CLIENTS_LOCK:
+        s3_client = _S3_CLIENTS.get(config_path)
+        if s3_client is None:
+            config = load_config(config_path)
+            # sessions are not thread-safe, clients are: 
+            session = boto3.session.Session()
+            s3_client = session.client(
+                service_name='s3',
+                endpoint_url=config.get('aws_endpoint_url'),
+                aws_access_key_id=config.get('aws_access_key_id'),
+                aws_secret_access_key=config.get('aws_secret_access_key'),
+                config=BotoConfig(max_pool_connections=S3_MAX_POOL_CONNECTIONS),
+            )
+            _S3_CLIENTS[config_path] = s3_client
+
+    return s3_client
+
+def get_artifact_cache(config: dict, config_path: str = MODEL_CONFIG) -> S3ArtifactCache:
+    """On-disk cache of s3 artifacts for predictor config"""
+
+    cache_dir = config.get("artifact_cache_dir")
+
+    return S3ArtifactCache(
+        get_s3_client(config_path),
+        cache_dir=BASE_DIR.parent.parent / Path(cache_dir) if cache_dir else DEFAULT_CACHE_DIR,
+        max_workers=int(config.get("artifact_download_workers", DEFAULT_MAX_WORKERS)),
     )
 
-    # get raw bytes: 
-    enc_txt = reader.get_boto3_obj(path)
-    # load txt from bytes: 
-    enc_txt = enc_txt['Body'].read().decode('utf-8').splitlines()
+def s3_object_key(config: dict, path: str) -> str:
+    """Object key of path, which may start with the bucket name"""
 
-    return enc_txt
+    bucket_name = config.get("bucket_name")
+    if bucket_name and bucket_name in path: 
+        path = path.replace(f"{bucket_name}/", "")
+
+    return path
+
+def fetch_s3_artifact(config: dict, path: str, config_path: str = MODEL_CONFIG) -> Path:
+    """Local copy of s3 object (path without bucket) from the artifact cache"""
+
+    return get_artifact_cache(config, config_path).fetch(config.get("bucket_name"), s3_object_key(config, path))
+
+def prefetch_s3_artifacts(config: dict, paths: List[str], optional: List[str] = (),
+                          config_path: str = MODEL_CONFIG) -> Dict[str, float]:
+    """
+    Download all s3 artifacts of a predictor into the artifact cache at once,
+    so the loaders that follow read them from disk.
+    Missing optional artifacts are skipped. Returns fetch time of each artifact, s.
+    """
+
+    cache = get_artifact_cache(config, config_path)
+    bucket_name = config.get("bucket_name")
+
+    def fetch(path: str) -> float:
+        start = time.perf_counter()
+        try:
+            cache.prefetch(bucket_name, s3_object_key(config, path))
+        except ClientError as e:
+            if path not in optional:
+                raise
+            logger.info("Optional artifact s3://%s/%s skipped: %s", bucket_name, path, e)
+        return time.perf_counter() - start
+
+    paths = list(dict.fromkeys(list(paths) + list(optional)))
+    with ThreadPoolExecutor(max_workers=min(cache.max_workers, max(1, len(paths)))) as pool:
+        timings = dict(zip(paths, pool.map(fetch, paths)))
+
+    return timings
 
 class Boto3Base: 
     """Base class for boto3 client handling S3 interactions"""
 
     def __init__(self, config_path='src/config_s3.json'):
-        self.config: dict = load_config(config_path)
+        self.config_path = config_path
+        self._config: dict = load_config(config_path)
+
+    @property
+    def config(self) -> dict:
+        """Loaded config, the client itself is shared per config_path (see get_s3_client)"""
+
+        return self._config
     
     def get_client(self):
         
-        endpoint_url = self.config.get('aws_endpoint_url')
-        access_key, secret_key = self.config.get('aws_access_key_id'), \
-                                self.config.get('aws_secret_access_key')
-        
-        session = boto3.session.Session()
-        s3_client = session.client(
-            service_name='s3',
-            endpoint_url=endpoint_url,
-            aws_access_key_id=access_key,
-            aws_secret_access_key=secret_key
-        )
+        s3_client = get_s3_client(self.config_path)
         self.s3_client = s3_client
 
         return s3_client
@@ -199,7 +265,10 @@ class Boto3Reader(Boto3Base):
         
         return self.s3_client.get_object(Bucket=self.bucket_name, Key=object_path)
     
-    def get_boto3_csv(self, object_path: str) -> pd.DataFrame: 
+    def get_boto3_csv(self, object_path: str) -> "pd.DataFrame": 
+        # pandas is needed here only, not imported with the service: 
+        import pandas as pd 
+
         obj = self.get_boto3_obj(object_path)['Body'].read()
         df = pd.read_csv(io.BytesIO(obj), encoding='utf8', index_col=0)
 
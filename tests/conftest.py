@@ -0,0 +1,66 @@
+import json
+import pickle
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "src"))
+
+DATA_DIR = Path(__file__).resolve().parent / "data"
+
+
+@pytest.fixture
+def preprocess_config(tmp_path) -> dict:
+    """LinearSVMPreprocessor config over a copy of tests/data/preprocess
+    (the built profanity index is written next to the data)"""
+
+    data_dir = tmp_path / "preprocess"
+    shutil.copytree(DATA_DIR / "preprocess", data_dir)
+    return {"storage_type": "local", "additional_data_path": str(data_dir)}
+
+
+@pytest.fixture(scope="session")
+def linear_predictor(tmp_path_factory) -> dict:
+    """Local LinearSVMModel predictor config: sklearn model and encoder
+    trained on tests/data/linear_corpus.tsv"""
+
+    pytest.importorskip("sklearn")
+    from scipy.sparse import hstack
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.svm import LinearSVC
+    from services.text_preprocessor import LinearSVMPreprocessorSI
+
+    root = tmp_path_factory.mktemp("linear")
+    shutil.copytree(DATA_DIR / "preprocess", root / "preprocess")
+    conf = {
+        "storage_type": "local",
+        "bucket_name": "",
+        "model_path": str(root / "model.pkl"),
+        "encoder_path": str(root / "encoder.pkl"),
+        "additional_data_path": str(root / "preprocess"),
+        "description": "toy linear",
+        "frozen_encodings": True,
+    }
+
+    lines = (DATA_DIR / "linear_corpus.tsv").read_text(encoding="utf-8").splitlines()
+    labels, texts = zip(*(line.split("\t", 1) for line in lines))
+    texts, num_features = LinearSVMPreprocessorSI(conf).preprocess_batch(list(texts))
+    encoder = TfidfVectorizer().fit(texts)
+    model = LinearSVC().fit(hstack([encoder.transform(texts), num_features], format="csr"),
+                            [int(label) for label in labels])
+
+    with open(conf["model_path"], "wb") as f:
+        pickle.dump(model, f)
+    with open(conf["encoder_path"], "wb") as f:
+        pickle.dump(encoder, f)
+    return conf
+
+
+def write_config(path: Path, predictors: list, **config) -> str:
+    """config.json with the passed predictors and top level keys"""
+
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(dict(config, predictors=predictors), f)
+    return str(path)
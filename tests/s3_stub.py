@@ -0,0 +1,115 @@
+"""
+In-memory stand-in for a boto3 s3 client: head_object, get_object (Range, IfMatch),
+list_objects_v2 with its paginator. Errors are raised as botocore raises them.
+"""
+
+import hashlib
+import io
+import threading
+import time
+from collections import Counter
+
+from botocore.exceptions import ClientError
+from botocore.response import StreamingBody
+
+
+def _error(code: str, status: int, operation: str) -> ClientError:
+    return ClientError({"Error": {"Code": code, "Message": code},
+                        "ResponseMetadata": {"HTTPStatusCode": status}}, operation)
+
+
+class _BrokenStream(io.BytesIO):
+    """Connection reset after `limit` bytes"""
+
+    def __init__(self, data: bytes, limit: int):
+        super().__init__(data)
+        self.limit = limit
+
+    def read(self, size=-1):
+        if self.tell() >= self.limit:
+            raise ConnectionError("Connection reset by peer")
+        size = self.limit - self.tell() if size is None or size < 0 else min(size, self.limit - self.tell())
+        return super().read(size)
+
+
+class StubS3:
+
+    def __init__(self, delay_s: float = 0.0):
+        """
+        :param delay_s: latency of every head_object / get_object call
+        """
+
+        self.objects = {}
+        self.calls = Counter()
+        self.requests = []
+        self.delay_s = delay_s
+        # key -> bytes sent before the connection breaks (once):
+        self.break_after = {}
+        self.ignore_range = False
+
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self.max_inflight = 0
+
+    def put_object(self, Bucket: str, Key: str, Body: bytes) -> None:
+        self.objects[(Bucket, Key)] = Body
+
+    @staticmethod
+    def etag(data: bytes) -> str:
+        return f'"{hashlib.md5(data).hexdigest()}"'
+
+    def _enter(self, operation: str, **request):
+        with self._lock:
+            self.calls[operation] += 1
+            self.requests.append((operation, request))
+            self._inflight += 1
+            self.max_inflight = max(self.max_inflight, self._inflight)
+        time.sleep(self.delay_s)
+        with self._lock:
+            self._inflight -= 1
+
+    def _object(self, bucket: str, key: str, operation: str) -> bytes:
+        try:
+            return self.objects[(bucket, key)]
+        except KeyError:
+            raise _error("404" if operation == "HeadObject" else "NoSuchKey", 404, operation) from None
+
+    def head_object(self, Bucket: str, Key: str) -> dict:
+        self._enter("HeadObject", Bucket=Bucket, Key=Key)
+        data = self._object(Bucket, Key, "HeadObject")
+        return {"ETag": self.etag(data), "ContentLength": len(data)}
+
+    def get_object(self, Bucket: str, Key: str, IfMatch: str = None, Range: str = None) -> dict:
+        self._enter("GetObject", Bucket=Bucket, Key=Key, IfMatch=IfMatch, Range=Range)
+        data = self._object(Bucket, Key, "GetObject")
+        if IfMatch is not None and IfMatch != self.etag(data):
+            raise _error("PreconditionFailed", 412, "GetObject")
+
+        response = {"ETag": self.etag(data)}
+        if Range and not self.ignore_range:
+            start = int(Range[len("bytes="):].split("-")[0])
+            response["ContentRange"] = f"bytes {start}-{len(data) - 1}/{len(data)}"
+            data = data[start:]
+
+        limit = self.break_after.pop(Key, None)
+        stream = io.BytesIO(data) if limit is None else _BrokenStream(data, limit)
+        response["Body"] = StreamingBody(stream, len(data))
+        response["ContentLength"] = len(data)
+        return response
+
+    def list_objects_v2(self, Bucket: str, Prefix: str = "") -> dict:
+        self._enter("ListObjectsV2", Bucket=Bucket, Prefix=Prefix)
+        contents = [{"Key": key, "ETag": self.etag(data), "Size": len(data)}
+                    for (bucket, key), data in sorted(self.objects.items())
+                    if bucket == Bucket and key.startswith(Prefix)]
+        return {"Contents": contents, "KeyCount": len(contents)}
+
+    def get_paginator(self, operation: str):
+        assert operation == "list_objects_v2"
+        stub = self
+
+        class Paginator:
+            def paginate(self, **kwargs):
+                yield stub.list_objects_v2(**kwargs)
+
+        return Paginator()
@@ -0,0 +1,73 @@
+"""
+Stub predictors for registry and worker tests, importable in spawned worker processes.
+"""
+
+import threading
+import time
+
+from services import model_registry, model_workers
+
+
+STUB_TYPES = {
+    "sleepy": "stub_models:SleepyModel",
+    "gated": "stub_models:GatedModel",
+    "broken": "stub_models:BrokenModel",
+}
+
+# GatedModel.warmup waits for it (in-process predictors only):
+WARMUP_GATE = threading.Event()
+
+
+class SleepyModel:
+    """Answers "non_toxic" at once, sleeps for texts like "sleep 2.5", fails on "fail" """
+
+    def __init__(self, config_path=None, worker_id=0):
+        self.worker_id = worker_id
+        self.model_id = f"sleepy_{worker_id}"
+        self.artifact_version = "stub"
+
+    def predict_log_prometheus(self, text: str):
+        if text.startswith("sleep "):
+            time.sleep(float(text.split()[1]))
+        if text == "fail":
+            raise ValueError("failing text")
+        return (self.model_id, 0, "non_toxic", 0.0)
+
+    def warmup(self, texts) -> None:
+        for text in texts:
+            self.predict_log_prometheus(text)
+
+    def canonical_text(self, text: str) -> str:
+        return text
+
+    def close(self) -> None:
+        pass
+
+
+class GatedModel(SleepyModel):
+    """Stays in warmup until WARMUP_GATE is set"""
+
+    def warmup(self, texts) -> None:
+        WARMUP_GATE.wait(timeout=60)
+
+
+class BrokenModel(SleepyModel):
+    """Fails to load"""
+
+    def __init__(self, config_path=None, worker_id=0):
+        raise RuntimeError("broken predictor")
+
+
+def register_stub_types(monkeypatch) -> None:
+    """Stub model types for ModelRegistry and WorkerModel replicas of this test"""
+
+    for model_type, target in STUB_TYPES.items():
+        monkeypatch.setitem(model_registry.PREDICTOR_TYPES, model_type, target)
+    monkeypatch.setattr(model_workers, "_worker_main", stub_worker_main)
+
+
+def stub_worker_main(conn, model_type: str, config_path: str, worker_id: int) -> None:
+    """model_workers._worker_main with the stub types registered in the worker process"""
+
+    model_registry.PREDICTOR_TYPES.update(STUB_TYPES)
+    model_workers._worker_main(conn, model_type, config_path, worker_id)
@@ -0,0 +1,85 @@
+"""
+/ready and /forward while predictors load in background, with a predictor that fails to load.
+"""
+
+import time
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+import database
+import main
+from auth.dependencies import get_current_user
+from conftest import write_config
+from services.model_registry import ModelRegistry
+from services.registry_reloader import RegistryReloader
+from stub_models import WARMUP_GATE, register_stub_types
+
+
+class User:
+    id = 1
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    register_stub_types(monkeypatch)
+    WARMUP_GATE.clear()
+
+    config_path = write_config(tmp_path / "config.json", [
+        {"model_type": "gated", "description": "gated"},
+        {"model_type": "broken", "description": "broken"},
+    ])
+    monkeypatch.setattr(main, "ModelRegistry", lambda background: ModelRegistry(config_path, background=background))
+    monkeypatch.setattr(main, "RegistryReloader", lambda state: RegistryReloader(state, config_path))
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/requests.db")
+    monkeypatch.setattr(database, "engine", engine)
+    monkeypatch.setattr(database, "AsyncSessionLocal", async_sessionmaker(engine, expire_on_commit=False))
+    monkeypatch.setitem(main.app.dependency_overrides, get_current_user, lambda: User())
+
+    with TestClient(main.app) as client:
+        yield client
+    WARMUP_GATE.set()
+
+
+def wait_ready(client, timeout_s: float = 30):
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        response = client.get("/ready")
+        if response.status_code == 200:
+            return response
+        time.sleep(0.02)
+    raise AssertionError(f"not ready: {response.json()}")
+
+
+def test_not_ready_until_warmed_up(client):
+    assert client.get("/health").status_code == 200
+
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json()["ready"] is False
+    assert response.json()["models"][0]["state"] in ("loading", "warming")
+
+    response = client.post("/forward", json={"text_raw": "привет"})
+    assert response.status_code == 503
+
+    WARMUP_GATE.set()
+    wait_ready(client)
+    assert client.post("/forward", json={"text_raw": "привет"}).status_code == 200
+
+
+def test_failed_predictor_is_reported(client):
+    WARMUP_GATE.set()
+    models = wait_ready(client).json()["models"]
+
+    assert [(model["model_id"], model["state"]) for model in models] == [("sleepy_0", "ready"), (None, "failed")]
+    assert "broken predictor" in models[1]["error"]
+
+    # the other predictor still serves:
+    response = client.post("/forward", json={"text_raw": "привет"})
+    assert response.status_code == 200
+    assert [(row["model_id"], row["prediction_label"]) for row in response.json()] == [("sleepy_0", "non_toxic")]
@@ -0,0 +1,198 @@
+"""
+S3ArtifactCache against the in-memory s3 stand-in.
+"""
+
+import multiprocessing
+import threading
+import time
+
+import pytest
+from botocore.exceptions import ClientError
+
+from s3_stub import StubS3
+from services import artifact_cache
+from services.artifact_cache import S3_ARTIFACT_CACHE_TOTAL, S3ArtifactCache, _FileLock
+
+
+BUCKET = "bucket"
+DATA = bytes(range(256)) * 40
+
+
+def cache_count(result: str) -> float:
+    return S3_ARTIFACT_CACHE_TOTAL.labels(result=result)._value.get()
+
+
+@pytest.fixture
+def s3():
+    stub = StubS3()
+    stub.put_object(Bucket=BUCKET, Key="models/v1/model.pkl", Body=DATA)
+    return stub
+
+
+@pytest.fixture
+def cache(s3, tmp_path):
+    return S3ArtifactCache(s3, cache_dir=tmp_path / "cache", chunk_size=1000)
+
+
+def test_download_then_hit(cache, s3):
+    misses, hits = cache_count("miss"), cache_count("hit")
+
+    path = cache.fetch(BUCKET, "models/v1/model.pkl")
+    assert path.read_bytes() == DATA
+    assert path.name == "model.pkl"
+    assert not list(path.parent.glob("*.part"))
+
+    # restart: new cache object on the same directory, HEAD only:
+    again = S3ArtifactCache(s3, cache_dir=cache.cache_dir).fetch(BUCKET, "models/v1/model.pkl")
+    assert again == path
+    assert s3.calls["GetObject"] == 1
+    assert s3.calls["HeadObject"] == 2
+    assert cache_count("miss") == misses + 1
+    assert cache_count("hit") == hits + 1
+
+
+def test_interrupted_download_is_resumed(cache, s3):
+    s3.break_after["models/v1/model.pkl"] = 3000
+    resumed = cache_count("resumed")
+
+    with pytest.raises(ConnectionError):
+        cache.fetch(BUCKET, "models/v1/model.pkl")
+    parts = list((cache.cache_dir / "objects").glob("*/*/model.pkl.part"))
+    assert len(parts) == 1 and parts[0].stat().st_size == 3000
+
+    path = cache.fetch(BUCKET, "models/v1/model.pkl")
+    assert path.read_bytes() == DATA
+    assert not parts[0].exists()
+
+    _, request = [r for r in s3.requests if r[0] == "GetObject"][-1]
+    assert request["Range"] == "bytes=3000-"
+    assert request["IfMatch"] == s3.etag(DATA)
+    assert cache_count("resumed") == resumed + 1
+
+
+def test_ignored_range_restarts_download(cache, s3):
+    s3.break_after["models/v1/model.pkl"] = 3000
+    with pytest.raises(ConnectionError):
+        cache.fetch(BUCKET, "models/v1/model.pkl")
+
+    s3.ignore_range = True
+    assert cache.fetch(BUCKET, "models/v1/model.pkl").read_bytes() == DATA
+
+
+def test_changed_etag_replaces_old_version(cache, s3):
+    old = cache.fetch(BUCKET, "models/v1/model.pkl")
+    s3.put_object(Bucket=BUCKET, Key="models/v2/model.pkl", Body=b"other key")
+    other = cache.fetch(BUCKET, "models/v2/model.pkl")
+
+    with open(old, "rb") as opened:
+        s3.put_object(Bucket=BUCKET, Key="models/v1/model.pkl", Body=b"new weights")
+        new = cache.fetch(BUCKET, "models/v1/model.pkl")
+
+        assert new != old
+        assert new.read_bytes() == b"new weights"
+        assert s3.calls["GetObject"] == 3
+        # the old version is deleted, a file opened before stays readable:
+        assert not old.parent.exists()
+        assert opened.read() == DATA
+
+    # only versions of the same key are removed:
+    assert other.read_bytes() == b"other key"
+    assert sorted(path.name for path in new.parent.parent.iterdir()) == sorted([".lock", new.parent.name])
+
+
+def test_object_replaced_during_download_is_not_mixed(cache, s3, monkeypatch):
+    """GET is conditional on the ETag of the HEAD, a newer object fails instead of being cached"""
+
+    stale_head = s3.head_object(Bucket=BUCKET, Key="models/v1/model.pkl")
+    s3.put_object(Bucket=BUCKET, Key="models/v1/model.pkl", Body=b"new weights")
+    monkeypatch.setattr(s3, "head_object", lambda **kwargs: stale_head)
+
+    with pytest.raises(ClientError) as error:
+        cache.fetch(BUCKET, "models/v1/model.pkl")
+
+    assert error.value.response["Error"]["Code"] == "PreconditionFailed"
+    assert not list((cache.cache_dir / "objects").glob("*/*/model.pkl"))
+
+
+def test_missing_object(cache):
+    with pytest.raises(ClientError):
+        cache.fetch(BUCKET, "models/v1/missing.pkl")
+
+
+def test_concurrent_fetches_download_once(s3, tmp_path):
+    s3.delay_s = 0.05
+    caches = [S3ArtifactCache(s3, cache_dir=tmp_path / "cache") for _ in range(8)]
+    paths = []
+
+    threads = [threading.Thread(target=lambda c=c: paths.append(c.fetch(BUCKET, "models/v1/model.pkl")))
+               for c in caches]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(paths)) == 1
+    assert paths[0].read_bytes() == DATA
+    assert s3.calls["GetObject"] == 1
+
+
+def _hold_lock(path, locked, release):
+    with _FileLock(path):
+        locked.set()
+        release.wait(10)
+
+
+@pytest.mark.skipif(artifact_cache.fcntl is None, reason="no fcntl")
+def test_file_lock_between_processes(tmp_path):
+    context = multiprocessing.get_context("spawn")
+    locked, release = context.Event(), context.Event()
+    holder = context.Process(target=_hold_lock, args=(tmp_path / ".lock", locked, release))
+    holder.start()
+    try:
+        assert locked.wait(60)
+
+        acquired = threading.Event()
+
+        def acquire():
+            with _FileLock(tmp_path / ".lock"):
+                acquired.set()
+
+        thread = threading.Thread(target=acquire)
+        thread.start()
+        time.sleep(0.2)
+        assert not acquired.is_set()
+
+        release.set()
+        thread.join(10)
+        assert acquired.is_set()
+    finally:
+        release.set()
+        holder.join(10)
+
+
+def test_fetch_dir(cache, s3):
+    for name in ("config.json", "vocab.txt"):
+        s3.put_object(Bucket=BUCKET, Key=f"models/bert/{name}", Body=name.encode())
+
+    model_dir = cache.fetch_dir(BUCKET, "models/bert/", ["config.json", "vocab.txt"])
+    assert sorted(p.name for p in model_dir.iterdir()) == ["config.json", "vocab.txt"]
+    assert (model_dir / "vocab.txt").read_bytes() == b"vocab.txt"
+    assert cache.fetch_dir(BUCKET, "models/bert", ["config.json", "vocab.txt"]) == model_dir
+
+    s3.put_object(Bucket=BUCKET, Key="models/bert/vocab.txt", Body=b"new vocab")
+    new_dir = cache.fetch_dir(BUCKET, "models/bert", ["config.json", "vocab.txt"])
+    assert new_dir != model_dir
+    assert (new_dir / "vocab.txt").read_bytes() == b"new vocab"
+    # the old directory keeps its link to the removed version:
+    assert (model_dir / "vocab.txt").read_bytes() == b"vocab.txt"
+
+
+def test_prefetch_skips_next_head(cache, s3):
+    path = cache.prefetch(BUCKET, "models/v1/model.pkl")
+
+    assert cache.fetch(BUCKET, "models/v1/model.pkl") == path
+    assert s3.calls["HeadObject"] == 1
+
+    # used once, later fetches check the ETag again:
+    cache.fetch(BUCKET, "models/v1/model.pkl")
+    assert s3.calls["HeadObject"] == 2
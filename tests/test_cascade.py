@@ -0,0 +1,103 @@
+"""
+Cascade config validation and escalation by the uncertainty band of a stage.
+"""
+
+import asyncio
+
+import pytest
+
+from conftest import write_config
+from services.model_registry import CASCADE_DECISIONS, CASCADE_ESCALATIONS, ModelRegistry
+
+
+TEXT = "Привет, как дела?"
+
+
+@pytest.mark.parametrize("cascade_conf", [None, {}, {"enabled": False, "stages": []}])
+def test_disabled(cascade_conf):
+    assert ModelRegistry._build_cascade(cascade_conf, 2) is None
+
+
+def test_valid_stages():
+    stages = ModelRegistry._build_cascade(
+        {"stages": [{"predictor": 1, "uncertainty_band": [-0.5, 0.5]}, {"predictor": 0}]}, 2)
+
+    # the last stage has no band, one is not required either:
+    assert stages == [(1, (-0.5, 0.5)), (0, None)]
+    assert ModelRegistry._build_cascade(
+        {"stages": [{"predictor": 0, "uncertainty_band": [0, 0]},
+                    {"predictor": 1, "uncertainty_band": [9, 1]}]}, 2) == [(0, (0.0, 0.0)), (1, None)]
+
+
+@pytest.mark.parametrize("stages", [
+    [{"predictor": 0}],
+    [{"predictor": 0, "uncertainty_band": [-1, 1]}, {"predictor": 2}],
+    [{"predictor": -1, "uncertainty_band": [-1, 1]}, {"predictor": 0}],
+    [{"predictor": 0}, {"predictor": 1}],
+    [{"predictor": 0, "uncertainty_band": [1]}, {"predictor": 1}],
+    [{"predictor": 0, "uncertainty_band": [1, -1]}, {"predictor": 1}],
+    [{"predictor": 0, "uncertainty_band": [-1, 1]}, {"predictor": 0}],
+])
+def test_invalid_stages(stages):
+    with pytest.raises(ValueError):
+        ModelRegistry._build_cascade({"stages": stages}, 2)
+
+
+@pytest.fixture
+def margin(tmp_path, linear_predictor) -> float:
+    """Decision margin of TEXT by the first stage model"""
+
+    registry = ModelRegistry(write_config(tmp_path / "single.json", [dict(linear_predictor, description="stage 0")]))
+    try:
+        [(_, margin)] = registry.models[0].predict_batch_margins([TEXT])
+    finally:
+        registry.close()
+    return margin
+
+
+def run_cascade(tmp_path, linear_predictor, band) -> list:
+    predictors = [dict(linear_predictor, description="stage 0"), dict(linear_predictor, description="stage 1")]
+    cascade = {"stages": [{"predictor": 0, "uncertainty_band": band}, {"predictor": 1}]}
+    registry = ModelRegistry(write_config(tmp_path / "cascade.json", predictors, cascade=cascade))
+    try:
+        return asyncio.run(registry.run_all(TEXT))
+    finally:
+        registry.close()
+
+
+def counts() -> tuple:
+    return (CASCADE_DECISIONS.labels(stage="0", model_id="stage 0")._value.get(),
+            CASCADE_ESCALATIONS.labels(stage="0", model_id="stage 0")._value.get(),
+            CASCADE_DECISIONS.labels(stage="1", model_id="stage 1")._value.get())
+
+
+@pytest.mark.parametrize("offsets", [(0, 1), (-1, 0), (0, 0)])
+def test_band_edges_escalate(tmp_path, linear_predictor, margin, offsets):
+    """low <= margin <= high escalates, band edges included"""
+
+    decided, escalated, decided_last = counts()
+    results = run_cascade(tmp_path, linear_predictor, [margin + offsets[0], margin + offsets[1]])
+
+    # (model_id, prediction_int, prediction_label, processing_time_ms, cascade_stage), last one decides:
+    assert [(result[0], result[4]) for result in results] == [("stage 0", 0), ("stage 1", 1)]
+    assert all(len(result) == 5 for result in results)
+    assert counts() == (decided, escalated + 1, decided_last + 1)
+
+
+@pytest.mark.parametrize("band", [lambda m: [m + 1e-9, m + 1], lambda m: [m - 1, m - 1e-9]])
+def test_outside_band_decides(tmp_path, linear_predictor, margin, band):
+    decided, escalated, decided_last = counts()
+    results = run_cascade(tmp_path, linear_predictor, band(margin))
+
+    assert [(result[0], result[4]) for result in results] == [("stage 0", 0)]
+    assert counts() == (decided + 1, escalated, decided_last)
+
+
+def test_parallel_mode_has_no_stage(tmp_path, linear_predictor):
+    registry = ModelRegistry(write_config(tmp_path / "parallel.json", [dict(linear_predictor, description="parallel")]))
+    try:
+        [result] = asyncio.run(registry.run_all(TEXT))
+    finally:
+        registry.close()
+
+    assert result[0] == "parallel" and result[4] is None
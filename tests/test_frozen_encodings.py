@@ -0,0 +1,64 @@
+"""
+Frozen encodings: unseen symbols map to OOV tokens and are only counted, never added.
+"""
+
+import copy
+
+import pytest
+
+from services.text_preprocessor import LinearSVMPreprocessor
+
+
+TEXTS = ["привет 🦜 🐙 ;-) ???", "🦜 дурак !!! 8-)", "ещё 🦀 🦑 🐍 ...", ";D"]
+
+
+def encodings(preprocessor) -> dict:
+    return {name: dict(getattr(preprocessor, name)) for name in ("enc_emoj", "enc_emot", "enc_prof", "enc_rep", "enc_sep")}
+
+
+def test_unseen_symbols_leave_encodings_unchanged(preprocess_config):
+    preprocessor = LinearSVMPreprocessor(dict(preprocess_config, frozen_encodings=True))
+    before = copy.deepcopy(encodings(preprocessor))
+
+    normalized = [preprocessor.normalizer.normalize(text) for text in TEXTS]
+    preprocessor.preprocess_batch(TEXTS)
+
+    assert encodings(preprocessor) == before
+    assert preprocessor.resources.encodings["emoji"] == before["enc_emoj"]
+    # one OOV id per kind, right after the loaded vocabulary:
+    assert "[EMJ_2]" in normalized[0] and "[EMT_2]" in normalized[0] and "[RPP_2]" in normalized[0]
+    assert "[EMJ_2]" in normalized[2]
+
+    with pytest.raises(TypeError):
+        preprocessor.enc_emoj["🦜"] = "[EMJ_9]"
+
+
+def test_non_frozen_adds_symbols(preprocess_config):
+    preprocessor = LinearSVMPreprocessor(preprocess_config)
+
+    # new symbols of a text are numbered in sorted order, as in map_emoji_emoticons:
+    assert preprocessor.normalizer.normalize("🦜 🐙") == "[EMJ_3] [EMJ_2]"
+    assert preprocessor.enc_emoj["🐙"] == "[EMJ_2]"
+    assert "🐙" not in preprocessor.resources.encodings["emoji"]
+
+
+def test_observed_symbols_are_counted_and_bounded(preprocess_config):
+    preprocessor = LinearSVMPreprocessor(dict(preprocess_config, frozen_encodings=True,
+                                              observed_symbols_max_size=2))
+    for text in TEXTS:
+        preprocessor.normalizer.normalize(text)
+
+    observed = preprocessor.export_observed_symbols()
+    # first two unseen emoji are kept, later new ones are dropped, known ones still counted:
+    assert observed["emoji"] == {"🦜": 2, "🐙": 1}
+    assert len(observed["emoticon"]) == 2
+    assert all(len(symbols) <= 2 for symbols in observed.values())
+
+
+def test_observation_disabled(preprocess_config):
+    preprocessor = LinearSVMPreprocessor(dict(preprocess_config, frozen_encodings=True,
+                                              observed_symbols_max_size=0))
+    for text in TEXTS:
+        preprocessor.normalizer.normalize(text)
+
+    assert all(not symbols for symbols in preprocessor.export_observed_symbols().values())
@@ -0,0 +1,88 @@
+"""
+LemmaCache bound, hit / miss counters and seeding from a word frequency file.
+"""
+
+from conftest import DATA_DIR
+from services.lemma_cache import LEMMA_CACHE_HITS, LEMMA_CACHE_MISSES, LemmaCache, parse_word_frequencies
+from services.text_preprocessor import LinearSVMPreprocessor
+
+
+def counts() -> tuple:
+    return LEMMA_CACHE_HITS._value.get(), LEMMA_CACHE_MISSES._value.get()
+
+
+def test_lru_bound():
+    cache = LemmaCache(maxsize=2)
+    cache.get("a", str.upper)
+    cache.get("b", str.upper)
+    cache.get("a", str.upper)  # b is least recently used now
+    cache.get("c", str.upper)
+
+    assert len(cache) == 2
+    assert cache.lookup("b") is None
+    assert cache.lookup("a") == "A"
+    assert cache.lookup("c") == "C"
+
+
+def test_hits_and_misses():
+    cache = LemmaCache(maxsize=10)
+    computed = []
+
+    def compute(word):
+        computed.append(word)
+        return word.upper()
+
+    hits, misses = counts()
+    assert [cache.get(word, compute) for word in ("a", "b", "a", "a")] == ["A", "B", "A", "A"]
+    assert computed == ["a", "b"]
+    assert counts() == (hits + 2, misses + 2)
+
+    # lookup never computes, a miss is not counted:
+    assert cache.lookup("z") is None
+    assert cache.lookup("b") == "B"
+    assert counts() == (hits + 3, misses + 2)
+
+
+def test_disabled():
+    cache = LemmaCache(maxsize=0)
+    hits, misses = counts()
+
+    assert cache.get("a", str.upper) == "A"
+    assert cache.get("a", str.upper) == "A"
+    assert len(cache) == 0
+    assert counts() == (hits, misses + 2)
+
+
+def test_parse_word_frequencies():
+    lines = ["дела 120", "", "Привет\t500", "как 300", "котики"]
+
+    assert parse_word_frequencies(lines) == ["привет", "как", "дела", "котики"]
+    assert parse_word_frequencies(lines, limit=2) == ["привет", "как"]
+    assert parse_word_frequencies(["б", "а", "в"]) == ["б", "а", "в"]
+
+
+def test_seed_keeps_most_frequent():
+    cache = LemmaCache(maxsize=2)
+    hits, misses = counts()
+
+    assert cache.seed(["привет", "как", "дела"], str.upper) == 2
+    assert counts() == (hits, misses)
+
+    # the least frequent seeded word is evicted first:
+    cache.put("новое", "НОВОЕ")
+    assert cache.lookup("как") is None
+    assert cache.lookup("привет") == "ПРИВЕТ"
+
+
+def test_preprocessor_seeds_from_file(preprocess_config):
+    preprocessor = LinearSVMPreprocessor(dict(
+        preprocess_config,
+        lemma_cache_size=3,
+        lemma_cache_seed_path=str(DATA_DIR / "preprocess" / "lemma_frequencies.txt"),
+    ))
+    cache = preprocessor.lemma_cache
+
+    assert len(cache) == 3
+    assert cache.lookup("привет") == "привет"
+    assert cache.lookup("дела") == "дело"
+    assert cache.lookup("котики") is None
@@ -0,0 +1,166 @@
+"""
+CompiledLinearScorer and the mapped artifact (save_mapped / MappedLinearScorer)
+against the sklearn pipeline (encoder.transform -> hstack -> model).
+"""
+
+import json
+
+import numpy as np
+import pytest
+
+pytest.importorskip("sklearn")
+
+from scipy.sparse import hstack
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.svm import LinearSVC
+
+from conftest import DATA_DIR
+from services import linear_scorer
+from services.linear_scorer import (MAPPED_FILES, MAPPED_META, CompiledLinearScorer, MappedLinearScorer,
+                                    save_mapped)
+from services.text_utils import get_num_features_batch, get_num_features_dense
+
+
+N_TRAIN = 24
+
+ENCODERS = {
+    "tfidf": lambda: TfidfVectorizer(),
+    "tfidf_bigrams_sublinear": lambda: TfidfVectorizer(ngram_range=(1, 2), sublinear_tf=True),
+    "tfidf_char_l1_float32": lambda: TfidfVectorizer(analyzer="char_wb", ngram_range=(2, 3),
+                                                     norm="l1", dtype=np.float32),
+    "count_binary": lambda: CountVectorizer(binary=True),
+}
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    lines = (DATA_DIR / "linear_corpus.tsv").read_text(encoding="utf-8").splitlines()
+    labels, texts = zip(*(line.split("\t", 1) for line in lines))
+    labels = np.array([int(label) for label in labels])
+
+    held_out = list(texts[N_TRAIN:]) + \
+        (DATA_DIR / "normalizer_corpus.txt").read_text(encoding="utf-8").splitlines() + ["", "!!!"]
+    return list(texts[:N_TRAIN]), labels[:N_TRAIN], held_out
+
+
+def assert_parity(scorer, model, inputs, num_features=None, texts=()):
+    rows = [scorer.transform(text, None if num_features is None else num_features[i])
+            for i, text in enumerate(texts)]
+
+    preds = np.array([scorer.predict(row) for row in rows])
+    scores = np.array([scorer.decision_function(row) for row in rows]).reshape(len(texts), -1)
+
+    np.testing.assert_array_equal(preds, model.predict(inputs))
+    np.testing.assert_allclose(scores, np.asarray(model.decision_function(inputs)).reshape(len(texts), -1),
+                               rtol=1e-6, atol=1e-6)
+
+
+@pytest.mark.parametrize("encoder_name", ENCODERS)
+def test_matches_sklearn(encoder_name, corpus):
+    train, labels, held_out = corpus
+    encoder = ENCODERS[encoder_name]().fit(train)
+    model = LinearSVC().fit(encoder.transform(train), labels)
+
+    assert_parity(CompiledLinearScorer(encoder, model), model, encoder.transform(held_out), texts=held_out)
+
+
+def test_matches_sklearn_with_num_features(corpus):
+    train, labels, held_out = corpus
+    encoder = TfidfVectorizer().fit(train)
+    model = LinearSVC().fit(hstack([encoder.transform(train), get_num_features_batch(train)], format="csr"), labels)
+
+    inputs = hstack([encoder.transform(held_out), get_num_features_batch(held_out)], format="csr")
+    scorer = CompiledLinearScorer(encoder, model)
+
+    assert scorer.n_num > 0
+    assert_parity(scorer, model, inputs, get_num_features_dense(held_out), texts=held_out)
+
+    with pytest.raises(ValueError):
+        scorer.transform(held_out[0])
+
+
+def test_matches_sklearn_multiclass(corpus):
+    train, labels, held_out = corpus
+    labels = labels * 2 + np.array([len(text) % 2 for text in train])
+    encoder = TfidfVectorizer().fit(train)
+    model = LogisticRegression().fit(encoder.transform(train), labels)
+
+    assert len(model.classes_) > 2
+    assert_parity(CompiledLinearScorer(encoder, model), model, encoder.transform(held_out), texts=held_out)
+
+
+def test_rejects_unsupported_model(corpus):
+    train, labels, _ = corpus
+    encoder = TfidfVectorizer().fit(train)
+
+    with pytest.raises(ValueError):
+        CompiledLinearScorer(encoder, object())
+
+
+@pytest.mark.parametrize("encoder_name", ENCODERS)
+def test_mapped_round_trip(encoder_name, corpus, tmp_path):
+    train, labels, held_out = corpus
+    encoder = ENCODERS[encoder_name]().fit(train)
+    model = LinearSVC().fit(encoder.transform(train), labels)
+
+    scorer = MappedLinearScorer(save_mapped(encoder, model, tmp_path / "linear.mmap"))
+
+    assert sorted(path.name for path in (tmp_path / "linear.mmap").iterdir()) == sorted(MAPPED_FILES)
+    assert isinstance(scorer.coef, np.memmap) and isinstance(scorer.tokens, np.memmap)
+    assert scorer.n_vocab == len(encoder.vocabulary_)
+    # every vocabulary token is found at its own feature index:
+    for token, j in list(encoder.vocabulary_.items())[:200]:
+        np.testing.assert_array_equal(scorer._term_counts([token, token])[0], [j])
+    assert_parity(scorer, model, encoder.transform(held_out), texts=held_out)
+
+
+def test_mapped_multiclass_with_num_features(corpus, tmp_path):
+    train, labels, held_out = corpus
+    labels = labels * 2 + np.array([len(text) % 2 for text in train])
+    encoder = TfidfVectorizer(ngram_range=(1, 2)).fit(train)
+    model = LogisticRegression().fit(hstack([encoder.transform(train), get_num_features_batch(train)], format="csr"),
+                                     labels)
+
+    scorer = MappedLinearScorer(save_mapped(encoder, model, tmp_path / "linear.mmap"))
+    inputs = hstack([encoder.transform(held_out), get_num_features_batch(held_out)], format="csr")
+
+    assert len(scorer.classes) > 2 and scorer.n_num > 0
+    assert_parity(scorer, model, inputs, get_num_features_dense(held_out), texts=held_out)
+
+
+def test_mapped_oov_and_empty(corpus, tmp_path):
+    train, labels, _ = corpus
+    encoder = TfidfVectorizer().fit(train)
+    model = LinearSVC().fit(encoder.transform(train), labels)
+    scorer = MappedLinearScorer(save_mapped(encoder, model, tmp_path / "linear.mmap"))
+
+    # unknown words (also longer than any vocabulary token, multi-byte) and empty texts score the intercept:
+    texts = ["", "   ", "!!!", "кракозябра" * 20, "😀 zzzzzz"]
+    for text in texts:
+        indices, _ = scorer.transform(text)
+        assert len(indices) == 0
+    assert_parity(scorer, model, encoder.transform(texts), texts=texts)
+
+
+def test_mapped_hash_collisions(corpus, tmp_path, monkeypatch):
+    """Tokens with equal hashes are told apart by their bytes"""
+
+    train, labels, held_out = corpus
+    encoder = TfidfVectorizer().fit(train)
+    model = LinearSVC().fit(encoder.transform(train), labels)
+    monkeypatch.setattr(linear_scorer, "_token_hash", lambda token: len(token) % 3)
+
+    scorer = MappedLinearScorer(save_mapped(encoder, model, tmp_path / "linear.mmap"))
+    assert_parity(scorer, model, encoder.transform(held_out), texts=held_out)
+
+
+def test_mapped_rejects_other_format(corpus, tmp_path):
+    train, labels, _ = corpus
+    encoder = TfidfVectorizer().fit(train)
+    out_dir = save_mapped(encoder, LinearSVC().fit(encoder.transform(train), labels), tmp_path / "linear.mmap")
+
+    meta = json.loads((out_dir / MAPPED_META).read_text(encoding="utf-8"))
+    (out_dir / MAPPED_META).write_text(json.dumps(dict(meta, format_version=1)), encoding="utf-8")
+    with pytest.raises(ValueError):
+        MappedLinearScorer(out_dir)
@@ -0,0 +1,86 @@
+"""
+MicroBatcher flushes by size and by window, errors reach only the callers of failing texts.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from services.micro_batcher import MicroBatcher
+
+
+class FakeModel:
+    """Upper-cases texts, fails every batch that contains "bad" """
+
+    model_id = "fake batched"
+
+    def __init__(self):
+        self.batches = []
+        self._lock = threading.Lock()
+
+    def predict_batch(self, texts, observe_latency=True):
+        with self._lock:
+            self.batches.append(list(texts))
+        if "bad" in texts:
+            raise ValueError("bad text")
+        return [text.upper() for text in texts]
+
+
+@pytest.fixture
+def executor():
+    executor = ThreadPoolExecutor(max_workers=2)
+    yield executor
+    executor.shutdown()
+
+
+def run(batcher, texts):
+    async def scenario():
+        return await asyncio.gather(*(batcher.submit(text) for text in texts), return_exceptions=True)
+
+    return asyncio.run(scenario())
+
+
+def test_flush_on_max_batch_size(executor):
+    model = FakeModel()
+    # the window is never reached, full batches are sent at once:
+    batcher = MicroBatcher(model, executor, window_ms=60_000, max_batch_size=2)
+
+    start = time.perf_counter()
+    assert run(batcher, ["a", "b", "c", "d"]) == ["A", "B", "C", "D"]
+    assert time.perf_counter() - start < 5
+    assert model.batches == [["a", "b"], ["c", "d"]]
+
+
+def test_flush_on_window(executor):
+    model = FakeModel()
+    batcher = MicroBatcher(model, executor, window_ms=100, max_batch_size=32)
+
+    start = time.perf_counter()
+    assert run(batcher, ["a", "b", "c"]) == ["A", "B", "C"]
+    assert time.perf_counter() - start >= 0.09
+    assert model.batches == [["a", "b", "c"]]
+
+
+def test_error_fails_only_its_text(executor):
+    model = FakeModel()
+    batcher = MicroBatcher(model, executor, window_ms=50, max_batch_size=32)
+
+    results = run(batcher, ["a", "bad", "c"])
+    assert results[0] == "A" and results[2] == "C"
+    assert isinstance(results[1], ValueError)
+
+    # failed batch, then every text on its own:
+    assert model.batches[0] == ["a", "bad", "c"]
+    assert sorted(model.batches[1:]) == [["a"], ["bad"], ["c"]]
+
+
+def test_single_text_error(executor):
+    model = FakeModel()
+    batcher = MicroBatcher(model, executor, window_ms=10, max_batch_size=32)
+
+    results = run(batcher, ["bad"])
+    assert isinstance(results[0], ValueError)
+    assert model.batches == [["bad"]]
@@ -0,0 +1,48 @@
+"""
+WorkerModel: a hung call restarts only its replica and reaches the caller as TimeoutError.
+"""
+
+import pytest
+
+from services.model_workers import MODEL_WORKER_RESTARTS, WorkerCrashed, WorkerModel
+from stub_models import register_stub_types
+
+
+@pytest.fixture
+def workers(monkeypatch):
+    register_stub_types(monkeypatch)
+    model = WorkerModel("sleepy", config_path="", worker_id=0, replicas=2,
+                        start_timeout_s=60, request_timeout_s=0.5, health_interval_s=600)
+    yield model
+    model.close()
+
+
+def pids(model) -> list:
+    return [replica.process.pid for replica in model._replicas]
+
+
+def test_timeout_restarts_one_replica(workers):
+    before = pids(workers)
+    restarts = MODEL_WORKER_RESTARTS.labels(model_id=workers.model_id)._value.get()
+
+    with pytest.raises(TimeoutError) as error:
+        workers.predict_log_prometheus("sleep 2")
+    assert not isinstance(error.value, WorkerCrashed)
+
+    after = pids(workers)
+    assert sum(old != new for old, new in zip(before, after)) == 1
+    assert MODEL_WORKER_RESTARTS.labels(model_id=workers.model_id)._value.get() == restarts + 1
+    assert workers.health() == {"replicas": 2, "alive": 2}
+
+    # the restarted replica does not hand out the late reply:
+    assert [workers.predict_log_prometheus("привет")[1:3] for _ in range(4)] == [(0, "non_toxic")] * 4
+
+
+def test_crash_is_retried_on_a_new_process(workers):
+    replica = workers._replicas[0]
+    replica.process.kill()
+    replica.process.join()
+
+    # a dead replica is restarted and the call retried once: 
+    assert [workers.predict_log_prometheus("привет")[2] for _ in range(2)] == ["non_toxic"] * 2
+    assert workers.health()["alive"] == 2
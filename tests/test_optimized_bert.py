@@ -0,0 +1,88 @@
+"""
+OptimizedBertModel exports of a tiny randomly initialized BERT against the eager model.
+"""
+
+import json
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+
+from services.bert_model import BertClassifierModel, OptimizedBertModel
+
+
+TEXTS = [
+    "привет мир",
+    "ты дурак",
+    "hello world!",
+    "блин, ну что это такое?",
+    "",
+    "очень длинный текст " * 20,
+]
+
+VOCAB = (["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"]
+         + list("абвгдеёжзийклмнопрстуфхцчшщъыьэюяabcdefghijklmnopqrstuvwxyz0123456789.,!?:;()")
+         + ["##" + c for c in "абвгдеёжзийклмнопрстуфхцчшщъыьэюяabcdefghijklmnopqrstuvwxyz"]
+         + ["привет", "дурак", "блин", "мир", "hello", "world"])
+
+
+@pytest.fixture(scope="module")
+def bert_dir(tmp_path_factory):
+    model_dir = tmp_path_factory.mktemp("tiny_bert")
+    (model_dir / "vocab.txt").write_text("\n".join(VOCAB), encoding="utf-8")
+
+    torch.manual_seed(0)
+    config = transformers.BertConfig(vocab_size=len(VOCAB), hidden_size=32, num_hidden_layers=2,
+                                     num_attention_heads=2, intermediate_size=64,
+                                     max_position_embeddings=128, num_labels=2)
+    transformers.BertForSequenceClassification(config).eval().save_pretrained(str(model_dir))
+    transformers.BertTokenizer(str(model_dir / "vocab.txt"), do_lower_case=True).save_pretrained(str(model_dir))
+
+    return model_dir
+
+
+def write_config(path, predictor: dict) -> str:
+    config = {"aws_endpoint_url": "", "aws_access_key_id": "", "aws_secret_access_key": "",
+              "predictors": [predictor]}
+    path.write_text(json.dumps(config), encoding="utf-8")
+    return str(path)
+
+
+@pytest.fixture(scope="module")
+def eager(bert_dir, tmp_path_factory):
+    config_path = write_config(tmp_path_factory.mktemp("eager") / "config.json", {
+        "model_type": "bert", "storage_type": "local", "model_path": str(bert_dir), "max_len": 64,
+    })
+    model = BertClassifierModel(config_path, worker_id=0)
+    return model.predict_margins_batch(model.preprocess_batch(TEXTS))
+
+
+@pytest.mark.parametrize("runtime", OptimizedBertModel.RUNTIMES)
+def test_export_matches_eager(runtime, bert_dir, eager, tmp_path):
+    if runtime == "onnx":
+        pytest.importorskip("onnxruntime")
+        pytest.importorskip("onnx")
+
+    parity_path = tmp_path / "parity.txt"
+    parity_path.write_text("\n".join(text for text in TEXTS if text), encoding="utf-8")
+    config_path = write_config(tmp_path / "config.json", {
+        "model_type": "bert_optimized", "storage_type": "local", "model_path": str(bert_dir),
+        "max_len": 64, "runtime": runtime, "export_cache_dir": str(tmp_path / "exports"),
+        "parity_check_path": str(parity_path), "parity_min_agreement": 1.0,
+    })
+
+    model = OptimizedBertModel(config_path, worker_id=0)
+    preds, margins = model.predict_margins_batch(model.preprocess_batch(TEXTS))
+
+    assert model.parity_agreement == 1.0
+    assert preds == eager[0]
+    np.testing.assert_allclose(margins, eager[1], atol=1e-4)
+    assert [model.predict(model.preprocess(text)) for text in TEXTS] == preds
+
+    # second load takes the cached export:
+    exports = sorted((tmp_path / "exports").iterdir())
+    assert len(exports) == 1
+    OptimizedBertModel(config_path, worker_id=0)
+    assert sorted((tmp_path / "exports").iterdir()) == exports
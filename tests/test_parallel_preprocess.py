@@ -0,0 +1,44 @@
+"""
+Pooled preprocess_batch against the serial path, observed symbols counted by the workers.
+"""
+
+from services.text_preprocessor import LinearSVMPreprocessor
+from services.text_normalizer import TextNormalizer
+
+
+TEXTS = ["привет 🦜 🐙 ;-) ???", "🦜 дурак !!! 8-)", "ещё 🦀 🦑 🐍 ...", ";D",
+         "Как дела, сволочь?!", "😀 👍 :) ;)", "котики 123 😀😀", ""]
+
+
+def test_pooled_matches_serial(preprocess_config):
+    config = dict(preprocess_config, frozen_encodings=True)
+    serial = LinearSVMPreprocessor(config)
+    pooled = LinearSVMPreprocessor(dict(config, preprocess_workers=2, preprocess_parallel_min_batch=2))
+    try:
+        expected_texts, expected_features = serial.preprocess_batch(TEXTS)
+        texts, features = pooled.preprocess_batch(TEXTS)
+        assert pooled._pool is not None
+
+        assert texts == expected_texts
+        assert (features != expected_features).nnz == 0
+
+        # the parent counts what the workers met, as the serial path does:
+        assert pooled.export_observed_symbols() == serial.export_observed_symbols()
+        assert pooled.export_observed_symbols()["emoji"]["🦜"] == 2
+
+        # worker counts are taken once, a second batch adds the same amount again:
+        pooled.preprocess_batch(TEXTS)
+        assert pooled.export_observed_symbols()["emoji"]["🦜"] == 4
+    finally:
+        pooled.close()
+
+
+def test_merge_observed_is_bounded():
+    encodings = {kind: {} for kind in ("emoji", "emoticon", "rep_punct", "sep_punct", "profanity")}
+    normalizer = TextNormalizer(None, [], encodings, {}, frozen=True, observed_max_size=2)
+    normalizer.merge_observed({"emoji": {"🦜": 3, "🐙": 1, "🦀": 5}})
+    normalizer.merge_observed({"emoji": {"🦀": 1, "🦜": 1}})
+
+    assert normalizer.export_observed()["emoji"] == {"🦜": 4, "🐙": 1}
+    assert normalizer.take_observed() == {"emoji": {"🦜": 4, "🐙": 1}}
+    assert normalizer.take_observed() == {}
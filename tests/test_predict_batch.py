@@ -0,0 +1,90 @@
+"""
+Model.predict_batch against per text predict, batch and per request duration metrics.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from conftest import DATA_DIR, write_config
+from services.micro_batcher import MicroBatcher
+from services.model import MODEL_BATCH_INFERENCE_DURATION, MODEL_INFERENCE_DURATION, MODEL_INFERENCE_TOTAL
+
+
+def observations(histogram, model_id: str) -> float:
+    for family in histogram.collect():
+        for sample in family.samples:
+            if sample.name.endswith("_count") and sample.labels["model_id"] == model_id:
+                return sample.value
+    return 0.0
+
+
+def totals(model_id: str) -> float:
+    return sum(MODEL_INFERENCE_TOTAL.labels(model_id=model_id, prediction_label=label)._value.get()
+               for label in ("toxic", "non_toxic"))
+
+
+@pytest.fixture(scope="module")
+def texts() -> list:
+    return (DATA_DIR / "normalizer_corpus.txt").read_text(encoding="utf-8").splitlines()[:20] + ["", "!!!"]
+
+
+@pytest.fixture
+def model(tmp_path, linear_predictor):
+    from services.model import LinearSVMModel
+
+    conf = dict(linear_predictor, description="batched linear")
+    model = LinearSVMModel(config_path=write_config(tmp_path / "config.json", [conf]))
+    yield model
+    model.close()
+
+
+def test_matches_per_text_predict(model, texts):
+    expected = [model.predict_log_prometheus(text) for text in texts]
+    results = model.predict_batch(texts)
+
+    assert [result[:3] for result in results] == [result[:3] for result in expected]
+    assert [result[:3] for result, _ in model.predict_batch_margins(texts)] == [result[:3] for result in expected]
+    assert [int(model.predict(model.preprocess(text))) for text in texts] == [result[1] for result in results]
+
+    # every text waited for the whole batch:
+    assert len({result[3] for result in results}) == 1
+    assert model.predict_batch([]) == []
+
+
+def test_batch_and_request_durations(model, texts):
+    model_id = model.model_id
+    batches = observations(MODEL_BATCH_INFERENCE_DURATION, model_id)
+    requests = observations(MODEL_INFERENCE_DURATION, model_id)
+    total = totals(model_id)
+
+    model.predict_batch(texts)
+    assert observations(MODEL_BATCH_INFERENCE_DURATION, model_id) == batches + 1
+    assert observations(MODEL_INFERENCE_DURATION, model_id) == requests + len(texts)
+    assert totals(model_id) == total + len(texts)
+
+    # the micro-batcher observes request latency itself:
+    model.predict_batch_margins(texts, observe_latency=False)
+    assert observations(MODEL_BATCH_INFERENCE_DURATION, model_id) == batches + 2
+    assert observations(MODEL_INFERENCE_DURATION, model_id) == requests + len(texts)
+    assert totals(model_id) == total + 2 * len(texts)
+
+
+def test_micro_batcher_observes_request_latency(model, texts):
+    model_id = model.model_id
+    requests = observations(MODEL_INFERENCE_DURATION, model_id)
+    executor = ThreadPoolExecutor(max_workers=1)
+
+    async def scenario():
+        batcher = MicroBatcher(model, executor, window_ms=50, max_batch_size=len(texts))
+        return await asyncio.gather(*(batcher.submit(text) for text in texts))
+
+    try:
+        results = asyncio.run(scenario())
+    finally:
+        executor.shutdown()
+
+    # one observation per request, none from the model:
+    assert observations(MODEL_INFERENCE_DURATION, model_id) == requests + len(texts)
+    assert [result[:3] for result in results] == [result[:3] for result in model.predict_batch(texts)]
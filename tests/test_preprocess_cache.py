@@ -0,0 +1,123 @@
+"""
+LRUCache bounds and the preprocessing cache of LinearSVMModel.
+"""
+
+import numpy as np
+import pytest
+
+from conftest import write_config
+from services import cache as cache_module
+from services.cache import LRUCache, text_digest
+from services.model import PREPROCESS_CACHE_BYTES, PREPROCESS_CACHE_HITS, PREPROCESS_CACHE_MISSES
+
+
+TEXTS = ["Привет, как дела?", "ты дурак!!! 😀", "Привет,   как дела?", "котики"]
+
+
+def test_text_digest_separates_parts():
+    assert text_digest("ab", "c") != text_digest("a", "bc")
+    assert text_digest("a", "b") == text_digest("a", "b")
+
+
+def test_lru_cache_max_items():
+    cache = LRUCache(max_items=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")  # b is least recently used now
+    cache.put("c", 3)
+
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+
+
+def test_lru_cache_max_bytes():
+    # size of an entry is sizeof(value) + len(key):
+    cache = LRUCache(max_bytes=10, sizeof=len)
+    cache.put("a", "xxxx")
+    cache.put("b", "yyyy")
+    assert cache.bytes_used == 10
+
+    cache.put("c", "z")
+    assert cache.get("a") is None
+    assert cache.bytes_used == 7
+
+    # replaced value is not counted twice:
+    cache.put("b", "y")
+    assert cache.bytes_used == 4
+
+    # a value over the whole bound is not stored and evicts nothing:
+    cache.put("d", "w" * 10)
+    assert cache.get("d") is None
+    assert len(cache) == 2
+
+    cache.clear()
+    assert (len(cache), cache.bytes_used) == (0, 0)
+
+
+def test_lru_cache_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    cache = LRUCache(max_bytes=100, ttl_seconds=5, sizeof=len)
+    cache.put("a", "xx")
+
+    now[0] += 4
+    assert cache.get("a") == "xx"
+
+    # reading does not extend the entry's lifetime:
+    now[0] += 2
+    assert cache.get("a") is None
+    assert (len(cache), cache.bytes_used) == (0, 0)
+
+
+def counts(model_id: str) -> tuple:
+    return (PREPROCESS_CACHE_HITS.labels(model_id=model_id)._value.get(),
+            PREPROCESS_CACHE_MISSES.labels(model_id=model_id)._value.get())
+
+
+@pytest.fixture
+def cached_model(tmp_path, linear_predictor):
+    from services.model import LinearSVMModel
+
+    conf = dict(linear_predictor, description="cached linear", preprocess_cache_max_bytes=1_000_000)
+    model = LinearSVMModel(config_path=write_config(tmp_path / "config.json", [conf]))
+    yield model
+    model.close()
+
+
+def test_preprocess_cache_hits_and_misses(cached_model, linear_predictor, tmp_path):
+    from services.model import LinearSVMModel
+
+    uncached = LinearSVMModel(config_path=write_config(tmp_path / "plain.json", [linear_predictor]))
+    hits, misses = counts(cached_model.model_id)
+
+    first = cached_model.preprocess(TEXTS[0])
+    assert counts(cached_model.model_id) == (hits, misses + 1)
+
+    # same text and a text with the same canonical form are hits and the same object:
+    assert cached_model.preprocess(TEXTS[0]) is first
+    assert cached_model.canonical_text(TEXTS[2]) == cached_model.canonical_text(TEXTS[0])
+    assert cached_model.preprocess(TEXTS[2]) is first
+    assert counts(cached_model.model_id) == (hits + 2, misses + 1)
+    assert (first != uncached.preprocess(TEXTS[0])).nnz == 0
+
+    assert PREPROCESS_CACHE_BYTES.labels(model_id=cached_model.model_id)._value.get() \
+        == cached_model._preprocess_cache.bytes_used > 0
+
+
+def test_preprocess_batch_reuses_cached_rows(cached_model, linear_predictor, tmp_path):
+    from services.model import LinearSVMModel
+
+    uncached = LinearSVMModel(config_path=write_config(tmp_path / "plain.json", [linear_predictor]))
+    cached_model.preprocess(TEXTS[1])
+    hits, misses = counts(cached_model.model_id)
+
+    inputs = cached_model.preprocess_batch(TEXTS)
+    # TEXTS[1] was cached, TEXTS[2] is TEXTS[0] after canonicalization but both miss in one batch:
+    assert counts(cached_model.model_id) == (hits + 1, misses + 3)
+    assert (inputs != uncached.preprocess_batch(TEXTS)).nnz == 0
+    np.testing.assert_array_equal(cached_model.predict_inputs_batch(inputs),
+                                  uncached.predict_inputs_batch(uncached.preprocess_batch(TEXTS)))
+
+    cached_model.preprocess_batch(TEXTS)
+    assert counts(cached_model.model_id) == (hits + 5, misses + 3)
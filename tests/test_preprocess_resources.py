@@ -0,0 +1,52 @@
+"""
+Preprocessing data shared by predictors with the same additional_data_path version.
+"""
+
+import pytest
+
+from conftest import DATA_DIR, write_config
+from services.model_registry import ModelRegistry
+from services.text_preprocessor import LinearSVMPreprocessor
+
+
+@pytest.fixture
+def registry(tmp_path, linear_predictor):
+    seeded = dict(linear_predictor, lemma_cache_seed_path=str(DATA_DIR / "preprocess" / "lemma_frequencies.txt"))
+    registry = ModelRegistry(write_config(tmp_path / "config.json", [
+        dict(seeded, description="first"),
+        dict(seeded, description="second"),
+        dict(seeded, description="small lemma cache", lemma_cache_size=3),
+    ]))
+    yield registry
+    registry.close()
+
+
+def test_predictors_share_resources(registry):
+    first, second, small = (model.text_preprocessor for model in registry.models)
+
+    assert second.resources is first.resources
+    assert second.profanity_index is first.profanity_index
+    assert second.enc_emoj == first.enc_emoj
+    assert second.resources.encodings["emoji"] is first.resources.encodings["emoji"]
+    assert second.morph is first.morph
+
+    # same size and seed file, one cache seeded once:
+    assert second.lemma_cache is first.lemma_cache
+    assert second.normalizer.lemma_cache is first.lemma_cache
+    assert first.lemma_cache.lookup("котики") is not None
+
+    # other cache settings get their own cache:
+    assert small.resources is first.resources
+    assert small.lemma_cache is not first.lemma_cache
+    assert small.lemma_cache.maxsize == 3
+
+
+def test_changed_data_is_not_shared(preprocess_config, tmp_path):
+    preprocessor = LinearSVMPreprocessor(preprocess_config)
+    path = tmp_path / "preprocess" / "bad_words_lemmas.txt"
+    path.write_text(path.read_text(encoding="utf-8") + "идиот\n", encoding="utf-8")
+    changed = LinearSVMPreprocessor(preprocess_config)
+
+    assert changed.resources is not preprocessor.resources
+    assert changed.lemma_cache is not preprocessor.lemma_cache
+    assert "идиот" in changed.profanities and "идиот" not in preprocessor.profanities
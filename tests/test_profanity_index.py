@@ -0,0 +1,95 @@
+"""
+ProfanityIndex against the linear morph.parse scan of map_profanity, and its stored form.
+"""
+
+import json
+import re
+
+import pytest
+import pymorphy3 as pymorphy2
+
+from conftest import DATA_DIR
+from services.lemma_cache import LemmaCache
+from services.profanity_index import ProfanityIndex, index_version
+from services.text_normalizer import TextNormalizer
+from services.text_preprocessor import NONINFORMATIVE_MAPPING
+from services.text_utils import map_profanity
+
+
+@pytest.fixture(scope="module")
+def morph():
+    return pymorphy2.MorphAnalyzer()
+
+
+@pytest.fixture(scope="module")
+def profanities():
+    return (DATA_DIR / "profanities.txt").read_text(encoding="utf-8").split()
+
+
+@pytest.fixture(scope="module")
+def words(morph, profanities):
+    """Corpus words, every form of the profanities (also with е for ё) and a few unknown words"""
+
+    corpus = (DATA_DIR / "normalizer_corpus.txt").read_text(encoding="utf-8")
+    words = set(re.findall(r"[А-Яа-яЁё']+", corpus))
+    for lemma in profanities:
+        for parse in morph.parse(lemma):
+            words.update(form.word for form in parse.lexeme)
+    words.update(word.replace("ё", "е") for word in list(words))
+    words.update(["Дурак", "СВОЛОЧИ", "дуракк", "сволочуга", "кракозябра"])
+    return sorted(words)
+
+
+def make_normalizer(morph, profanities, index) -> TextNormalizer:
+    encodings = {kind: {} for kind in ("emoji", "emoticon", "rep_punct", "sep_punct", "profanity")}
+    return TextNormalizer(morph, profanities, encodings, NONINFORMATIVE_MAPPING,
+                          lemma_cache=LemmaCache(), profanity_index=index)
+
+
+def test_matches_linear_scan(morph, profanities, words):
+    normalizer = make_normalizer(morph, profanities, ProfanityIndex.build(morph, profanities))
+
+    for word in words:
+        lemma = morph.parse(word.lower())[0].normal_form
+        expected = lemma if lemma in profanities else None
+        assert normalizer.profanity_lemma(word) == expected, word
+
+
+def test_map_profanity_matches_text_utils(morph, profanities, words):
+    normalizer = make_normalizer(morph, profanities, ProfanityIndex.build(morph, profanities))
+    text = " ".join(words)
+
+    assert normalizer.map_profanity(text) == map_profanity(morph, text, profanities, {})
+
+
+def test_round_trip(morph, profanities, tmp_path, monkeypatch):
+    path = tmp_path / "profanity_index.json"
+    built = ProfanityIndex.load_or_build(morph, profanities, path=path)
+    assert path.exists()
+    assert len(built) > len(profanities)
+
+    def build(*args):
+        raise AssertionError("stored index is valid, no rebuild expected")
+
+    monkeypatch.setattr(ProfanityIndex, "build", classmethod(build))
+    loaded = ProfanityIndex.load_or_build(morph, profanities, path=path)
+    assert loaded.forms == built.forms
+    assert loaded.version == built.version
+
+    data = json.loads(path.read_text(encoding="utf-8"))
+    assert ProfanityIndex.load_or_build(morph, profanities, data=data).forms == built.forms
+
+
+def test_stale_index_is_rebuilt(morph, profanities, tmp_path):
+    path = tmp_path / "profanity_index.json"
+    path.write_text(json.dumps({"version": "stale", "forms": {"привет": "дурак"}}), encoding="utf-8")
+
+    index = ProfanityIndex.load_or_build(morph, profanities, path=path)
+    assert index.get("привет") is None
+    assert index.get("дураки") == "дурак"
+    assert json.loads(path.read_text(encoding="utf-8"))["version"] == index_version(morph, profanities)
+
+    # other profanity list, other version:
+    assert index_version(morph, profanities + ["идиот"]) != index.version
+    rebuilt = ProfanityIndex.load_or_build(morph, profanities + ["идиот"], path=path)
+    assert rebuilt.get("идиоты") == "идиот"
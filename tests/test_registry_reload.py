@@ -0,0 +1,84 @@
+"""
+Registry load failures and reloads do not leave predictors or worker processes behind.
+"""
+
+import asyncio
+import multiprocessing
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from conftest import write_config
+from services.model_registry import FAILED, READY, ModelRegistry
+from services.registry_reloader import RegistryReloader
+from stub_models import register_stub_types
+
+
+WORKER = {"model_type": "sleepy", "description": "sleepy", "worker_processes": 1,
+          "worker_health_interval_s": 600}
+
+
+@pytest.fixture(autouse=True)
+def stub_types(monkeypatch):
+    register_stub_types(monkeypatch)
+
+
+def children() -> list:
+    return [process.pid for process in multiprocessing.active_children()]
+
+
+def test_failed_load_releases_loaded_predictors(tmp_path):
+    config_path = write_config(tmp_path / "config.json", [WORKER, {"model_type": "broken"}])
+
+    with pytest.raises(RuntimeError, match="broken predictor"):
+        ModelRegistry(config_path)
+    assert children() == []
+
+
+def test_failed_reload_keeps_current_predictors(tmp_path):
+    config_path = write_config(tmp_path / "config.json", [WORKER])
+    registry = ModelRegistry(config_path)
+    state = SimpleNamespace(registry=registry)
+    running = children()
+    assert len(running) == 1
+
+    # second predictor of the new config is broken, the first one's worker must not stay:
+    write_config(tmp_path / "config.json", [WORKER, {"model_type": "broken"}])
+    reloader = RegistryReloader(state, config_path)
+    try:
+        assert asyncio.run(reloader.reload()) is False
+        assert "broken predictor" in reloader.error
+        assert state.registry is registry
+        assert children() == running
+        assert asyncio.run(registry.run_all("привет"))[0][2] == "non_toxic"
+    finally:
+        registry.close()
+    assert children() == []
+
+
+def test_warmup_failure_closes_model(tmp_path):
+    warmup_path = tmp_path / "warmup.txt"
+    warmup_path.write_text("привет\nfail\n", encoding="utf-8")
+    config_path = write_config(tmp_path / "config.json", [
+        dict(WORKER, warmup_path=str(warmup_path)),
+        {"model_type": "sleepy", "description": "in process"},
+    ])
+
+    registry = ModelRegistry(config_path, background=True)
+    try:
+        deadline = time.monotonic() + 60
+        while registry.states()[0]["state"] != FAILED and time.monotonic() < deadline:
+            time.sleep(0.02)
+
+        [failed, ready] = registry.states()
+        assert failed["state"] == FAILED and "failing text" in failed["error"]
+        assert failed["model_id"] is None
+        assert children() == []
+
+        while ready["state"] != READY and time.monotonic() < deadline:
+            time.sleep(0.02)
+            ready = registry.states()[1]
+        assert [result[0] for result in asyncio.run(registry.run_all("привет"))] == ["sleepy_1"]
+    finally:
+        registry.close()
@@ -0,0 +1,64 @@
+"""
+Result cache of ModelRegistry.run_all: hits, canonical keys and dropping on reload.
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from conftest import write_config
+from services.model_registry import MODEL_RESULT_CACHE_HITS, ModelRegistry
+from services.registry_reloader import RegistryReloader
+
+
+def hits(model_id: str) -> float:
+    return sum(MODEL_RESULT_CACHE_HITS.labels(model_id=model_id, prediction_label=label)._value.get()
+               for label in ("toxic", "non_toxic"))
+
+
+@pytest.fixture
+def config_path(tmp_path, linear_predictor) -> str:
+    conf = dict(linear_predictor, description="result cached linear", result_cache=True)
+    return write_config(tmp_path / "config.json", [conf])
+
+
+def test_results_are_cached(config_path):
+    registry = ModelRegistry(config_path)
+    try:
+        before = hits("result cached linear")
+        first = asyncio.run(registry.run_all("Привет, как дела?"))
+        assert hits("result cached linear") == before
+
+        again = asyncio.run(registry.run_all("Привет,   как дела?"))
+        assert hits("result cached linear") == before + 1
+        assert [result[:3] for result in again] == [result[:3] for result in first]
+        assert len(registry._result_caches[0]) == 1
+    finally:
+        registry.close()
+
+
+def test_result_cache_is_dropped_on_reload(config_path):
+    registry = ModelRegistry(config_path)
+    state = SimpleNamespace(registry=registry)
+    reloader = RegistryReloader(state, config_path)
+
+    async def scenario():
+        await registry.run_all("котики")
+        assert len(registry._result_caches[0]) == 1
+
+        assert await reloader.reload()
+        before = hits("result cached linear")
+        await state.registry.run_all("котики")
+        return before
+
+    before = asyncio.run(scenario())
+    try:
+        assert state.registry is not registry
+        # the replaced registry freed its cache, the new one computed the result again:
+        assert registry._released
+        assert len(registry._result_caches[0]) == 0
+        assert hits("result cached linear") == before
+        assert len(state.registry._result_caches[0]) == 1
+    finally:
+        state.registry.close()
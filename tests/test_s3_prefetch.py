@@ -0,0 +1,94 @@
+"""
+Shared s3 client and concurrent prefetch of predictor artifacts, against the in-memory s3 stand-in.
+"""
+
+import json
+import threading
+
+import pytest
+from botocore.exceptions import ClientError
+
+from s3_stub import StubS3
+from services import utils
+
+
+BUCKET = "bucket"
+FILES = [f"data/file_{i}.json" for i in range(6)]
+
+
+@pytest.fixture
+def config_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "_S3_CLIENTS", {})
+
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps({
+        "aws_endpoint_url": "http://127.0.0.1:9", "aws_access_key_id": "key", "aws_secret_access_key": "secret",
+        "predictors": [{"storage_type": "s3", "bucket_name": BUCKET}],
+    }), encoding="utf-8")
+    return str(path)
+
+
+@pytest.fixture
+def s3(config_path):
+    stub = StubS3(delay_s=0.1)
+    for key in FILES:
+        stub.put_object(Bucket=BUCKET, Key=key, Body=key.encode())
+    utils._S3_CLIENTS[config_path] = stub
+    return stub
+
+
+@pytest.fixture
+def predictor_conf(tmp_path):
+    return {"storage_type": "s3", "bucket_name": BUCKET,
+            "artifact_cache_dir": str(tmp_path / "cache"), "artifact_download_workers": 4}
+
+
+def test_one_client_per_config(config_path, tmp_path):
+    clients = []
+    threads = [threading.Thread(target=lambda: clients.append(utils.get_s3_client(config_path)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len({id(client) for client in clients}) == 1
+    assert clients[0].meta.config.max_pool_connections == utils.S3_MAX_POOL_CONNECTIONS
+    assert utils.get_artifact_cache({}, config_path).s3_client is clients[0]
+
+    other = tmp_path / "other.json"
+    other.write_text(open(config_path, encoding="utf-8").read(), encoding="utf-8")
+    assert utils.get_s3_client(str(other)) is not clients[0]
+
+
+def test_boto3_reader_uses_shared_client(s3, config_path):
+    reader = utils.Boto3Reader(config_path, bucket_name=BUCKET)
+
+    assert reader.s3_client is s3
+    assert reader.config["aws_access_key_id"] == "key"
+    with pytest.raises(AttributeError):
+        reader.config = {}
+    assert reader.get_boto3_obj(f"{BUCKET}/{FILES[0]}")["Body"].read() == FILES[0].encode()
+
+
+def test_prefetch_is_concurrent(s3, config_path, predictor_conf):
+    timings = utils.prefetch_s3_artifacts(predictor_conf, FILES, config_path=config_path)
+
+    assert list(timings) == FILES
+    assert s3.max_inflight > 1
+    assert s3.calls["GetObject"] == len(FILES)
+
+    # loaders read the prefetched files without another request:
+    calls = sum(s3.calls.values())
+    for key in FILES:
+        assert utils.fetch_s3_artifact(predictor_conf, f"{BUCKET}/{key}", config_path).read_bytes() == key.encode()
+    assert sum(s3.calls.values()) == calls
+
+
+def test_prefetch_skips_missing_optional(s3, config_path, predictor_conf):
+    timings = utils.prefetch_s3_artifacts(predictor_conf, FILES[:2], optional=["data/missing.json"],
+                                          config_path=config_path)
+    assert set(timings) == set(FILES[:2]) | {"data/missing.json"}
+
+    with pytest.raises(ClientError):
+        utils.prefetch_s3_artifacts(predictor_conf, ["data/missing.json"], config_path=config_path)
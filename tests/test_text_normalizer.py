@@ -0,0 +1,135 @@
+"""
+Parity of TextNormalizer with the text_utils functions used for training.
+"""
+
+import itertools
+import re
+
+import pytest
+import pymorphy3 as pymorphy2
+
+from conftest import DATA_DIR
+from services.text_normalizer import TextNormalizer, check_parity, reference_normalize
+from services.text_preprocessor import NONINFORMATIVE_MAPPING
+from services.text_utils import (emoji_reg_row, map_noninformatives, map_emoji_emoticons,
+                                 map_punctuation, map_profanity)
+
+
+# emoticons overlapping each other ("(;_;)" also contains ";)"):
+OVERLAPPING_EMOTICONS = [
+    ";_;) ;)",
+    ";_;_;)",
+    "T_T:) :)",
+    ":-);) ;)",
+]
+
+ENCODING_KINDS = ("emoji", "emoticon", "rep_punct", "sep_punct", "profanity")
+
+
+@pytest.fixture(scope="module")
+def morph():
+    return pymorphy2.MorphAnalyzer()
+
+
+@pytest.fixture(scope="module")
+def profanities():
+    return (DATA_DIR / "profanities.txt").read_text(encoding="utf-8").split()
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    return (DATA_DIR / "normalizer_corpus.txt").read_text(encoding="utf-8").splitlines()
+
+
+def seeded_encodings(texts) -> dict:
+    """Encodings with all emoticons of texts, map_emoji_emoticons numbers new ones in set order"""
+
+    emoticons = sorted({emo for text in texts for emo in re.findall(emoji_reg_row, text)})
+    encodings = {kind: {} for kind in ENCODING_KINDS}
+    encodings["emoticon"] = {emo: f"[EMT_{i}]" for i, emo in enumerate(emoticons)}
+    return encodings
+
+
+def make_normalizer(morph, profanities, encodings, frozen=False) -> TextNormalizer:
+    return TextNormalizer(morph, profanities, encodings={k: dict(v) for k, v in encodings.items()},
+                          mapping_dict=NONINFORMATIVE_MAPPING, frozen=frozen)
+
+
+def test_check_parity_on_corpus(morph, profanities, corpus):
+    normalizer = make_normalizer(morph, profanities, seeded_encodings(corpus))
+
+    assert check_parity(normalizer, corpus) == []
+    assert check_parity(normalizer, corpus, del_punct=False) == []
+
+
+def test_step_by_step_parity(morph, profanities, corpus):
+    """Every step and the shared encodings match the original functions"""
+
+    encodings = seeded_encodings(corpus)
+    ref_enc = {k: dict(v) for k, v in encodings.items()}
+    normalizer = make_normalizer(morph, profanities, encodings)
+
+    for text in corpus:
+        expected = map_noninformatives(text, NONINFORMATIVE_MAPPING)
+        assert normalizer.map_noninformatives(text) == expected
+
+        text = expected
+        expected = map_emoji_emoticons(text, (ref_enc["emoji"], ref_enc["emoticon"]))
+        assert normalizer.map_emoji_emoticons(text) == expected
+
+        text = expected
+        expected = map_punctuation(text, ref_enc["rep_punct"], ref_enc["sep_punct"])
+        assert normalizer.map_punctuation(text) == expected
+
+        text = expected
+        expected = map_profanity(morph, text, profanities, ref_enc["profanity"])
+        assert normalizer.map_profanity(text) == expected
+
+    assert normalizer.enc_emoj == ref_enc["emoji"]
+    assert normalizer.enc_rep == ref_enc["rep_punct"]
+    assert normalizer.enc_sep == ref_enc["sep_punct"]
+    assert normalizer.enc_prof == ref_enc["profanity"]
+
+
+def test_normalize_batch_equals_normalize(morph, profanities, corpus):
+    encodings = seeded_encodings(corpus)
+    single = make_normalizer(morph, profanities, encodings)
+    batch = make_normalizer(morph, profanities, encodings)
+
+    assert batch.normalize_batch(corpus) == [single.normalize(text) for text in corpus]
+
+
+@pytest.mark.parametrize("text", OVERLAPPING_EMOTICONS)
+def test_overlapping_emoticons(morph, profanities, text):
+    """The original replaces found emoticons one by one in set order, so its result
+    depends on the string hash seed. The single pass must give one of those results."""
+
+    encodings = seeded_encodings([text])
+    normalizer = make_normalizer(morph, profanities, encodings)
+    actual = normalizer.map_emoji_emoticons(text)
+
+    found = set(re.findall(emoji_reg_row, text))
+    sequential = set()
+    for order in itertools.permutations(found):
+        result = text
+        for emo in order:
+            result = result.replace(emo, encodings["emoticon"][emo])
+        sequential.add(result)
+
+    assert actual in sequential
+
+
+def test_frozen_maps_unseen_to_oov(morph, profanities, corpus):
+    encodings = seeded_encodings(corpus)
+    normalizer = make_normalizer(morph, profanities, encodings, frozen=True)
+
+    assert normalizer.normalize("дурак 😀 ...") == "[PRF_0] [EMJ_0] [RPP_0]"
+    assert normalizer.export_observed()["emoji"] == {"😀": 1}
+    assert normalizer.enc_emoj == {}
+
+
+def test_reference_normalize_leaves_tokens(morph, profanities):
+    encodings = seeded_encodings([])
+    text = reference_normalize("дурак, ну!!", morph, profanities, encodings, NONINFORMATIVE_MAPPING)
+
+    assert text == "[PRF_0] ну"